@@ -0,0 +1,55 @@
+#!/xde
+
+""" Per-update latency of the ZMP preview controller, before and after the
+precomputation of the first-row preview gain.
+
+* "inverse": the former update, which inverts the whole (N,N) matrix at each tick,
+* "gain + update": the first-row gain is recomputed at each tick (updatePxPu=True),
+* "fixed gain": the gain is computed once (updatePxPu=False), each update is O(N).
+"""
+
+import xde_isir_controller.zmpy_python as zmpy
+
+import numpy as np
+import time
+
+
+dt      = 0.01
+stride  = 3
+RonQ    = 1e-6
+height  = 0.58
+gravity = 9.81
+n_iter  = 200
+
+
+def legacy_update(zc, com_hat, hong):
+    zmp_ref = zc._fit_goal_for_horizon()
+    zc._update_Px_and_Pu(hong)
+    ddV_com_XY = zmpy.get_quadratic_cmd(zc.getPx(), zc.getPu(), RonQ, zc._N, com_hat, zmp_ref)
+    return com_hat[2, :] + ddV_com_XY[0] * dt
+
+
+def timeit(fn):
+    t0 = time.time()
+    for i in range(n_iter):
+        res = fn()
+    return (time.time() - t0)/n_iter, res
+
+
+goal = np.vstack([np.zeros((100, 2)), .05*np.ones((100, 2)), -.05*np.ones((100, 2))])
+pos, vel, acc = np.array([.01, .02]), np.array([.1, -.1]), np.array([.5, .3])
+com_hat = np.array([pos, vel, acc])
+
+print "{:>8} {:>4} {:>14} {:>16} {:>14} {:>10}".format("horizon", "N", "inverse (us)", "gain+update (us)", "fixed (us)", "max error")
+for horizon in [.5, 1., 1.5, 2., 2.5, 3.]:
+    zc = zmpy.ZMPController(horizon, dt, RonQ, stride, gravity, height, gain_cache_size=0)
+    zc.setGoal(goal)
+
+    t_inv, res_inv = timeit(lambda: legacy_update(zc, com_hat, height/gravity))
+    zc._counter = 0
+    t_upd, res_upd = timeit(lambda: zc.update(pos, vel, acc, height, True))
+    zc._counter = 0
+    t_fix, res_fix = timeit(lambda: zc.update(pos, vel, acc, height, False))
+
+    err = max(np.max(np.abs(res_inv - res_upd)), np.max(np.abs(res_inv - res_fix)))
+    print "{:>8.1f} {:>4d} {:>14.1f} {:>16.1f} {:>14.1f} {:>10.2e}".format(horizon, zc._N, t_inv*1e6, t_upd*1e6, t_fix*1e6, err)
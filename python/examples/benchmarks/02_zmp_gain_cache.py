@@ -0,0 +1,46 @@
+#!/xde
+
+""" Cost and accuracy of the height-adaptive ZMP preview (updatePxPu=True) with
+the gain cache, compared with the fixed-height preview (updatePxPu=False) and
+with the exact, non-cached, update.
+
+The CoM height oscillates by 5 mm around its reference, as during a walk.
+"""
+
+import xde_isir_controller.zmpy_python as zmpy
+
+import numpy as np
+import time
+
+
+dt      = 0.01
+stride  = 3
+horizon = 1.6
+RonQ    = 1e-6
+gravity = 9.81
+height  = 0.58
+n_iter  = 2000
+
+goal    = np.vstack([np.zeros((100, 2)), .05*np.ones((100, 2)), -.05*np.ones((100, 2))])
+heights = height + .005*np.sin(np.arange(n_iter)*dt*2*np.pi)
+pos, vel, acc = np.array([.01, .02]), np.array([.1, -.1]), np.array([.5, .3])
+
+
+def run(cache_size, update_PxPu):
+    zc = zmpy.ZMPController(horizon, dt, RonQ, stride, gravity, height, gain_cache_size=cache_size)
+    zc.setGoal(goal)
+    res = np.zeros((n_iter, 2))
+    t0 = time.time()
+    for i in range(n_iter):
+        res[i] = zc.update(pos, vel, acc, heights[i], update_PxPu)
+    return (time.time() - t0)/n_iter, res, zc.getGainCache()
+
+
+t_fixed, res_fixed, _     = run(0, False)
+t_exact, res_exact, _     = run(0, True)
+t_cache, res_cache, cache = run(256, True)
+
+print "fixed height     : {:8.1f} us/update".format(t_fixed*1e6)
+print "exact update     : {:8.1f} us/update".format(t_exact*1e6)
+print "cached update    : {:8.1f} us/update, {}".format(t_cache*1e6, cache.info())
+print "max |cached - exact| acceleration: {:.2e} m/s^2 (max |acc| {:.2e})".format(np.max(np.abs(res_cache - res_exact)), np.max(np.abs(res_exact)))
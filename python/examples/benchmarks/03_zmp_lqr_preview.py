@@ -0,0 +1,68 @@
+#!/xde
+
+""" Tracking error and per-tick cost of the finite-horizon ("finite") and the
+infinite-horizon LQR ("lqr") ZMP preview controllers, on the ZMP reference of
+the infinity walk of examples/icub_control/09_walk_infinity.py.
+
+The robot is replaced by the ideal cart-table model at the CoM height.
+"""
+
+import xde_isir_controller as xic
+import xde_isir_controller.zmpy_python as zmpy
+
+import numpy as np
+import time
+
+pi = np.pi
+
+
+def get_infinity_traj(R=.5, eps=360):
+    """ Same trajectory as in 09_walk_infinity.py, starting at (0,0) in the X direction.
+    """
+    traj = []
+    for T in np.linspace(0, 2.*pi, eps):
+        traj.append([R*np.cos(T - pi/2.), R + R*np.sin(T - pi/2.), T])
+    for T in np.linspace(0, 2.*pi, eps):
+        traj.append([R*np.cos(-T + pi/2.), -R + R*np.sin(-T + pi/2.), -T])
+    return np.array(traj)
+
+
+dt      = 0.01
+stride  = 3
+horizon = 1.6
+RonQ    = 1e-6
+gravity = 9.81
+height  = 0.58
+hong    = height/gravity
+
+points  = xic.walk.traj2zmppoints(get_infinity_traj(), .1, .05, [0, .05, 0], [0, -.05, 0], "left")
+zmp_ref = xic.walk.zmppoints2zmptraj(points, 1., dt)
+n_tick  = len(zmp_ref) + int(2./dt)
+
+A = np.array([[1., dt, dt**2/2.], [0., 1., dt], [0., 0., 1.]])
+B = np.array([[dt**3/6.], [dt**2/2.], [dt]])
+
+
+def simulate(zmp_ctrl):
+    zmp_ctrl.setGoal(zmp_ref)
+    x   = np.zeros((3, 2))
+    x[0] = zmp_ref[0]
+    zmp = np.zeros((n_tick, 2))
+    duration = 0.
+    for k in range(n_tick):
+        t0 = time.time()
+        dVcom_des = zmp_ctrl.update(x[0], x[1], x[2], height, False)
+        duration += time.time() - t0
+        jerk = (dVcom_des - x[2])/dt
+        x = np.dot(A, x) + np.dot(B, jerk.reshape(1, 2))
+        zmp[k] = x[0] - hong*x[2]
+    ref = np.vstack([zmp_ref, np.dot(np.ones((n_tick - len(zmp_ref), 1)), zmp_ref[-1].reshape(1, 2))])
+    err = np.sqrt(np.sum((zmp - ref)**2, axis=1))
+    return duration/n_tick, np.sqrt(np.mean(err**2)), np.max(err), np.linalg.norm(zmp[-1] - zmp_ref[-1])
+
+
+print "{} ticks ({:.1f} s), horizon {} s, stride {}".format(n_tick, n_tick*dt, horizon, stride)
+print "{:>8} {:>6} {:>12} {:>12} {:>12} {:>14}".format("engine", "stride", "tick (us)", "rms err (m)", "max err (m)", "final err (m)")
+for name, s in [("finite", stride), ("finite", 1), ("lqr", stride)]:
+    t_tick, rms, emax, efinal = simulate(zmpy.ZMP_ENGINES[name](horizon, dt, RonQ, s, gravity, height))
+    print "{:>8} {:>6} {:>12.1f} {:>12.4f} {:>12.4f} {:>14.2e}".format(name, s, t_tick*1e6, rms, emax, efinal)
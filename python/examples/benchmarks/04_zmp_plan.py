@@ -0,0 +1,69 @@
+#!/xde
+
+""" Cost of a whole-trajectory rollout of the ZMP preview controller, simulated
+tick by tick with ZMPController.update, or at once with ZMPController.plan, on
+the ZMP reference of the infinity walk of examples/icub_control/09_walk_infinity.py.
+
+The robot is replaced by the ideal cart-table model at the CoM height.
+"""
+
+import xde_isir_controller as xic
+import xde_isir_controller.zmpy_python as zmpy
+
+import numpy as np
+import time
+
+pi = np.pi
+
+
+def get_infinity_traj(R=.5, eps=360):
+    """ Same trajectory as in 09_walk_infinity.py, starting at (0,0) in the X direction.
+    """
+    traj = []
+    for T in np.linspace(0, 2.*pi, eps):
+        traj.append([R*np.cos(T - pi/2.), R + R*np.sin(T - pi/2.), T])
+    for T in np.linspace(0, 2.*pi, eps):
+        traj.append([R*np.cos(-T + pi/2.), -R + R*np.sin(-T + pi/2.), -T])
+    return np.array(traj)
+
+
+horizon = 1.6
+RonQ    = 1e-6
+gravity = 9.81
+height  = 0.58
+hong    = height/gravity
+
+points  = xic.walk.traj2zmppoints(get_infinity_traj(), .1, .05, [0, .05, 0], [0, -.05, 0], "left")
+
+
+def rollout_loop(zmp_ctrl, zmp_ref, dt):
+    A = np.array([[1., dt, dt**2/2.], [0., 1., dt], [0., 0., 1.]])
+    B = np.array([[dt**3/6.], [dt**2/2.], [dt]])
+    x = np.zeros((3, 2))
+    x[0] = zmp_ref[0]
+    pos = np.zeros((len(zmp_ref), 2))
+    for k in range(len(zmp_ref)):
+        dVcom_des = zmp_ctrl.update(x[0], x[1], x[2], height, False)
+        jerk = (dVcom_des - x[2])/dt
+        x = np.dot(A, x) + np.dot(B, jerk.reshape(1, 2))
+        pos[k] = x[0]
+    return pos
+
+
+print "{:>8} {:>8} {:>12} {:>12} {:>14}".format("dt (s)", "steps", "loop (ms)", "plan (ms)", "max diff (m)")
+for dt, stride in [(0.01, 3), (0.005, 6), (0.001, 30)]:
+    zmp_ref = xic.walk.zmppoints2zmptraj(points, 1., dt)
+
+    zmp_ctrl = zmpy.ZMPController(horizon, dt, RonQ, stride, gravity, height, gain_cache_size=0)
+    zmp_ctrl.setGoal(zmp_ref)
+    t0 = time.time()
+    pos_loop = rollout_loop(zmp_ctrl, zmp_ref, dt)
+    t_loop = time.time() - t0
+
+    zmp_ctrl = zmpy.ZMPController(horizon, dt, RonQ, stride, gravity, height, gain_cache_size=0)
+    zmp_ctrl.setGoal(zmp_ref)
+    t0 = time.time()
+    pos_plan, vel_plan, acc_plan, zmp_plan = zmp_ctrl.plan(zmp_ref[0], [0., 0.], [0., 0.], height)
+    t_plan = time.time() - t0
+
+    print "{:>8} {:>8} {:>12.1f} {:>12.1f} {:>14.2e}".format(dt, len(zmp_ref), t_loop*1e3, t_plan*1e3, np.max(np.abs(pos_loop - pos_plan)))
@@ -0,0 +1,71 @@
+#!/xde
+
+""" Cost of the footstep placement of walk.traj2zmppoints along straight paths
+discretized as in WalkingActivity.goTo, compared with the former point by point
+implementation, which is kept below as a reference.
+"""
+
+import xde_isir_controller as xic
+
+import numpy as np
+import time
+
+
+def traj2zmppoints_loop(comtraj, step_length, step_side, left_start, right_start, start_foot):
+    left_start  = np.asarray(left_start)
+    right_start = np.asarray(right_start)
+    point = []
+
+    if   start_foot == 'left' :
+        point.extend([left_start, right_start])
+    elif start_foot == 'right':
+        point.extend([right_start, left_start])
+    else:
+        raise ValueError
+    next_foot = start_foot
+
+    sum_distance = 0.
+    for i in np.arange(len(comtraj)-1):
+        sum_distance += np.linalg.norm(comtraj[i+1][0:2]-comtraj[i][0:2])
+
+        if sum_distance > step_length:
+            angle = comtraj[i][2]
+            ecart = step_side*np.array([-np.sin(angle), np.cos(angle), 0])
+            if next_foot == 'right':
+                ecart = -ecart
+            point.append(comtraj[i] + ecart)
+            sum_distance = 0.
+            next_foot = 'right' if next_foot == 'left' else 'left'
+
+    angle = comtraj[-1][2]
+    ecart = step_side*np.array([-np.sin(angle), np.cos(angle), 0])
+    if next_foot == 'left':
+        point.extend([comtraj[-1] + ecart, comtraj[-1] - ecart])
+    else:
+        point.extend([comtraj[-1] - ecart, comtraj[-1] + ecart])
+    return point
+
+
+search_path_tolerance = 1e-2
+step_length = .1
+step_side   = .05
+l_start     = [0,  .05, 0]
+r_start     = [0, -.05, 0]
+angle       = np.pi/6.
+
+print "{:>10} {:>8} {:>8} {:>12} {:>14} {:>10}".format("length (m)", "points", "steps", "loop (ms)", "vectorized (ms)", "identical")
+for path_length in [1., 3., 10., 30., 100.]:
+    N    = int(path_length/search_path_tolerance)
+    end  = path_length*np.array([np.cos(angle), np.sin(angle)])
+    traj = np.array([np.linspace(0, end[0], N), np.linspace(0, end[1], N), angle*np.ones(N)]).T
+
+    t0 = time.time()
+    ref = traj2zmppoints_loop(traj, step_length, step_side, l_start, r_start, "left")
+    t_loop = time.time() - t0
+
+    t0 = time.time()
+    res = xic.walk.traj2zmppoints(traj, step_length, step_side, l_start, r_start, "left")
+    t_vect = time.time() - t0
+
+    identical = len(ref) == len(res) and all(np.array_equal(p, q) for p, q in zip(ref, res))
+    print "{:>10} {:>8} {:>8} {:>12.2f} {:>14.2f} {:>10}".format(path_length, N, len(res), t_loop*1e3, t_vect*1e3, identical)
@@ -112,7 +112,7 @@ ctrl.add_updater( xic.task_controller.TrajectoryTracking(waistTask, waistTraj) )
 
 
 ##### OBSERVERS
-fpobs = ctrl.add_updater(xic.observers.FramePoseObserver(ctrl.getModel(), rname+'.waist', lgsm.Displacement()))
+fpobs = ctrl.add_updater(xic.observers.FramePoseObserver(ctrl.getModelSnapshot(), rname+'.waist', lgsm.Displacement()))
 
 ##### SIMULATE
 ctrl.s.start()
@@ -88,7 +88,7 @@ ctrl.add_updater( xic.task_controller.ZMPController( CoMTask, ctrl.getModel(), [
 
 
 ##### OBSERVERS
-cpobs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModel()))
+cpobs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModelSnapshot()))
 
 
 ##### SIMULATE
@@ -119,7 +119,7 @@ ctrl.add_updater( xic.task_controller.ZMPController( CoMTask, ctrl.getModel(), z
 
 
 ##### OBSERVERS
-zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
 
 
 ##### SIMULATE
@@ -105,7 +105,7 @@ walkingActivity.set_zmp_control_parameters(RonQ=1e-6, horizon=1.6, stride=3, gra
 zmp_ref = walkingActivity.goTo([.3,0.], relative_pos=True)
 
 ##### OBSERVERS
-zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
 
 
 ##### SIMULATE
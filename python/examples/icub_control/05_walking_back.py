@@ -108,7 +108,7 @@ walkingActivity = xic.walk.WalkingActivity( ctrl, dt,
 zmp_ref = walkingActivity.goTo([-1.5,0.])
 
 ##### OBSERVERS
-zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
 
 #if fixed camera
 cam_traj = [xic.observers.lookAt(lgsm.vector(-2,1.5,1.5), lgsm.vector(-0.5,0,0.6), lgsm.vector(0,0,1))]
@@ -108,7 +108,7 @@ zmp_ref = walkingActivity.goTo([.0,-.5], relative_pos=True)
 
 
 ##### OBSERVERS
-zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
 
 
 ##### SIMULATE
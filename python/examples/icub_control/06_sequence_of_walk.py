@@ -108,7 +108,7 @@ walkingActivity.stayIdle()
 
 
 ##### OBSERVERS
-zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
 
 
 ##### SIMULATE
@@ -105,8 +105,8 @@ walkingActivity.set_zmp_control_parameters(RonQ=1e-6, horizon=1.6, stride=3, gra
 zmp_ref = walkingActivity.goTo([.5,0.])
 
 ##### OBSERVERS
-zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(dynModel, lgsm.Displacement(0,0,0.002,1,0,0,0), dt, 9.81) )
-zmppobs     = ctrl.add_updater( xic.observers.ZMPPositionObserver(dynModel, lgsm.Displacement(0,0,0.002,1,0,0,0), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater( xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(0,0,0.002,1,0,0,0), dt, 9.81) )
+zmppobs     = ctrl.add_updater( xic.observers.ZMPPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(0,0,0.002,1,0,0,0), dt, 9.81) )
 
 
 ##### SIMULATE
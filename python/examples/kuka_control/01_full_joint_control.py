@@ -43,7 +43,7 @@ fullTask.set_qdot(gveldes)
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModelSnapshot()))
 
 ###### SIMULATE
 ctrl.s.start()
@@ -52,7 +52,7 @@ part2Task.set_qdot(gveldes)
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModelSnapshot()))
 
 
 ##### SIMULATE
@@ -47,7 +47,7 @@ EETask.setVelocity(gveldes)
 
 
 ##### OBSERVERS
-fpobs = ctrl.add_updater(xic.observers.FramePoseObserver(ctrl.getModel(), "robot.07", lgsm.Displacement()) )
+fpobs = ctrl.add_updater(xic.observers.FramePoseObserver(ctrl.getModelSnapshot(), "robot.07", lgsm.Displacement()) )
 
 
 ##### SIMULATE
@@ -46,7 +46,7 @@ CoMTask.setVelocity(gveldes)
 
 
 ##### OBSERVERS
-cpobs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModel()))
+cpobs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModelSnapshot()))
 
 
 ##### SIMULATE
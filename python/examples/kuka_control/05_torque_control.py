@@ -43,7 +43,7 @@ torqueTask.set_tau(lgsm.vector([0.11]))
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModelSnapshot()))
 tpobs = ctrl.add_updater(xic.observers.TorqueObserver(ctrl))
 
 
@@ -42,7 +42,7 @@ torqueTask.set_tau(lgsm.vector([1.51]))
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModelSnapshot()))
 tpobs = ctrl.add_updater(xic.observers.TorqueObserver(ctrl))
 
 
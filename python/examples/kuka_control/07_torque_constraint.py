@@ -43,7 +43,7 @@ ctrl.add_updater( xic.task_controller.TrajectoryTracking(torqueTask, torqueTraj)
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModelSnapshot()))
 tpobs = ctrl.add_updater(xic.observers.TorqueObserver(ctrl))
 
 
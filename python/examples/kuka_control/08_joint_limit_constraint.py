@@ -42,7 +42,7 @@ fullTask.set_qdot(gveldes)
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointPositionsObserver(ctrl.getModelSnapshot()))
 
 ###### SIMULATE
 ctrl.s.start()
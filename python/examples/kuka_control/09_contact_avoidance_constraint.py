@@ -44,7 +44,7 @@ ctrl = xic.ISIRController(dynModel, rname, wm.phy, wm.icsync, "qld", False)
 jointConst  = ctrl.add_constraint( xic.JointLimitConstraint(ctrl.getModel(), .2) )
 
 contConst   = ctrl.add_constraint( xic.ContactAvoidanceConstraint(ctrl.getModel(), .2, 0.1) )
-contConstUpdater = ctrl.add_updater(xic.ContactAvoidanceConstraintUpdater(contConst, ctrl.getModel(), wm.phy))
+contConstUpdater = ctrl.add_updater(xic.ContactAvoidanceConstraintUpdater(contConst, ctrl.getModelSnapshot(), wm.phy))
 contConstUpdater.add_contactAvoidance("robot.04", "sphere1.sphere")
 contConstUpdater.add_contactAvoidance("robot.05", "sphere1.sphere")
 contConstUpdater.add_contactAvoidance("robot.06", "sphere1.sphere")
@@ -60,7 +60,7 @@ fullTask.set_qdot(gveldes)
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointVelocitiesObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointVelocitiesObserver(ctrl.getModelSnapshot()))
 
 ###### SIMULATE
 ctrl.s.start()
@@ -44,7 +44,7 @@ ctrl.controller.takeIntoAccountGravity(False)
 #jointConst  = ctrl.add_constraint( xic.JointLimitConstraint(ctrl.getModel(), .2) )
 
 contConst   = ctrl.add_constraint( xic.ContactAvoidanceConstraint(ctrl.getModel(), .2, 0.2) )
-contConstUpdater = ctrl.add_updater(xic.ContactAvoidanceConstraintUpdater(contConst, ctrl.getModel(), wm.phy))
+contConstUpdater = ctrl.add_updater(xic.ContactAvoidanceConstraintUpdater(contConst, ctrl.getModelSnapshot(), wm.phy))
 contConstUpdater.add_contactAvoidance("sphere1.sphere", "robot.link_x")
 contConstUpdater.add_contactAvoidance("sphere1.sphere", "robot.link_y")
 contConstUpdater.add_contactAvoidance("sphere1.sphere", "robot.link_z")
@@ -57,7 +57,7 @@ fTask.setPosition(lgsm.Displacement(1.,.8,.5,1,0,0,0))
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointVelocitiesObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointVelocitiesObserver(ctrl.getModelSnapshot()))
 
 ###### SIMULATE
 ctrl.s.start()
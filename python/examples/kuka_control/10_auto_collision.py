@@ -45,7 +45,7 @@ ctrl.controller.takeIntoAccountGravity(False)
 #jointConst  = ctrl.add_constraint( xic.JointLimitConstraint(ctrl.getModel(), .2) )
 
 contConst   = ctrl.add_constraint( xic.ContactAvoidanceConstraint(ctrl.getModel(), .2, 0.1) )
-contConstUpdater = ctrl.add_updater(xic.ContactAvoidanceConstraintUpdater(contConst, ctrl.getModel(), wm.phy))
+contConstUpdater = ctrl.add_updater(xic.ContactAvoidanceConstraintUpdater(contConst, ctrl.getModelSnapshot(), wm.phy))
 #contConstUpdater.add_contactAvoidance("robot.link_x", "robot.link_y")
 contConstUpdater.add_contactAvoidance("robot.link_x", "robot.link_z")
 contConstUpdater.add_contactAvoidance("robot.link_y", "robot.link_z")
@@ -56,7 +56,7 @@ fTask = ctrl.createFullTask("frametask", "INTERNAL", w=1., kp=5., set_q=gposdes,
 
 
 ##### OBSERVERS
-jpobs = ctrl.add_updater(xic.observers.JointVelocitiesObserver(ctrl.getModel()))
+jpobs = ctrl.add_updater(xic.observers.JointVelocitiesObserver(ctrl.getModelSnapshot()))
 
 ###### SIMULATE
 ctrl.s.start()
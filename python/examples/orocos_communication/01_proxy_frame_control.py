@@ -70,7 +70,7 @@ EETask.setPosition(gposdes)
 EETask.setVelocity(gveldes)
 
 ##### OBSERVERS
-fpobs = ctrl.add_updater(xic.observers.FramePoseObserver(ctrl.getModel(), rname+".07", lgsm.Displacement()) )
+fpobs = ctrl.add_updater(xic.observers.FramePoseObserver(ctrl.getModelSnapshot(), rname+".07", lgsm.Displacement()) )
 
 ctrl.add_updater(RemoteModelUpdater(proxyModel) )
 
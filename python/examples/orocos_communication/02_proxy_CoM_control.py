@@ -70,7 +70,7 @@ CoMTask.setPosition(gposdes)
 CoMTask.setVelocity(gveldes)
 
 ##### OBSERVERS
-cpobs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModel()))
+cpobs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModelSnapshot()))
 
 ctrl.add_updater(RemoteModelUpdater(proxyModel) )
 
@@ -86,7 +86,7 @@ ct_crf3 = ctrl.createContactTask("CRF3", rname+".r_ankle", foot_contact_pt3, mu_
 
 ##### OBSERVERS
 torque_obs = ctrl.add_updater(xic.observers.TorqueObserver(ctrl))
-zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
+zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
 
 
 ##### ADD FRAMES
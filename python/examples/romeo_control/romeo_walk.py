@@ -111,8 +111,8 @@ zmp_ref = walkingActivity.goTo([1.0,0.0], relative_pos=True)
 
 ##### OBSERVERS
 torque_obs = ctrl.add_updater(xic.observers.TorqueObserver(ctrl))
-zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModel(), lgsm.Displacement(), dt, 9.81) )
-CoM_obs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModel()))
+zmplipmpobs = ctrl.add_updater(xic.observers.ZMPLIPMPositionObserver(ctrl.getModelSnapshot(), lgsm.Displacement(), dt, 9.81) )
+CoM_obs = ctrl.add_updater(xic.observers.CoMPositionObserver(ctrl.getModelSnapshot()))
 
 ##### ADD FRAMES
 """
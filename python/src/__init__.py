@@ -22,11 +22,14 @@ from contact              import ContactAvoidanceConstraintUpdater
 
 
 #####
-from core  import ISIRController, ISIRTask
+from core  import ISIRController, ISIRTask, ContactSet, ModelSnapshot
 
 import observers
 import task_controller
 import walk
 import performances
+import buffers
+import profiling
+import events
 
 
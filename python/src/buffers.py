@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+
+""" Module of fixed-size buffers to record data in the control loop without growing the memory.
+"""
+
+import numpy as np
+
+import math
+import os
+import struct
+import time
+
+
+
+def _get_monotonic_clock():
+    """ Get the function returning the time of a monotonic high-resolution clock, in second.
+
+    It uses ``time.perf_counter`` when it exists, else ``clock_gettime(CLOCK_MONOTONIC)`` through ctypes,
+    and falls back on ``time.time`` if none is available.
+    """
+    if hasattr(time, "perf_counter"):
+        return time.perf_counter
+
+    try:
+        import ctypes, ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+        lib = ctypes.CDLL(ctypes.util.find_library("rt") or ctypes.util.find_library("c"))
+        clock_gettime = lib.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+        ts     = timespec()
+        ts_ptr = ctypes.pointer(ts)
+
+        def monotonic_time():
+            clock_gettime(CLOCK_MONOTONIC, ts_ptr)
+            return ts.tv_sec + ts.tv_nsec*1e-9
+
+        if clock_gettime(CLOCK_MONOTONIC, ts_ptr) != 0:
+            raise OSError("clock_gettime failed")
+        return monotonic_time
+
+    except (OSError, AttributeError, TypeError):
+        return time.time
+
+
+monotonic_time = _get_monotonic_clock()
+
+
+
+class RingBuffer(object):
+    """ A preallocated buffer keeping the last `capacity` values appended.
+    """
+
+    def __init__(self, capacity, width=None, dtype=float):
+        """
+        :param int capacity: The max number of values kept in the buffer
+        :param int width: The size of the values if they are vectors; None for scalars
+        :param dtype: The type of the values
+
+        """
+        if capacity <= 0:
+            raise ValueError("the capacity of a ring buffer must be positive")
+        shape = (capacity, ) if width is None else (capacity, width)
+        self.data     = np.zeros(shape, dtype=dtype)
+        self.capacity = capacity
+        self.count    = 0       # total number of appended values, including the overwritten ones
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, value):
+        self.data[self.count % self.capacity] = value
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def get_window(self, n=None):
+        """ Get the last values in chronological order.
+
+        :param int n: The number of values to get; if None, all the values in the buffer
+
+        :return: an array of the values, a view on the buffer when they are contiguous in memory
+
+        """
+        size = len(self) if n is None else min(n, len(self))
+        end  = self.count % self.capacity
+        if size <= end:
+            return self.data[end-size:end]
+        return np.concatenate([self.data[self.capacity-(size-end):], self.data[:end]])
+
+
+
+class TimingRecorder(RingBuffer):
+    """ A ring buffer of durations which maintains running statistics over all the recorded durations.
+
+    The statistics are updated at each record, so they can be queried at any time without
+    copying the history, and they are not limited to the samples still in the buffer.
+    The percentiles are estimated from a histogram with logarithmic bins, whose relative resolution
+    is ``10**(1./bins_per_decade) - 1`` (12% with 20 bins per decade).
+    """
+
+    def __init__(self, capacity, deadline=None, bins_per_decade=20, min_duration=1e-7, max_duration=10.):
+        """
+        :param int capacity: The max number of durations kept in the buffer
+        :param double deadline: The duration above which a record is counted as a deadline miss; None for no deadline
+        :param int bins_per_decade: The number of histogram bins per decade, to estimate the percentiles
+        :param double min_duration: The lower bound of the histogram, in second
+        :param double max_duration: The upper bound of the histogram, in second
+
+        """
+        RingBuffer.__init__(self, capacity)
+        self.deadline         = deadline
+        self._bins_per_decade = bins_per_decade
+        self._log_min         = math.log10(min_duration)
+        self._n_bins          = int(math.ceil((math.log10(max_duration) - self._log_min)*bins_per_decade))
+        self.histogram        = np.zeros(self._n_bins + 2, dtype=int)   # with underflow and overflow bins
+        self.clear()
+
+    def clear(self):
+        RingBuffer.clear(self)
+        self.histogram[:]    = 0
+        self.total           = 0.
+        self.max             = 0.
+        self.deadline_misses = 0
+
+    def record(self, duration):
+        """ Record a duration, in second.
+        """
+        self.append(duration)
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if self.deadline is not None and duration > self.deadline:
+            self.deadline_misses += 1
+
+        if duration > 0:
+            b = int((math.log10(duration) - self._log_min)*self._bins_per_decade) + 1
+            self.histogram[min(max(b, 0), self._n_bins + 1)] += 1
+        else:
+            self.histogram[0] += 1
+
+    def get_mean(self):
+        return self.total/self.count if self.count else 0.
+
+    def get_percentile(self, p):
+        """ Estimate the duration under which `p` percents of the records are.
+
+        :return: the geometric center of the histogram bin of the percentile, bounded by the max duration
+
+        """
+        if self.count == 0:
+            return 0.
+        b = int(np.searchsorted(np.cumsum(self.histogram), p/100.*self.count))
+        if b == 0:
+            return 0.
+        value = 10**(self._log_min + (b - .5)/self._bins_per_decade)
+        return min(value, self.max)
+
+    def get_summary(self):
+        """ Get the statistics of all the recorded durations.
+
+        :return: a dictionary with keys ``count``, ``mean``, ``p50``, ``p99``, ``p99.9``, ``max``, ``deadline``, ``deadline_misses``
+
+        """
+        return {"count"          : self.count,
+                "mean"           : self.get_mean(),
+                "p50"            : self.get_percentile(50.),
+                "p99"            : self.get_percentile(99.),
+                "p99.9"          : self.get_percentile(99.9),
+                "max"            : self.max,
+                "deadline"       : self.deadline,
+                "deadline_misses": self.deadline_misses}
+
+
+
+class NpyAppender(object):
+    """ A .npy file to which rows are appended, so it can be written during a run and loaded at any time.
+
+    The header is rewritten after each append with the current number of rows, in a fixed space,
+    so the file is always a valid .npy file which can be memory-mapped with ``np.load(filename, mmap_mode="r")``.
+    """
+
+    _HEADER_LENGTH = 128        # enough for any shape, and a multiple of 64 as recommended by the format
+
+    def __init__(self, filename, width=None, dtype=float):
+        """
+        :param string filename: The name of the file, which is overwritten
+        :param int width: The size of the rows if they are vectors; None for scalars
+        :param dtype: The type of the values
+
+        """
+        self.filename = filename
+        self.width    = width
+        self.dtype    = np.dtype(dtype)
+        self.count    = 0
+        self._file    = open(filename, "w+b")
+        self._write_header_()
+
+    def _write_header_(self):
+        shape  = (self.count, ) if self.width is None else (self.count, self.width)
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (self.dtype.str, shape)
+        self._file.seek(0)
+        self._file.write("\x93NUMPY\x01\x00" + struct.pack("<H", self._HEADER_LENGTH - 10))
+        self._file.write(header.ljust(self._HEADER_LENGTH - 11) + "\n")
+
+    def append(self, rows):
+        """ Append an array of rows, i.e. of shape (n,) for scalars or (n, width) for vectors.
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if self.width is not None:
+            rows = rows.reshape(-1, self.width)
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(rows.tostring())
+        self.count += len(rows)
+        self._write_header_()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+
+class NpyChannels(object):
+    """ A read-only mapping of the .npy files of a directory, keyed by their names without extension.
+
+    The files are memory-mapped when accessed, so only the channels and the samples which are used are read.
+    """
+
+    def __init__(self, dirname, mmap_mode="r"):
+        self.dirname   = dirname
+        self.mmap_mode = mmap_mode
+
+    def keys(self):
+        return sorted(f[:-len(".npy")] for f in os.listdir(self.dirname) if f.endswith(".npy"))
+
+    def __contains__(self, name):
+        return os.path.exists(os.path.join(self.dirname, name+".npy"))
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        return np.load(os.path.join(self.dirname, name+".npy"), mmap_mode=self.mmap_mode)
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+
+
+class RecordBuffer(object):
+    """ A record of fixed-width float64 rows, stored in a preallocated array.
+
+    Three storage modes are available:
+
+    * by default, the array grows by doubling its size when it is full;
+    * with `ring`, only the last `capacity` rows are kept, and each row is written twice, at its
+      index and at its index plus `capacity`, so that the last rows are always contiguous in memory;
+    * with `spill_file`, the array is a chunk of `capacity` rows which is appended to a .npy file when it is full
+      (see :class:`NpyAppender`), so the memory is bounded whatever the length of the record.
+
+    In all modes, :meth:`get_array` returns the recorded rows without copying them.
+    """
+
+    def __init__(self, width, capacity=10000, ring=False, spill_file=None):
+        """
+        :param int width: The number of values of each row
+        :param int capacity: The number of rows preallocated; the max number of rows kept in ring mode; the size of the chunks spilled to the file
+        :param bool ring: Whether to keep only the last `capacity` rows
+        :param string spill_file: The name of the .npy file where the rows are spilled; None to keep them in memory
+
+        """
+        if capacity <= 0:
+            raise ValueError("the capacity of a record buffer must be positive")
+        if ring and spill_file is not None:
+            raise ValueError("a record buffer in ring mode cannot spill to a file")
+        self.width    = width
+        self.capacity = capacity
+        self.ring     = ring
+        self.count    = 0       # total number of appended rows
+        self._data    = np.zeros((2*capacity if ring else capacity, width))
+        self._n       = 0       # number of rows in memory, when not in ring mode
+        self._spill   = NpyAppender(spill_file, width) if spill_file is not None else None
+
+    def __len__(self):
+        return min(self.count, self.capacity) if self.ring else self.count
+
+    def append(self, row):
+        if self.ring:
+            i = self.count % self.capacity
+            self._data[i] = row
+            self._data[i + self.capacity] = row
+        else:
+            if self._n == len(self._data):
+                if self._spill is not None:
+                    self._spill_()
+                else:
+                    data = np.zeros((2*len(self._data), self.width))
+                    data[:self._n] = self._data
+                    self._data = data
+            self._data[self._n] = row
+            self._n += 1
+        self.count += 1
+
+    def _spill_(self):
+        self._spill.append(self._data[:self._n])
+        self._spill.flush()
+        self._n = 0
+
+    def get_array(self):
+        """ Get the recorded rows in chronological order, as a (T, width) array.
+
+        :return: a view on the buffer, or a read-only memory-map of the file when the rows are spilled
+
+        """
+        if self.ring:
+            if self.count < self.capacity:
+                return self._data[:self.count]
+            start = self.count % self.capacity
+            return self._data[start:start + self.capacity]
+        if self._spill is None:
+            return self._data[:self._n]
+        if self._n:
+            self._spill_()
+        if self._spill.count == 0:
+            return self._data[:0]
+        return np.load(self._spill.filename, mmap_mode="r")
+
+
+
+class SnapshotQueue(object):
+    """ A bounded queue of fixed-size snapshots, to pass data from one producer thread to one consumer thread without lock.
+
+    The snapshots are copied in preallocated slots, and a slot is published by incrementing the write counter
+    once it is filled, so the consumer never reads a partially written snapshot. When the queue is full,
+    the pushed snapshot is dropped and counted, so the producer never waits for the consumer.
+    """
+
+    def __init__(self, capacity, fields):
+        """
+        :param int capacity: The max number of snapshots waiting in the queue
+        :param list fields: The fields of the snapshots, as tuples ``(name, width)``, with a width of None for scalars
+
+        """
+        if capacity <= 0:
+            raise ValueError("the capacity of a snapshot queue must be positive")
+        self.capacity = capacity
+        self.names    = [name for name, width in fields]
+        self._slots   = [np.zeros((capacity, ) if width is None else (capacity, width)) for name, width in fields]
+        self._shapes  = [slot.shape[1:] for slot in self._slots]
+        self.pushed   = 0       # number of pushed snapshots, including the dropped ones
+        self.dropped  = 0
+        self._write   = 0       # number of published snapshots, only written by the producer
+        self._read    = 0       # number of released snapshots, only written by the consumer
+
+    def __len__(self):
+        return self._write - self._read
+
+    def push(self, *values):
+        """ Copy a snapshot in the queue, with the values of the fields in their declaration order.
+
+        :return: False if the queue was full and the snapshot is dropped
+
+        """
+        i = self.reserve()
+        if i is None:
+            return False
+        for slot, shape, value in zip(self._slots, self._shapes, values):
+            slot[i] = np.asarray(value).reshape(shape)
+        self.publish()
+        return True
+
+    def reserve(self):
+        """ Get the index of the slot where the next snapshot is written in place, to push it without temporary arrays.
+
+        The fields are written at this index in the arrays given by :meth:`get_storage`, then the snapshot
+        is published with :meth:`publish`.
+
+        :return: the index of the free slot; None if the queue is full, the snapshot being dropped and counted
+
+        """
+        self.pushed += 1
+        if self._write - self._read >= self.capacity:
+            self.dropped += 1
+            return None
+        return self._write % self.capacity
+
+    def publish(self):
+        """ Publish the snapshot written in the slot given by :meth:`reserve`.
+        """
+        self._write += 1
+
+    def get_storage(self, name):
+        """ Get the (capacity, width)-array where the field `name` of the snapshots is stored; (capacity,) for scalars.
+        """
+        return self._slots[self.names.index(name)]
+
+    def peek(self):
+        """ Get the oldest snapshot of the queue, without removing it.
+
+        :return: a dictionary of the fields, as views on the slot which are valid until :meth:`release`; None if the queue is empty
+
+        """
+        if self._read == self._write:
+            return None
+        i = self._read % self.capacity
+        return dict((name, slot[i]) for name, slot in zip(self.names, self._slots))
+
+    def release(self):
+        """ Remove the oldest snapshot, and give its slot back to the producer.
+        """
+        if self._read < self._write:
+            self._read += 1
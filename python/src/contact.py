@@ -11,10 +11,16 @@ import lgsm
 
 from xde_world_manager.collision import alignz
 
+from observers import requestSegmentsState
+
 
 class ContactAvoidanceConstraintUpdater:
 
     def __init__(self, CAConstraint, model, physic_agent, connector_name="ContactAvoidanceConnector", port_name="ContactAvoidancePort"):
+        """
+        :param model: The dynamic model, or its snapshot (see :class:`core.ModelSnapshot`), whose segment states are then
+                      read once per tick for the bodies given to :meth:`add_contactAvoidance`
+        """
         self.CAConstraint      = CAConstraint
         self.model             = model
         self.ndof              = self.model.nbDofs()
@@ -82,6 +88,7 @@ class ContactAvoidanceConstraintUpdater:
 
     def add_contactAvoidance(self, body1, body2):
         self.contact_connector.addInteraction(body1, body2)
+        requestSegmentsState(self.model, [self.model.getSegmentIndex(b) for b in (body1, body2) if b in self.seg_names])
 
     def remove_contactAvoidance(self, body1, body2):
         self.contact_connector.removeInteraction(vbody1, body2)
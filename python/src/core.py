@@ -19,12 +19,21 @@ import physicshelper
 import swig_isir_controller as sic
 
 from numpy import sqrt
+import numpy as np
 
 import json
+import os
+import re
+import warnings
 
-from time import time as ctime
+from buffers import TimingRecorder, RingBuffer, NpyAppender, monotonic_time as ctime
+from profiling import SamplingProfiler
+from events import Signal
+import task_controller
+
+import threading
+from collections import deque
 
-import time
 
 ################################################################################
 ################################################################################
@@ -61,16 +70,65 @@ _CartesianDofs = {
 }
 
 
+# status of a control tick, recorded in the "fallback" performance channel
+_TICK_SOLVED         = 0
+_TICK_SKIPPED        = 1     # the solve was skipped because it would end after the deadline
+_TICK_SOLVER_FAILED  = 2     # the solver raised an error or returned a non finite torque
+_TICK_UPDATERS_LATE  = 3     # the model and updaters update already ended after the deadline
+_TICK_UPDATER_FAILED = 4     # an updater raised an error
+
+_FALLBACKS = ("previous", "gravity", "damping")
+
+_SNAPSHOT_FIELDS = ("tick", "q", "qdot", "Hroot", "Troot", "tau")    # fields of the queue given to setSnapshotQueue
+
+
 ################################################################################
 ################################################################################
 ################################################################################
+class _UpdaterSlot(object):
+    """ Schedule and cost of an updater registered in :class:`ISIRController`.
+    """
+    def __init__(self, updater, name, decimation, phase):
+        self.updater    = updater
+        self.name       = name
+        self.decimation = decimation
+        self.phase      = phase
+        self.recorder   = None      # TimingRecorder of each call, when enabled
+        self.clear()
+
+    def clear(self):
+        self.calls    = 0
+        self.total    = 0.
+        self.max      = 0.
+        self.failures = 0
+        if self.recorder is not None:
+            self.recorder.clear()
+
+    def is_due(self, tick):
+        return (tick - self.phase) % self.decimation == 0
+
+    def get_cost(self, n_ticks):
+        """ Get the cost of the updater, with its mean time per call and per control tick over `n_ticks` ticks.
+        """
+        cost = {"decimation": self.decimation,
+                "phase"     : self.phase,
+                "calls"     : self.calls,
+                "mean"      : self.total/self.calls if self.calls else 0.,
+                "max"       : self.max,
+                "failures"  : self.failures,
+                "per_tick"  : self.total/n_ticks if n_ticks else 0.}
+        if self.recorder is not None:
+            cost["timing"] = self.recorder.get_summary()
+        return cost
+
+
 class ISIRController(xdefw.rtt.Task):
     """ Proxy of orcisir_ISIRController.
     """
 
     _NBISIRCTRL = 0
 
-    def __init__(self, dynamic_model, robot_name, physic_agent, sync_connector=None, solver="quadprog", reduced_problem=False,      create_function_name="Create", controller_name="ISIRController"):
+    def __init__(self, dynamic_model, robot_name, physic_agent, sync_connector=None, solver="quadprog", reduced_problem=False,      create_function_name="Create", controller_name="ISIRController", perf_capacity=60000, perf_deadline=None):
         """ Instantiate proxy of controller.
 
         :param dynamic_model: The dynamic model based on the controlled robot
@@ -80,6 +138,8 @@ class ISIRController(xdefw.rtt.Task):
         :param sync_connector: the synchronisation connector when this is required (in the WorldManager package, it is ``WorldManager.icsync``)
         :param string solver: Choose the internal solver; for now "quadprog" or "qld"
         :param bool reduced_problem: whether one want to solve the problem in **[ddq, torque, fc]** (True) or **[torque, fc]** (False)
+        :param int perf_capacity: The number of ticks kept in the performance buffers; the statistics cover the whole run
+        :param double perf_deadline: The duration of a tick (in second) above which it is counted as a deadline miss; None for no deadline
         """
         super(ISIRController, self).__init__(rtt_interface.PyTaskFactory.CreateTask("ISIRController_Task_"+str(ISIRController._NBISIRCTRL)))
         ISIRController._NBISIRCTRL += 1
@@ -105,6 +165,8 @@ class ISIRController(xdefw.rtt.Task):
         self.Troot      = None
 
         self.clock_counter    = 0
+        self.tick_signal      = Signal()    # notified at the end of each tick
+        self.deadline_signal  = Signal()    # notified at the end of the ticks which miss the deadline or publish a fallback torque
 
         # create connector in the physical agent: out.connector for robot state, and in.connector for tau
         robotPrefix = robot_name+"_"
@@ -151,9 +213,54 @@ class ISIRController(xdefw.rtt.Task):
 
         self.controller = sic.ISIRController(controller_name, self.dynamic_model, self.solver, reduced_problem)
 
+        self.model_snapshot = ModelSnapshot(self.dynamic_model)
+
         self.registered_tasks       = []
         self.registered_constraints = []
         self.registered_updaters    = []
+        self._updater_slots         = []
+        self._updaters_timing       = None     # capacity of the per-updater recorders, None if disabled
+        self._tasks_timing          = None     # capacity of the per-task recorders, None if disabled
+        self._timed_tasks           = []
+        self.period                 = None
+
+        self._profiler          = None     # owned by the control thread
+        self._profile_ticks     = 0
+        self._profile_outfile   = None
+        self._profile_requests  = deque()  # (n_ticks, interval, outfile) posted by startProfiling
+
+        #########################
+        # Performance recorders #
+        #########################
+        self._perf_timeline        = RingBuffer(perf_capacity)
+        self._perf_model_update    = TimingRecorder(perf_capacity)
+        self._perf_updaters_update = TimingRecorder(perf_capacity)
+        self._perf_compute_output  = TimingRecorder(perf_capacity)
+        self._perf_tick            = TimingRecorder(perf_capacity, perf_deadline)
+        self._perf_export_dir      = None
+        self._perf_export_files    = {}       # channel name -> NpyAppender
+        self._perf_exported        = {}       # channel name -> number of samples recorded when last exported
+        self._perf_exported_ctrl   = {}       # idem for the channels of the controller, which are not cleared at start
+        self.perf_export_lost      = {}       # channel name -> number of samples overwritten before their export
+        self._perf_fallback        = RingBuffer(perf_capacity, dtype=np.int8)
+
+        ####################
+        # Deadline monitor #
+        ####################
+        self._deadline          = None
+        self._fallback          = "previous"
+        self._fallback_damping  = 0.
+        self._solve_estimate    = 0.
+        self._last_tau          = None
+        self.skipped_solves     = 0
+        self.solver_failures    = 0
+        self.last_solver_error  = None
+        self.updater_overruns   = 0
+        self.updater_failures   = 0
+        self.last_updater_error = None
+
+        self._snapshot_queue    = None
+        self._snapshot_target   = None     # the queue and the storage of its fields, written in place by the update hook
 
 
     def add_constraint(self, const):
@@ -166,19 +273,208 @@ class ISIRController(xdefw.rtt.Task):
         self.controller.removeConstraint(const)
         return const
 
-    def add_updater(self, updater):
+    def setDeadline(self, deadline, fallback="previous", damping=1.):
+        """ Set the deadline of the control ticks, after which a fallback torque is published instead of the solution.
+
+        :param double deadline: The max duration of the model and updaters update plus the solve, in second; None to disable the monitor
+        :param string fallback: The torque published when the deadline cannot be met or the solver fails; one of
+                                "previous" (the last solution), "gravity" (the gravity compensation) or "damping" (``-damping*qdot``)
+        :param double damping: The joint damping of the "damping" fallback
+
+        The solve cannot be interrupted, so it is skipped when its expected duration, the duration of the last solve
+        (halved at each skipped tick), would end the tick after the deadline. A solve which ends late anyway is published,
+        as it is not later than a fallback would be, and is counted as a deadline miss of the tick.
+        The solve is also skipped when the model and updaters update alone already ends after the deadline.
+        Errors of the solver and of the updaters do not stop the controller when the monitor is enabled: the other
+        updaters are still updated, and the fallback torque is published for the tick.
+        The events are counted in :meth:`getPerformances`, with the key ``deadline``, and each tick status in the channel ``fallback``:
+        0 if solved, 1 if the solve was skipped, 2 if the solver failed, 3 if the updaters ended after the deadline,
+        4 if an updater failed. The :attr:`deadline_signal` is notified at the end of the ticks which are late or
+        publish a fallback torque.
+        """
+        if fallback not in _FALLBACKS:
+            raise ValueError("fallback '"+str(fallback)+"' is invalid; It should be one of 'previous', 'gravity', 'damping'")
+        self._deadline          = deadline
+        self._fallback          = fallback
+        self._fallback_damping  = damping
+        self._perf_tick.deadline = deadline
+
+    def setSnapshotQueue(self, queue):
+        """ Set the queue to which the state of each tick is pushed, to update observers out of the control loop.
+
+        :param queue: The queue with the fields ``tick, q, qdot, Hroot, Troot, tau``; None to stop pushing
+        :type  queue: :class:`buffers.SnapshotQueue`
+
+        The snapshot is pushed after the torque is written, and is dropped if the queue is full, so the observers
+        never delay the output. The numbers of pushed and dropped snapshots are given by :meth:`getPerformances`,
+        with the key ``snapshots``. See :class:`observers.ObserverThread`.
+        """
+        self._snapshot_queue  = queue
+        self._snapshot_target = None if queue is None else (queue, ) + tuple(queue.get_storage(name) for name in _SNAPSHOT_FIELDS)
+
+    def createTargetBatch(self, tasks, expressed_in_world=False, skip_unchanged=False):
+        """ Create a :class:`task_controller.TargetBatch` to set the desired values of `tasks` from one array per tick.
+
+        :param list tasks: The registered tasks whose targets are set together
+        :param bool expressed_in_world: Whether the velocities and accelerations are expressed in the reference frame instead of the task frame
+        :param bool skip_unchanged: Whether to skip the tasks whose row did not change since the last write;
+                                    only valid if nothing else writes their targets
+
+        The batch is not registered as an updater; it is done with ``add_updater(batch)`` when its buffer is filled in place.
+        The targets are still written by one setter call per field of each task, see :class:`task_controller.TargetBatch`.
+        """
+        return task_controller.TargetBatch(tasks, expressed_in_world, skip_unchanged)
+
+    def setPeriod(self, period):
+        """ Set the time between 2 control ticks, in second, to register updaters by rate.
+        """
+        self.period = period
+
+    def add_updater(self, updater, decimation=1, phase=None, rate=None):
+        """ Register an object whose method ``update()`` is called during the control ticks, before computing the output.
+
+        :param updater: The object to update
+        :param int decimation: The updater is called once every `decimation` ticks
+        :param int phase: The tick offset of the calls, in ``[0, decimation)``; if None, it is chosen to
+                          minimize the number of decimated updaters called on the same tick
+        :param double rate: The frequency of the calls in Hz, used instead of `decimation` if given; it needs the period set with :meth:`setPeriod`
+
+        The updater is called on the ticks ``k`` where ``(k - phase) % decimation == 0``, so its own
+        time step, if any, should be ``decimation`` times the control period.
+
+        """
+        if rate is not None:
+            if self.period is None:
+                raise ValueError("Cannot register an updater by rate without the controller period, see setPeriod")
+            decimation = max(int(round(1./(rate*self.period))), 1)
+        decimation = int(decimation)
+        if decimation < 1:
+            raise ValueError("The decimation of an updater must be a positive integer, got "+str(decimation))
+        if phase is None:
+            phase = self._get_least_loaded_phase_(decimation)
+        elif not 0 <= phase < decimation:
+            raise ValueError("The phase of an updater must be in [0, "+str(decimation)+"), got "+str(phase))
+
+        name  = getattr(updater, "name", None) or updater.__class__.__name__
+        names = [slot.name for slot in self._updater_slots]
+        if name in names:
+            i = 2
+            while name+"#"+str(i) in names:
+                i += 1
+            name = name+"#"+str(i)
+
+        slot = _UpdaterSlot(updater, name, decimation, phase)
+        if self._updaters_timing is not None:
+            slot.recorder = TimingRecorder(self._updaters_timing)
         self.registered_updaters.append(updater)
+        self._updater_slots.append(slot)
         return updater
 
+    def _get_least_loaded_phase_(self, decimation):
+        if decimation == 1:
+            return 0
+        others  = [slot for slot in self._updater_slots if slot.decimation > 1]
+        horizon = decimation*max([slot.decimation for slot in others] + [1])
+        def collisions(phase):
+            return sum( sum(1 for t in range(phase, horizon, decimation) if slot.is_due(t)) for slot in others)
+        return min(range(decimation), key=collisions)
+
     def remove_updater(self, updater):
         self.registered_updaters.remove(updater)
+        self._updater_slots = [slot for slot in self._updater_slots if slot.updater is not updater]
         return updater
 
+    def getUpdatersCosts(self):
+        """ Get the cost of each registered updater, keyed by its name (its attribute ``name``, else its class name).
+
+        :return: a dictionary ``{name: cost}``, where ``cost`` is a dictionary with keys ``decimation``, ``phase``,
+                 ``calls``, ``failures``, and the times ``mean`` and ``max`` per call and ``per_tick``, averaged over all the ticks
+
+        The calls and their times are only measured while the timing is enabled with :meth:`setUpdatersTiming`.
+        """
+        return dict((slot.name, slot.get_cost(self._perf_tick.count)) for slot in self._updater_slots)
+
+    def setUpdatersTiming(self, enabled=True, capacity=None):
+        """ Enable or disable the recording of the duration of each updater call.
+
+        :param bool enabled: Whether to record the calls of all the registered and future updaters
+        :param int capacity: The number of calls kept per updater; if None, the capacity of the other performance buffers
+
+        When enabled, the statistics of each updater are given by :meth:`getUpdatersCosts`, and its
+        last durations by :meth:`getPerformances` with the key ``"updater."+name``.
+        When disabled, the update hook calls the updaters without measuring them.
+        """
+        if enabled:
+            capacity = capacity if capacity is not None else self._perf_tick.capacity
+            for slot in self._updater_slots:
+                slot.recorder = TimingRecorder(capacity)
+            self._updaters_timing = capacity
+        else:
+            self._updaters_timing = None
+            for slot in self._updater_slots:
+                slot.recorder = None
+
+    def setTasksTiming(self, enabled=True, capacity=None):
+        """ Enable or disable the recording of the time spent in the python setters of each registered task, per tick.
+
+        :param bool enabled: Whether to time the calls of all the registered and future tasks
+        :param int capacity: The number of ticks kept per task; if None, the capacity of the other performance buffers
+
+        It measures the python side of the tasks, i.e. the time spent in the task and target state methods
+        (e.g. target writes by the updaters, gain or weight changes), accumulated per tick even when the
+        task is not called. It is not the cost of the task in the solver: the features, Jacobians and matrices of the
+        tasks are updated inside :meth:`orcisir_ISIRController.computeOutput`, whose phases are given by the controller
+        performances. The times are given by :meth:`getTasksSetterTimes`.
+        """
+        if enabled:
+            self._tasks_timing = capacity if capacity is not None else self._perf_tick.capacity
+        else:
+            self._tasks_timing = None
+        for task in self.registered_tasks:
+            task._set_timing_(TimingRecorder(self._tasks_timing) if enabled else None)
+        self._timed_tasks = list(self.registered_tasks) if enabled else []
+
+    def getTasksSetterTimes(self):
+        """ Get the time spent in the python setters of each timed task, keyed by its name, see :meth:`setTasksTiming`.
+
+        :return: a dictionary ``{name: {"calls": ..., "per_tick": ..., "timing": ...}}`` where ``timing``
+                 is the summary of the setter time per tick, see :meth:`buffers.TimingRecorder.get_summary`
+
+        """
+        return dict((task.name, {"calls"   : task.calls,
+                                 "per_tick": task.recorder.get_mean(),
+                                 "timing"  : task.recorder.get_summary()}) for task in self._timed_tasks)
+
+    def startProfiling(self, n_ticks, interval=1e-4, outfile=None):
+        """ Profile the next control ticks by sampling the stack of the control thread, see :class:`profiling.SamplingProfiler`.
+
+        :param int n_ticks: The number of ticks to profile
+        :param double interval: The time between 2 samples, in second
+        :param outfile: The file name where the profile is written at the end; if None, it is printed
+
+        The profiler is started on the next tick, and its result can be also obtained with :meth:`getProfile`.
+        The request is only posted here: the profiler is started and stopped by the control thread, which owns it.
+        The profile is written by the sampler thread, so it does not delay the control thread.
+        A profiling still running is stopped, without writing its profile.
+        When no profiling is requested, the update hook only tests one counter and one queue.
+        """
+        self._profile_requests.append((int(n_ticks), interval, outfile))
+
+    def getProfile(self):
+        """ Get the last profiler started with :meth:`startProfiling`, or None.
+        """
+        return self._profiler
+
     def startHook(self):
-        self._perf_timeline        = []
-        self._perf_model_update    = []
-        self._perf_updaters_update = []
-        self._perf_compute_output  = []
+        for rec in self._get_perf_recorders_().values() + [self._perf_timeline, self._perf_fallback] + self._updater_slots:
+            rec.clear()
+        for task in self._timed_tasks:
+            task._clear_timing_()
+        self.skipped_solves   = 0
+        self.solver_failures  = 0
+        self.updater_overruns = 0
+        self.updater_failures = 0
+        self._perf_exported = {}
 
     def stopHook(self):
         pass
@@ -204,68 +500,392 @@ class ISIRController(xdefw.rtt.Task):
             self.Hroot_ok = False
             self.Troot_ok = False
 
-            self._perf_timeline.append(ctime())
+            if self._profile_requests:
+                self._restartProfiling_(*self._profile_requests.popleft())
+
+            _t_start = ctime()
+            self._perf_timeline.append(_t_start)
 
             # update model
-            _t = ctime()
+            _t = _t_start
             if self.dynamic_model.hasFixedRoot():
                 self.dynamic_model.setState(self.q, self.qdot)
             else:
                 self.dynamic_model.setState(self.Hroot, self.q, self.Troot, self.qdot)
-            self._perf_model_update.append(ctime() -_t)
+            if self.model_snapshot.active:
+                self.model_snapshot.update()
+            _t_end = ctime()
+            self._perf_model_update.record(_t_end - _t)
 
             # update updaters
-            _t = ctime()
-            for upd in self.registered_updaters:
-                upd.update()
-            self._perf_updaters_update.append(ctime() -_t)
+            _t = _t_end
+            _n_missed = self._countDeadlineEvents_()
+            _updaters_ok = self._updateUpdaters_()
+            _t_end = ctime()
+            self._perf_updaters_update.record(_t_end - _t)
 
             # compute output
-            _t = ctime()
-            tau = self.controller.computeOutput()
-            self._perf_compute_output.append(ctime() - _t)
+            _t = _t_end
+            if self._deadline is None:
+                tau = self.controller.computeOutput()
+            else:
+                tau = self._computeOutputBeforeDeadline_(_t - _t_start, _updaters_ok)
+            _t_end = ctime()
+            self._perf_compute_output.record(_t_end - _t)
+            self._perf_tick.record(_t_end - _t_start)
+            for task in self._timed_tasks:
+                task._record_tick_()
 
             self.tau_port.write(tau)
 
+            _snapshot_target = self._snapshot_target
+            if _snapshot_target is not None:
+                self._pushSnapshot_(_snapshot_target, tau)
+
             self.clock_counter += 1
+            self.tick_signal.notify()
+            if self._countDeadlineEvents_() != _n_missed:
+                self.deadline_signal.notify()
+
+            if self._profile_ticks > 0:
+                self._profile_ticks -= 1
+                if self._profile_ticks <= 0:
+                    profiler = self._profiler
+                    profiler.stop(on_stopped=lambda p=profiler, f=self._profile_outfile: p.dump(f))
             
       
 
 
 
+    def _pushSnapshot_(self, target, tau):
+        """ Write the state of the tick in the next free slot of the snapshot queue, without temporary arrays.
+        """
+        queue, tick_s, q_s, qdot_s, Hroot_s, Troot_s, tau_s = target
+        i = queue.reserve()
+        if i is None:
+            return
+        tick_s[i] = self.clock_counter
+        q_s[i]    = np.ravel(self.q)
+        qdot_s[i] = np.ravel(self.qdot)
+        tau_s[i]  = np.ravel(tau)
+        task_controller.displacement2array(self.Hroot, Hroot_s[i])
+        task_controller.twist2array(self.Troot, Troot_s[i])
+        queue.publish()
+
+    def _restartProfiling_(self, n_ticks, interval, outfile):
+        """ Stop the running profiler, without writing its profile, and start a new one for `n_ticks` ticks.
+
+        It is called by the control thread only, when it gets a request posted by :meth:`startProfiling`.
+        """
+        profiler = self._profiler
+        if profiler is not None and profiler.is_running():
+            profiler.stop(on_stopped=lambda: None)
+        self._profile_ticks   = 0
+        self._profile_outfile = outfile
+        if n_ticks > 0:
+            self._profiler = SamplingProfiler(threading.current_thread().ident, interval)
+            self._profiler.start()
+            self._profile_ticks = n_ticks
+
+    def _updateUpdaters_(self):
+        """ Update the updaters due at this tick; they are only timed when enabled with :meth:`setUpdatersTiming`.
+
+        :return: False if an updater failed; its error is only caught when the deadline monitor is enabled
+        """
+        if self._updaters_timing is not None:
+            return self._updateTimedUpdaters_()
+        updaters_ok = True
+        tick = self.clock_counter
+        for slot in self._updater_slots:
+            if slot.decimation == 1 or slot.is_due(tick):
+                try:
+                    slot.updater.update()
+                except Exception as e:
+                    if self._deadline is None:
+                        raise
+                    self._countUpdaterFailure_(slot, e)
+                    updaters_ok = False
+        return updaters_ok
+
+    def _updateTimedUpdaters_(self):
+        updaters_ok = True
+        tick = self.clock_counter
+        for slot in self._updater_slots:
+            if slot.decimation == 1 or slot.is_due(tick):
+                _t_upd = ctime()
+                try:
+                    slot.updater.update()
+                except Exception as e:
+                    if self._deadline is None:
+                        raise
+                    self._countUpdaterFailure_(slot, e)
+                    updaters_ok = False
+                _dt_upd = ctime() - _t_upd
+                slot.calls += 1
+                slot.total += _dt_upd
+                if _dt_upd > slot.max:
+                    slot.max = _dt_upd
+                recorder = slot.recorder
+                if recorder is not None:
+                    recorder.record(_dt_upd)
+        return updaters_ok
+
+    def _countUpdaterFailure_(self, slot, error):
+        slot.failures          += 1
+        self.updater_failures  += 1
+        self.last_updater_error = error
+
+    def _countDeadlineEvents_(self):
+        return (self._perf_tick.deadline_misses + self.skipped_solves + self.solver_failures
+                + self.updater_overruns + self.updater_failures)
+
+    def _computeOutputBeforeDeadline_(self, elapsed, updaters_ok=True):
+        """ Compute the output if it can be done before the deadline, else get the fallback torque.
+
+        :param double elapsed: The time elapsed since the beginning of the tick
+        :param bool updaters_ok: Whether all the updaters succeeded; if not, the fallback torque is returned
+        """
+        if not updaters_ok:
+            self._perf_fallback.append(_TICK_UPDATER_FAILED)
+            return self._getFallbackTorque_()
+
+        if elapsed > self._deadline:
+            self.updater_overruns += 1
+            self._perf_fallback.append(_TICK_UPDATERS_LATE)
+            return self._getFallbackTorque_()
+
+        if elapsed + self._solve_estimate > self._deadline:
+            self._solve_estimate *= .5
+            self.skipped_solves  += 1
+            self._perf_fallback.append(_TICK_SKIPPED)
+            return self._getFallbackTorque_()
+
+        _t = ctime()
+        try:
+            tau = self.controller.computeOutput()
+            if not np.all(np.isfinite(tau)):
+                raise ValueError("the controller output is not finite")
+        except Exception as e:
+            self.solver_failures  += 1
+            self.last_solver_error = e
+            self._perf_fallback.append(_TICK_SOLVER_FAILED)
+            return self._getFallbackTorque_()
+        finally:
+            self._solve_estimate = ctime() - _t
+
+        self._perf_fallback.append(_TICK_SOLVED)
+        self._last_tau = tau.copy()
+        return tau
+
+    def _getFallbackTorque_(self):
+        if self._fallback == "previous" and self._last_tau is not None:
+            return self._last_tau
+        elif self._fallback == "damping":
+            return -self._fallback_damping*np.asarray(self.qdot, dtype=float).reshape(-1)
+        else:
+            return np.array(self.dynamic_model.getGravityTerms(), dtype=float).reshape(-1)[-self.dynamic_model.nbInternalDofs():]
+
     def getModel(self):
         return self.dynamic_model
 
     def getController(self):
         return self.controller
 
+    def getModelSnapshot(self):
+        """ Get the snapshot of the model state taken at each tick, to give to the updaters instead of the model, see :class:`ModelSnapshot`.
+
+        The snapshot is only taken once it has been requested, so it costs nothing to the controllers which do not use it.
+        """
+        self.model_snapshot.activate()
+        return self.model_snapshot
+
     ########################################
     # Wait for a period of controller time #
     ########################################
-    def waitSimTime(self, t_total, dt):
-        while self.clock_counter*dt <= t_total:
-          time.sleep(1e-3)
+    def waitSimTime(self, t_total, dt, timeout=None):
+        """ Block until the controller time is greater than `t_total`, woken up by the ticks of the controller.
+
+        :param double t_total: The controller time to wait for, in second
+        :param double dt: The time step of the controller
+        :param double timeout: The max real time to wait, in second; None to wait forever
+
+        :return: True if the time is reached, False if the timeout expired
+
+        """
+        return self.tick_signal.wait_for(lambda: self.clock_counter*dt > t_total, timeout)
+
+    def waitSimTimeAsync(self, t_total, dt, loop=None):
+        """ Get an asyncio future done when the controller time is greater than `t_total`, see :meth:`waitSimTime`.
+        """
+        return self.tick_signal.as_future(lambda: self.clock_counter*dt > t_total, loop)
         
     ################################
     # Get performances information #
     ################################
-    def getPerformances(self):
-        """ Get performances from the controller in a JSON style. """
+    def _get_perf_recorders_(self):
+        return {"model_update"   : self._perf_model_update,
+                "updaters_update": self._perf_updaters_update,
+                "compute_output" : self._perf_compute_output,
+                "tick"           : self._perf_tick}
+
+    def getPerformances(self, summary=False, window=None):
+        """ Get performances from the controller in a JSON style.
+
+        :param bool summary: If True, return the statistics of each phase of the update hook over the whole run,
+                             see :meth:`buffers.TimingRecorder.get_summary`; else the raw samples
+        :param int window: The number of last ticks to return for the raw samples; None for all the samples kept in the buffers
+
+        The raw samples of the update hook (``timeline``, ``model_update``, ``updaters_update``, ``compute_output``, ``tick``)
+        are merged with those of the controller, which are cut to the same ticks.
+        Times are given by a monotonic clock, in second.
+        """
+        if summary is True:
+            perf = dict((name, rec.get_summary()) for name, rec in self._get_perf_recorders_().items())
+            perf["updaters"] = self.getUpdatersCosts()
+            perf["tasks_setters"] = self.getTasksSetterTimes()
+            perf["deadline"] = {"deadline"        : self._deadline,
+                                "fallback"        : self._fallback,
+                                "skipped_solves"  : self.skipped_solves,
+                                "solver_failures" : self.solver_failures,
+                                "updater_overruns": self.updater_overruns,
+                                "updater_failures": self.updater_failures,
+                                "late_ticks"      : self._perf_tick.deadline_misses}
+            if self._perf_export_dir is not None:
+                perf["export"] = {"dirname": self._perf_export_dir,
+                                  "lost"   : dict(self.perf_export_lost)}
+            if self._snapshot_queue is not None:
+                perf["snapshots"] = {"pushed" : self._snapshot_queue.pushed,
+                                     "dropped": self._snapshot_queue.dropped,
+                                     "pending": len(self._snapshot_queue)}
+            return perf
+
+        timeline = self._perf_timeline.get_window(window)
+        n_ticks  = len(timeline)
         perf = json.loads(self.controller.getPerformances())
-        perf.update({ "timeline"       : self._perf_timeline,
-                      "model_update"   : self._perf_model_update,
-                      "updaters_update": self._perf_updaters_update,
-                      "compute_output" : self._perf_compute_output})
+        for k, v in perf.items():
+            if isinstance(v, list):
+                perf[k] = v[len(v)-n_ticks:] if n_ticks else []
+        perf["timeline"] = timeline.tolist()
+        for name, rec in self._get_perf_recorders_().items():
+            perf[name] = rec.get_window(n_ticks).tolist()
+        for slot in self._updater_slots:
+            if slot.recorder is not None:
+                perf["updater."+slot.name] = slot.recorder.get_window(n_ticks).tolist()
+        for task in self._timed_tasks:
+            perf["task_setters."+task.name] = task.recorder.get_window(n_ticks).tolist()
+        if self._deadline is not None:
+            perf["fallback"] = self._perf_fallback.get_window(n_ticks).tolist()
         return perf
 
+    def _get_perf_channels_(self):
+        """ Get the performance channels of the update hook as ``{name: (number of recorded samples, function returning the n last samples)}``.
+        """
+        channels = {"timeline": (self._perf_timeline.count, self._perf_timeline.get_window)}
+        for name, rec in self._get_perf_recorders_().items():
+            channels[name] = (rec.count, rec.get_window)
+        for slot in self._updater_slots:
+            if slot.recorder is not None:
+                channels["updater."+slot.name] = (slot.recorder.count, slot.recorder.get_window)
+        for task in self._timed_tasks:
+            channels["task_setters."+task.name] = (task.recorder.count, task.recorder.get_window)
+        if self._perf_fallback.count:
+            channels["fallback"] = (self._perf_fallback.count, self._perf_fallback.get_window)
+
+        return channels
+
+    def _get_controller_perf_channels_(self, keys=None):
+        """ Get the performance channels of the controller, like :meth:`_get_perf_channels_`.
+
+        :param list keys: The names of the channels; if None, all the channels, which needs to parse the whole JSON of the controller
+        """
+        perf_json = self.controller.getPerformances()
+        if keys is None:
+            items = json.loads(perf_json).items()
+        else:
+            items   = []
+            decoder = json.JSONDecoder()
+            for key in keys:
+                m = re.search('"'+re.escape(key)+'"\\s*:\\s*', perf_json)
+                if m is not None:
+                    items.append((key, decoder.raw_decode(perf_json, m.end())[0]))
+
+        channels = {}
+        for k, v in items:
+            if isinstance(v, list):
+                channels[k] = (len(v), lambda n, v=v: v[len(v)-n:])
+        return channels
+
+    def exportPerformances(self, dirname, channels=None):
+        """ Append the performance samples recorded since the last export to one .npy file per channel.
+
+        :param string dirname: The directory of the files, created if needed; exporting to another directory starts new files
+        :param list channels: The names of the exported channels; if None, all of them.
+                              Selecting them avoids to parse the whole performances of the controller at each export.
+
+        It can be called periodically during the run, e.g. before the buffers are full, to save all the samples.
+        Each channel of :meth:`getPerformances` is written in the file ``dirname/<channel>.npy``, which is valid
+        at any time and can be memory-mapped, see :class:`buffers.NpyChannels` and :func:`performances.plot_performances`.
+        The samples overwritten in the buffers since the last export are written as NaN to keep the channels aligned,
+        with a warning, and are counted in :attr:`perf_export_lost`. The buffers are cleared at start, so the export
+        of the next run starts after the samples of the previous one.
+
+        :return: a dictionary with the number of samples appended to each channel
+
+        """
+        if dirname != self._perf_export_dir:
+            for f in self._perf_export_files.values():
+                f.close()
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            self._perf_export_dir     = dirname
+            self._perf_export_files   = {}
+            self._perf_exported       = {}
+            self._perf_exported_ctrl  = {}
+
+        hook_channels = self._get_perf_channels_()
+        if channels is None:
+            ctrl_channels = self._get_controller_perf_channels_()
+        else:
+            hook_channels = dict((name, c) for name, c in hook_channels.items() if name in channels)
+            ctrl_keys     = [name for name in channels if name not in hook_channels]
+            ctrl_channels = self._get_controller_perf_channels_(ctrl_keys) if ctrl_keys else {}
+
+        appended = {}
+        for exported, chans in ((self._perf_exported, hook_channels), (self._perf_exported_ctrl, ctrl_channels)):
+            for name, (count, get_window) in chans.items():
+                n = count - exported.get(name, 0)
+                if n < 0:       # the recorder was replaced, e.g. by setUpdatersTiming
+                    n = count
+                if n > 0:
+                    appended[name] = self._export_channel_(name, n, get_window)
+                exported[name] = count
+        return appended
+
+    def _export_channel_(self, name, n, get_window):
+        if name not in self._perf_export_files:
+            self._perf_export_files[name] = NpyAppender(os.path.join(self._perf_export_dir, name+".npy"))
+        f    = self._perf_export_files[name]
+        data = get_window(n)
+        lost = n - len(data)
+        if lost:
+            self.perf_export_lost[name] = self.perf_export_lost.get(name, 0) + lost
+            warnings.warn(str(lost)+" samples of the performance channel '"+name+"' were overwritten before their export; they are exported as NaN")
+            f.append(np.full(lost, np.nan))
+        f.append(data)
+        f.flush()
+        return n
+
 
     ########################
     # Set task constructor #
     ########################
-    def _addRegisterTask_(self, ntask, mState, feat, tState=None, featDes=None, **kwargs):
+    def _addRegisterTask_(self, taskName, ntask, mState, feat, tState=None, featDes=None, **kwargs):
         self.controller.addTask(ntask)
-        itask = ISIRTask(ntask, mState, feat, tState, featDes, **kwargs)
+        itask = ISIRTask(ntask, mState, feat, tState, featDes, name=taskName, **kwargs)
         self.registered_tasks.append(itask)
+        if self._tasks_timing is not None:
+            itask._set_timing_(TimingRecorder(self._tasks_timing))
+            self._timed_tasks.append(itask)
         return itask
 
 
@@ -282,7 +902,7 @@ class ISIRController(xdefw.rtt.Task):
 
         fullTask = self.controller.createISIRTask(taskName, feat, featDes)
         fullTask.initAsAccelerationTask()
-        return self._addRegisterTask_(fullTask, FMS, feat, FTS, featDes, **kwargs)
+        return self._addRegisterTask_(taskName, fullTask, FMS, feat, FTS, featDes, **kwargs)
 
 
     def createPartialTask(self, taskName, dofs, whatPart=None, model=None, **kwargs):
@@ -313,7 +933,7 @@ class ISIRController(xdefw.rtt.Task):
 
         partialTask = self.controller.createISIRTask(taskName, feat, featDes)
         partialTask.initAsAccelerationTask()
-        return self._addRegisterTask_(partialTask, PMS, feat, PTS, featDes, **kwargs)
+        return self._addRegisterTask_(taskName, partialTask, PMS, feat, PTS, featDes, **kwargs)
 
 
     def createFrameTask(self, taskName, segmentName, H_segment_frame, dofs=None, model=None, **kwargs):
@@ -338,7 +958,7 @@ class ISIRController(xdefw.rtt.Task):
 
         frameTask = self.controller.createISIRTask(taskName, feat, featDes)
         frameTask.initAsAccelerationTask()
-        return self._addRegisterTask_(frameTask, SF, feat, TF, featDes, **kwargs)
+        return self._addRegisterTask_(taskName, frameTask, SF, feat, TF, featDes, **kwargs)
 
 
     def createCoMTask(self, taskName, dofs="XYZ", model=None, **kwargs):
@@ -355,7 +975,7 @@ class ISIRController(xdefw.rtt.Task):
 
         CoMTask = self.controller.createISIRTask(taskName, feat, featDes)
         CoMTask.initAsAccelerationTask()
-        return self._addRegisterTask_(CoMTask, CoMF, feat, TF, featDes, **kwargs)
+        return self._addRegisterTask_(taskName, CoMTask, CoMF, feat, TF, featDes, **kwargs)
 
 
     def createTorqueTask(self, taskName, dofs, model=None, **kwargs):
@@ -371,7 +991,7 @@ class ISIRController(xdefw.rtt.Task):
 
         torqueTask = self.controller.createISIRTask(taskName, feat, featDes)
         torqueTask.initAsTorqueTask()
-        return self._addRegisterTask_(torqueTask, PMS, feat, PTS, featDes, **kwargs)
+        return self._addRegisterTask_(taskName, torqueTask, PMS, feat, PTS, featDes, **kwargs)
 
 
 
@@ -386,7 +1006,7 @@ class ISIRController(xdefw.rtt.Task):
 
         forceTask = self.controller.createISIRTask(taskName, feat, featDes)
         forceTask.initAsForceTask()
-        return self._addRegisterTask_(forceTask, SF, feat, TF, featDes, **kwargs)
+        return self._addRegisterTask_(taskName, forceTask, SF, feat, TF, featDes, **kwargs)
 
 
     """ Create a contact task
@@ -406,7 +1026,23 @@ class ISIRController(xdefw.rtt.Task):
 
         contactTask = self.controller.createISIRContactTask(taskName, feat, mu, margin)
         contactTask.initAsAccelerationTask() # we control the acceleration of the contact point
-        return self._addRegisterTask_(contactTask, SF, feat, **kwargs)
+        return self._addRegisterTask_(taskName, contactTask, SF, feat, **kwargs)
+
+
+
+    def createContactSet(self, setName, segmentName, H_segment_frames, mu, margin=0, model=None, **kwargs):
+        """ Create the contact tasks of several points of a segment, grouped in a :class:`ContactSet`.
+
+        :param setName: The prefix of the identifiers of the tasks, which are ``setName+str(i)``
+        :param segmentName: The identifier of the segment that belongs to the model
+        :param list H_segment_frames: The offsets relative to the segment frame where we want the contacts
+        :param mu: Friction cone coefficient
+        :param margin:
+        :param model: The model of the robot
+
+        The other arguments are given to each contact task, see :meth:`createContactTask`.
+        """
+        return ContactSet([self.createContactTask(setName+str(i), segmentName, H, mu, margin, model, **kwargs) for i, H in enumerate(H_segment_frames)])
 
 
 
@@ -425,7 +1061,9 @@ class ISIRController(xdefw.rtt.Task):
         else:
             raise ValueError("taskType '"+taskType+"' is invalid; It should be one of 'acceleration', 'torque', 'force'")
 
-        return self._addRegisterTask_(genTask, modelState, modelFeature, targetState, targetFeature, **kwargs)
+        return self._addRegisterTask_(taskName, genTask, modelState, modelFeature, targetState, targetFeature, **kwargs)
+
+
 
 
 
@@ -434,26 +1072,191 @@ class ISIRController(xdefw.rtt.Task):
 
 
 
+def _freeze(value):
+    """ Get a copy of `value` which does not share memory with the model, read-only if it is an array.
+    """
+    if hasattr(value, "copy"):
+        value = value.copy()
+    if hasattr(value, "setflags"):
+        value.setflags(write=False)
+    return value
+
+
+
+class ModelSnapshot(object):
+    """ A read-only view of the state of a dynamic model at the current tick, which can be given to the updaters instead of the model.
+
+    The values of the getters listed in :attr:`CACHED_GETTERS` are read from the model at most once per tick,
+    copied, and shared by all the updaters; the values must not be modified. The values requested with :meth:`request`
+    are read right after the model update; the other values are read when they are first needed.
+    The other attributes are those of the model. The snapshot is only updated by the controller once it is
+    active, i.e. once it has been given by :meth:`ISIRController.getModelSnapshot` or a value has been requested.
+    """
+
+    CACHED_GETTERS = ("getJointPositions", "getJointVelocities", "getFreeFlyerPosition", "getFreeFlyerVelocity",
+                      "getCoMPosition", "getCoMVelocity", "getCoMJacobian", "getCoMJdotQdot",
+                      "getInertiaMatrix", "getNonLinearTerms", "getGravityTerms",
+                      "getSegmentPosition", "getSegmentVelocity", "getSegmentJacobian", "getSegmentJdotQdot")
+
+    def __init__(self, model):
+        """
+        :param model: The dynamic model whose state is read
+
+        """
+        self.model  = model
+        self.tick   = 0         # number of updates
+        self.active = False
+        self._cache     = {}    # (getter name, args) -> value
+        self._requested = []    # keys of the values read at each update
+
+        for name in self.CACHED_GETTERS:
+            setattr(self, name, self._make_getter_(name))
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _make_getter_(self, name):
+        def getter(*args):
+            return self._get_((name, ) + args)
+        return getter
+
+    def _get_(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = _freeze(getattr(self.model, key[0])(*key[1:]))
+            return value
+
+    def request(self, getter, *args):
+        """ Read a value right after each model update, e.g. ``request("getSegmentJacobian", index)``.
+
+        :param string getter: The name of the getter, in :attr:`CACHED_GETTERS`
+        :param args: The arguments of the getter
+
+        """
+        if getter not in self.CACHED_GETTERS:
+            raise ValueError("getter '"+getter+"' cannot be cached by the snapshot")
+        key = (getter, ) + args
+        if key not in self._requested:
+            self._requested.append(key)
+        self.activate()
+
+    def activate(self):
+        """ Make the controller update the snapshot at each tick.
+        """
+        if not self.active:
+            self._cache = {}    # the values cached while inactive may be outdated
+            self.active = True
+
+    def update(self):
+        """ Take the snapshot of the model, after its state has been set.
+        """
+        self._cache = {}
+        for key in self._requested:
+            self._get_(key)
+        self.tick += 1
+
+
+
+def _get_activation(task):
+    """ Get how `task` is activated, "objective", "constraint" or "inactive", as told by the task; None if it cannot tell.
+    """
+    try:
+        if task.isActiveAsObjective():
+            return "objective"
+        if task.isActiveAsConstraint():
+            return "constraint"
+    except AttributeError:
+        return None
+    return "inactive"
+
+
+class ContactSet(object):
+    """ A group of contact tasks, activated, deactivated and weighted together.
+
+    The set does not keep its own activation status, as its tasks can also be activated one by one,
+    e.g. through its iteration. When the tasks tell how they are activated (with ``isActiveAsObjective``
+    and ``isActiveAsConstraint``), only those which are not already activated in the requested way
+    are modified, so that activating the set again, e.g. at each tick of a support phase, does not modify
+    the problem of the controller. Else, all the tasks are modified at each call.
+    It can be iterated as the list of its tasks.
+    """
+
+    def __init__(self, tasks):
+        """
+        :param list tasks: The contact tasks of the set, see :meth:`ISIRController.createContactTask`
+
+        """
+        self.tasks = list(tasks)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+    def __getitem__(self, index):
+        return self.tasks[index]
+
+    @property
+    def status(self):
+        """ "objective", "constraint" or "inactive" if all the tasks are activated in the same way; else None, also when the tasks cannot tell.
+        """
+        status = set(_get_activation(t) for t in self.tasks)
+        return status.pop() if len(status) == 1 else None
+
+    def activateAsObjective(self):
+        for t in self.tasks:
+            if _get_activation(t) != "objective":
+                t.activateAsObjective()
+
+    def activateAsConstraint(self):
+        for t in self.tasks:
+            if _get_activation(t) != "constraint":
+                t.activateAsConstraint()
+
+    def deactivate(self):
+        for t in self.tasks:
+            if _get_activation(t) != "inactive":
+                t.deactivate()
+
+    def setWeight(self, weight):
+        for t in self.tasks:
+            t.setWeight(weight)
+
+
+
+
+
 
 
 class ISIRTask(object):
-    def __init__(self, task, modelState, modelFeature, targetState=None, targetFeature=None, **kwargs):
+    def __init__(self, task, modelState, modelFeature, targetState=None, targetFeature=None, name=None, **kwargs):
+        self.name           = name
         self._task          = task              #
         self._modelState    = modelState        # create this class to keep a ref on state and features.
         self._modelFeature  = modelFeature      # if not, they are not saved, are deleted by the garbage collector
         self._targetState   = targetState       # and future call of the task will lead to error because new state & feature are alredy deleted.
         self._targetFeature = targetFeature     # TODO: maybe a better solution with the use of acquire()
 
+        self._proxied       = {}                # the methods of the task & target state accessible by ISIRTask, see _set_timing_
+        self.recorder       = None
+        self.calls          = 0
+        self._setter_time   = 0.                # time spent in the proxied methods during the current tick
+
         # To set the task method directly accessible by ISIRTask
         for fnName in dir(self._task):
             if fnName[:1] != "_" and hasattr(getattr(self._task, fnName), "__call__"):
                 setattr(self, fnName, getattr(self._task, fnName))
+                self._proxied[fnName] = getattr(self._task, fnName)
 
         # Add targetState setter if any
         if self._targetState is not None:
             for fnName in dir(self._targetState):
                 if fnName[:3] != "set":
                     setattr(self, fnName, getattr(self._targetState, fnName))
+                    if fnName[:1] != "_" and hasattr(getattr(self._targetState, fnName), "__call__"):
+                        self._proxied[fnName] = getattr(self._targetState, fnName)
 
         if "kp" in kwargs:
             self.setStiffness(kwargs["kp"])
@@ -485,6 +1288,37 @@ class ISIRTask(object):
     def getTargetState(self):
         return self._targetState
 
+    ##########
+    # Timing #
+    ##########
+    def _set_timing_(self, recorder):
+        """ Time the calls of the proxied methods, accumulated per tick in `recorder`; if None, stop timing them.
+        """
+        self.recorder = recorder
+        for fnName, fn in self._proxied.items():
+            setattr(self, fnName, fn if recorder is None else self._make_timed_(fn))
+        self._clear_timing_()
+
+    def _make_timed_(self, fn):
+        def timed_fn(*args, **kwargs):
+            _t = ctime()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._setter_time += ctime() - _t
+                self.calls        += 1
+        return timed_fn
+
+    def _clear_timing_(self):
+        self.calls        = 0
+        self._setter_time = 0.
+        if self.recorder is not None:
+            self.recorder.clear()
+
+    def _record_tick_(self):
+        self.recorder.record(self._setter_time)
+        self._setter_time = 0.
+
 
 
 
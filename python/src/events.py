@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+""" Module to wait for the state changes of the control loop without polling.
+
+The control loop notifies a :class:`Signal` when its state changes (e.g. at each tick, or at each walking phase),
+and the waiting threads are only woken up then, to test their condition.
+"""
+
+import threading
+
+from buffers import monotonic_time
+
+
+
+def _get_asyncio():
+    try:
+        import asyncio
+    except ImportError:
+        import trollius as asyncio  # backport of asyncio for python 2
+    return asyncio
+
+
+def _set_future_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+
+class Signal(object):
+    """ A condition notified by the control loop when its state changes.
+
+    The conditions are tested by the waiting threads when the signal is notified, so they
+    should only read the state of the loop. When no thread is waiting, a notification only costs a test.
+    """
+
+    def __init__(self):
+        self.count      = 0         # number of notifications while someone was waiting
+        self._cond      = threading.Condition()
+        self._n_waiters = 0
+        self._callbacks = []        # list of (predicate, callback) called by the notifying thread
+
+    def notify(self):
+        """ Notify a change of state, and wake up the waiting threads.
+        """
+        if self._n_waiters or self._callbacks:
+            with self._cond:
+                self.count += 1
+                self._cond.notify_all()
+                fired = self._pop_fired_callbacks_()
+            for callback in fired:
+                callback()
+
+    def _pop_fired_callbacks_(self):
+        fired, pending = [], []
+        for predicate, callback in self._callbacks:
+            if predicate():
+                fired.append(callback)
+            else:
+                pending.append((predicate, callback))
+        self._callbacks = pending
+        return fired
+
+    def wait_for(self, predicate, timeout=None):
+        """ Block until `predicate` returns True, testing it at each notification.
+
+        :param predicate: A function without argument which returns whether the awaited state is reached
+        :param double timeout: The max time to wait, in second; None to wait forever
+
+        :return: the last value returned by `predicate`, i.e. False if the timeout expired
+
+        """
+        deadline = None if timeout is None else monotonic_time() + timeout
+        with self._cond:
+            self._n_waiters += 1
+            try:
+                result = predicate()
+                while not result:
+                    if deadline is None:
+                        self._cond.wait()
+                    else:
+                        remaining = deadline - monotonic_time()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    result = predicate()
+            finally:
+                self._n_waiters -= 1
+        return result
+
+    def when(self, predicate, callback):
+        """ Call `callback` when `predicate` returns True.
+
+        :param predicate: A function without argument, tested at each notification by the notifying thread
+        :param callback: A function without argument, called by the notifying thread, or immediately if `predicate` is already True
+
+        """
+        with self._cond:
+            if not predicate():
+                self._callbacks.append((predicate, callback))
+                return
+        callback()
+
+    def as_future(self, predicate, loop=None):
+        """ Get an asyncio future which is done when `predicate` returns True, to ``await`` it in an event loop.
+
+        :param predicate: A function without argument, tested at each notification by the notifying thread
+        :param loop: The event loop of the future; None for the current event loop
+
+        It needs the module ``asyncio``, or ``trollius`` with python 2.
+        """
+        asyncio = _get_asyncio()
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        future = loop.create_future() if hasattr(loop, "create_future") else asyncio.Future(loop=loop)
+        self.when(predicate, lambda: loop.call_soon_threadsafe(_set_future_result, future, True))
+        return future
@@ -7,6 +7,10 @@ import rtt_interface
 import numpy as np
 import lgsm
 
+from buffers import RecordBuffer, RingBuffer, SnapshotQueue, monotonic_time
+from task_controller import displacement2array, twist2array, quaternion2matrix, _LgsmWriter
+
+import threading
 import time
 import os
 
@@ -44,6 +48,25 @@ def computeZMPLIPM(CoMPosition, CoMVelocity, CoMAcceleration, H_plane_0, gravity
 
 
 
+def requestValues(dynModel, *getters):
+    """ Ask a :class:`core.ModelSnapshot` to read the values of some getters without argument right after each model update.
+
+    It does nothing if `dynModel` is a dynamic model, whose values are always read when needed.
+    """
+    if hasattr(dynModel, "request"):
+        for getter in getters:
+            dynModel.request(getter)
+
+
+def requestSegmentsState(dynModel, seg_indexes, getters=("getSegmentPosition", "getSegmentVelocity", "getSegmentJacobian", "getSegmentJdotQdot")):
+    """ Ask a :class:`core.ModelSnapshot` to read the state of some segments right after each model update, see :func:`requestValues`.
+    """
+    if hasattr(dynModel, "request"):
+        for idx in seg_indexes:
+            for getter in getters:
+                dynModel.request(getter, idx)
+
+
 def get_alldq(dynModel):
     dq = lgsm.zeros(dynModel.nbDofs())
     if dynModel.hasFixedRoot():
@@ -54,62 +77,79 @@ def get_alldq(dynModel):
     return dq
 
 
-def _getSegmentCoMPropertiesIn0(dm, index):
-        H_0_s        = dm.getSegmentPosition(index)
-        p_s_scom     = dm.getSegmentCoM(index)
-        J_s_0_s      = dm.getSegmentJacobian(index)
-        T_s_0_s      = dm.getSegmentVelocity(index)
-        dJ_s_0_s__dq = dm.getSegmentJdotQdot(index)
+def getSegmentsConstantProperties(dm):
+    """ Get the properties of all the segments which do not depend on the state of the model.
 
-        #inertia info
-        m         = dm.getSegmentMass(index)
-        Inertia   = lgsm.np.diag( [v for v in dm.getSegmentMomentsOfInertia(index).flat] )
+    :return: the masses (nseg,), the moments of inertia (nseg,3), and the CoM positions in the segment frames (nseg,3)
 
-        # CoM Position
-        p_0_scom     = H_0_s * p_s_scom
+    """
+    nseg     = dm.nbSegments()
+    m        = np.array([dm.getSegmentMass(i) for i in range(nseg)], dtype=float)
+    Inertia  = np.array([np.asarray(dm.getSegmentMomentsOfInertia(i), dtype=float).ravel() for i in range(nseg)])
+    p_s_scom = np.array([np.asarray(dm.getSegmentCoM(i), dtype=float).ravel() for i in range(nseg)])
+    return m, Inertia, p_s_scom
 
-        # CoM Jacobian
-        H_s_scomNoRot = lgsm.Displacement()
-        H_s_scomNoRot.setTranslation(p_s_scom)
-        H_s_scomNoRot.setRotation(H_0_s.getRotation().inverse())
-        Ad_scomNoRot_s = H_s_scomNoRot.inverse().adjoint()
-        J_scomNotRot_0_0 = Ad_scomNoRot_s * J_s_0_s     #scomNoRot has the same orientation as 0, so J_scomNotRot_0_scomNotRot = J_scomNotRot_0_0
-        J_scom_0_0 = J_scomNotRot_0_0 #[3:6,:]
-        
-        # CoM dJacobian_dq
-        T_scomNoRot_0_s  = lgsm.Twist(T_s_0_s)
-        T_scomNoRot_0_s.setLinearVelocity(lgsm.zeros(3))
-        dAd_scomNoRot_0_s = getDerivativeAdjoint(Ad_scomNoRot_s, T_scomNoRot_0_s)
-        dJ_scomNotRot_0_0__dq = Ad_scomNoRot_s * dJ_s_0_s__dq   +   dAd_scomNoRot_0_s * T_s_0_s
-        dJ_scom_0_0__dq = dJ_scomNotRot_0_0__dq #[3:6,:]
 
-        return m, Inertia, p_0_scom, J_scom_0_0, dJ_scom_0_0__dq
+def _getSegmentsCoMStateIn0(dm, p_s_scom):
+    """ Get the state of the CoM of all the segments, expressed in a frame with the orientation of the ground frame.
+
+    :return: the CoM positions (nseg,3), the CoM Jacobians (nseg,6,ndof), the CoM JdotQdot (nseg,6), the rotational velocities (nseg,3)
 
+    """
+    nseg      = len(p_s_scom)
+    H_0_s     = np.array([displacement2array(dm.getSegmentPosition(i)) for i in range(nseg)])
+    J_s_0_s   = np.array([np.asarray(dm.getSegmentJacobian(i), dtype=float) for i in range(nseg)])
+    T_s_0_s   = np.array([twist2array(dm.getSegmentVelocity(i)) for i in range(nseg)])
+    dJ_s_0_s__dq = np.array([twist2array(dm.getSegmentJdotQdot(i)) for i in range(nseg)])
 
-def computeZMP(dm, ddq, H_plane_0, gravity_vector):
-    dq          = get_alldq(dm)
+    R_0_s = quaternion2matrix(H_0_s[:, 3:7])
+    p_s_scom_in0 = np.einsum('nij,nj->ni', R_0_s, p_s_scom)
+    p_0_scom     = H_0_s[:, 0:3] + p_s_scom_in0
 
-    Resultante0 = lgsm.zeros(3)
-    Moment0     = lgsm.zeros(3)
-    for i in range(dm.nbSegments()):
-        m, Inertia, p_0_scom, J_scom_0_0, dJ_scom_0_0__dq = _getSegmentCoMPropertiesIn0(dm, i)
+    # The CoM frames have the orientation of the ground frame, so their adjoint relative to the segment frames
+    # rotates the twists by R_0_s, and moves their linear part with the offset of the CoM.
+    J_scom_0_0 = np.empty_like(J_s_0_s)
+    J_scom_0_0[:, 0:3] = np.einsum('nij,njk->nik', R_0_s, J_s_0_s[:, 0:3])
+    J_scom_0_0[:, 3:6] = np.einsum('nij,njk->nik', R_0_s, J_s_0_s[:, 3:6]) + np.cross(J_scom_0_0[:, 0:3], p_s_scom_in0[:, :, None], axis=1)
 
-        V_scom_0_0  = J_scom_0_0 * dq
-        dV_scom_0_0 = J_scom_0_0 * ddq  +  dJ_scom_0_0__dq
+    # The derivative of the adjoint only adds the term R_0_s * (w_s x v_s) to the linear part
+    dJ_scom_0_0__dq = np.empty((nseg, 6))
+    dJ_scom_0_0__dq[:, 0:3] = np.einsum('nij,nj->ni', R_0_s, dJ_s_0_s__dq[:, 0:3])
+    dJ_scom_0_0__dq[:, 3:6] = np.einsum('nij,nj->ni', R_0_s, dJ_s_0_s__dq[:, 3:6] + np.cross(T_s_0_s[:, 0:3], T_s_0_s[:, 3:6])) \
+                              + np.cross(dJ_scom_0_0__dq[:, 0:3], p_s_scom_in0)
 
-        linacc = dV_scom_0_0[3:6] - gravity_vector
-        rotacc = dV_scom_0_0[0:3]
-        rotvel = V_scom_0_0[0:3]
+    rotvel = np.einsum('nij,nj->ni', R_0_s, T_s_0_s[:, 0:3])
 
-        R0 = m * linacc
-        M0 = m * lgsm.crossprod(p_0_scom, linacc)  +  (Inertia * rotacc  - lgsm.crossprod((Inertia * rotvel), rotvel) )
+    return p_0_scom, J_scom_0_0, dJ_scom_0_0__dq, rotvel
 
-        Resultante0 += R0
-        Moment0     += M0
 
-    n = gravity_vector/lgsm.norm(gravity_vector)
-    zmp = lgsm.crossprod(n, Moment0) / lgsm.dotprod(n, Resultante0)
-    zmp_XY = H_plane_0 * zmp
+def computeZMP(dm, ddq, H_plane_0, gravity_vector, segments_properties=None):
+    """ Compute the ZMP from the dynamics of all the segments.
+
+    :param dm: The dynamic model
+    :param ddq: The accelerations of all the dofs of the model
+    :param H_plane_0: The displacement from the plane where the ZMP is projected to the ground frame
+    :param gravity_vector: The gravity vector, expressed in the ground frame
+    :param segments_properties: The constant properties of the segments returned by :func:`getSegmentsConstantProperties`; if None, they are read from the model
+
+    """
+    if segments_properties is None:
+        segments_properties = getSegmentsConstantProperties(dm)
+    m, Inertia, p_s_scom = segments_properties
+    p_0_scom, J_scom_0_0, dJ_scom_0_0__dq, rotvel = _getSegmentsCoMStateIn0(dm, p_s_scom)
+
+    gravity_vector = np.asarray(gravity_vector, dtype=float).ravel()
+    dV_scom_0_0 = np.einsum('nik,k->ni', J_scom_0_0, np.asarray(ddq, dtype=float).ravel()) + dJ_scom_0_0__dq
+
+    linacc = dV_scom_0_0[:, 3:6] - gravity_vector
+    rotacc = dV_scom_0_0[:, 0:3]
+
+    Resultante0 = np.einsum('n,ni->i', m, linacc)
+    Moment0     = np.einsum('n,ni->i', m, np.cross(p_0_scom, linacc)) + np.sum(Inertia * rotacc - np.cross(Inertia * rotvel, rotvel), axis=0)
+
+    n = gravity_vector/np.linalg.norm(gravity_vector)
+    zmp = np.cross(n, Moment0) / np.dot(n, Resultante0)
+    zmp_XY = H_plane_0 * lgsm.vector(zmp)
 
     return np.array(zmp_XY[0:2]).flatten()
 
@@ -173,22 +213,204 @@ def lookAt(_from, _to, _up):
     return H
 
 
+################################################################################
+################################################################################
+# RECORDING POLICIES
+################################################################################
+################################################################################
+class RecordingPolicy(object):
+    """ Base class of the policies deciding which updates of a :class:`Recorder` are saved.
+
+    At each update, :meth:`start_tick` tells whether the record of the tick is saved, and
+    the saved records are given to :meth:`save`. A policy is attached to one recorder only.
+    """
+    def attach(self, recorder):
+        pass
+
+    def start_tick(self):
+        return True
+
+    def save(self, record, rec):
+        record.append(rec)
+
+
+class DecimationPolicy(RecordingPolicy):
+    """ Save the record of one update every `k`.
+    """
+    def __init__(self, k, phase=0):
+        """
+        :param int k: The number of updates between 2 saved records
+        :param int phase: The index of the first saved update, in [0, k)
+
+        """
+        if k < 1:
+            raise ValueError("the decimation of a recording policy must be a positive integer, got "+str(k))
+        self.k = k
+        self.n = -phase % k
+
+    def start_tick(self):
+        save   = self.n == 0
+        self.n = (self.n + 1) % self.k
+        return save
+
+
+class RatePolicy(RecordingPolicy):
+    """ Save at most one record every `period` seconds.
+    """
+    def __init__(self, period, clock=None):
+        """
+        :param double period: The min time between 2 saved records, in second
+        :param clock: A function without argument returning the current time; if None, the time of a monotonic clock.
+                      Give ``lambda: ctrl.clock_counter*dt`` to use the simulated time.
+
+        """
+        self.period    = period
+        self.clock     = clock if clock is not None else monotonic_time
+        self.next_time = None
+
+    def start_tick(self):
+        t = self.clock()
+        if self.next_time is not None and t < self.next_time:
+            return False
+        if self.next_time is None or t >= self.next_time + self.period:
+            self.next_time = t + self.period        # restart the schedule after a gap
+        else:
+            self.next_time += self.period
+        return True
+
+
+class TriggerWindowPolicy(RecordingPolicy):
+    """ Save the records around the triggers only: the `pre` records before a trigger and the `post` records after it.
+
+    The last `pre` records are kept in a ring, and are saved when :meth:`trigger` is called (e.g. on a support switch
+    of the walk, or on a deadline miss of the controller, see :meth:`trigger_on`). The record of the first update
+    after the call is the trigger record, and its index in the record is appended to :attr:`triggers`.
+    A trigger during the `post` records of a previous one extends the window.
+    It needs a recorder with a fixed width.
+    """
+    def __init__(self, pre, post):
+        """
+        :param int pre: The number of records saved before each trigger
+        :param int post: The number of records saved after each trigger
+
+        """
+        self.pre        = pre
+        self.post       = post
+        self.triggers   = []        # indexes of the trigger records in the record
+        self._pre       = None
+        self._pending   = False
+        self._post_left = 0
+
+    def attach(self, recorder):
+        record = recorder._record
+        if not isinstance(record, RecordBuffer):
+            raise ValueError("a trigger window needs a recorder with a fixed width")
+        self._pre = RingBuffer(self.pre, record.width) if self.pre > 0 else None
+
+    def trigger(self):
+        """ Save the window around the next update. It can be called from any thread.
+        """
+        self._pending = True
+
+    def trigger_on(self, signal):
+        """ Call :meth:`trigger` at each notification of `signal`, e.g. ``walking.phase_signal`` or ``ctrl.deadline_signal``.
+
+        :type signal: :class:`events.Signal`
+        """
+        count = signal.count
+        def fire():
+            self.trigger()
+            self.trigger_on(signal)
+        signal.when(lambda: signal.count > count, fire)
+
+    def start_tick(self):
+        return self._pending or self._post_left > 0 or self._pre is not None
+
+    def save(self, record, rec):
+        if self._pending:
+            self._pending = False
+            if self._post_left == 0 and self._pre is not None:
+                for row in self._pre.get_window():
+                    record.append(row)
+                self._pre.clear()
+            self.triggers.append(record.count)
+            self._post_left = self.post + 1
+        if self._post_left > 0:
+            record.append(rec)
+            self._post_left -= 1
+        else:
+            self._pre.append(rec)
+
+
+
 ################################################################################
 ################################################################################
 # RECORDERS
 ################################################################################
 ################################################################################
 class Recorder(object):
-    def __init__(self):
-        self._record = []
+    """ Base class of the observers, which save one record per update.
+
+    A :class:`RecordingPolicy` can select the saved records. The updates whose record is not saved are skipped,
+    except for the observers with `observes_every_tick` (e.g. which differentiate a velocity), which only skip the save.
+    """
+    observes_every_tick = False
+
+    def __init__(self, width=None, capacity=10000, ring=False, spill_file=None, policy=None):
+        """
+        :param int width: The number of values of each record; if None, the records are any objects kept in a list
+        :param int capacity: The number of records preallocated, see :class:`buffers.RecordBuffer`
+        :param bool ring: Whether to keep only the last `capacity` records
+        :param string spill_file: The name of the .npy file where the records are spilled to bound the memory; None to keep them in memory
+        :param policy: The policy selecting the saved records, see :meth:`set_policy`; None to save all of them
+        :type  policy: :class:`RecordingPolicy`
+
+        When `width` is given, the records are stored in a :class:`buffers.RecordBuffer`, and
+        :meth:`get_record` returns a (T, width)-array without copy.
+        """
+        if width is None:
+            self._record = []
+        else:
+            self._record = RecordBuffer(width, capacity, ring, spill_file)
+        self.n_ticks = 0            # number of updates, counted when there is a policy
+        self.policy  = None
+        self._saving = True
+        if policy is not None:
+            self.set_policy(policy)
+
+    def set_policy(self, policy):
+        """ Set the policy selecting the saved records.
+
+        :param policy: The policy; None to save all the records
+        :type  policy: :class:`RecordingPolicy`
+
+        """
+        if policy is not None:
+            policy.attach(self)
+            self.update = self._update_with_policy_
+        else:
+            self.__dict__.pop("update", None)
+        self.policy  = policy
+        self._saving = True
+
+    def _update_with_policy_(self):
+        self._saving = self.policy.start_tick()
+        if self._saving or self.observes_every_tick:
+            self.__class__.update(self)
+        self.n_ticks += 1
 
     def update(self):
         raise NotImplementedError
 
     def save_record(self, rec):
-        self._record.append(rec)
+        if self.policy is None:
+            self._record.append(rec)
+        elif self._saving:
+            self.policy.save(self._record, rec)
 
     def get_record(self):
+        if isinstance(self._record, RecordBuffer):
+            return self._record.get_array()
         return self._record
 
 
@@ -206,10 +428,11 @@ class StateObserver(Recorder):
 
 
 class JointPositionsObserver(Recorder):
-    def __init__(self, dynModel):
-        Recorder.__init__(self)
+    def __init__(self, dynModel, **kwargs):
+        Recorder.__init__(self, dynModel.nbInternalDofs(), **kwargs)
         
         self.dynModel = dynModel
+        requestValues(self.dynModel, "getJointPositions")
 
     def update(self):
         pos = np.array(self.dynModel.getJointPositions()).flatten()
@@ -217,10 +440,11 @@ class JointPositionsObserver(Recorder):
 
 
 class JointVelocitiesObserver(Recorder):
-    def __init__(self, dynModel):
-        Recorder.__init__(self)
+    def __init__(self, dynModel, **kwargs):
+        Recorder.__init__(self, dynModel.nbInternalDofs(), **kwargs)
         
         self.dynModel = dynModel
+        requestValues(self.dynModel, "getJointVelocities")
 
     def update(self):
         vel = np.array(self.dynModel.getJointVelocities()).flatten()
@@ -228,30 +452,37 @@ class JointVelocitiesObserver(Recorder):
 
 
 class FramePoseObserver(Recorder):
-    def __init__(self, dynModel, seg_name, H_seg_frame):
-        Recorder.__init__(self)
+    """ Record the pose of a frame as ``[x, y, z, qw, qx, qy, qz]``.
+    """
+    def __init__(self, dynModel, seg_name, H_seg_frame, **kwargs):
+        Recorder.__init__(self, 7, **kwargs)
         self.dynModel = dynModel
         self.seg_idx  = self.dynModel.getSegmentIndex(seg_name)
         self.H_s_f    = H_seg_frame
+        requestSegmentsState(self.dynModel, [self.seg_idx], ("getSegmentPosition", ))
 
     def update(self):
-        self.save_record(self.dynModel.getSegmentPosition(self.seg_idx) * self.H_s_f)
+        self.save_record(displacement2array(self.dynModel.getSegmentPosition(self.seg_idx) * self.H_s_f))
 
 
 class CoMPositionObserver(Recorder):
-    def __init__(self, dynModel):
-        Recorder.__init__(self)
+    def __init__(self, dynModel, **kwargs):
+        Recorder.__init__(self, 3, **kwargs)
         self.dynModel   = dynModel
+        requestValues(self.dynModel, "getCoMPosition")
 
     def update(self):
         self.save_record(np.array(self.dynModel.getCoMPosition()).flatten())
 
 class CoMAccelerationObserver(Recorder):
-    def __init__(self, dynModel, dt):
-        Recorder.__init__(self)
+    observes_every_tick = True     # to differentiate the velocity between 2 updates
+
+    def __init__(self, dynModel, dt, **kwargs):
+        Recorder.__init__(self, 3, **kwargs)
         self.dynModel   = dynModel
         self.dt         = dt
         self.prev_CoMVelocity   = self.dynModel.getCoMVelocity()
+        requestValues(self.dynModel, "getCoMVelocity")
 
     def update(self):
         CoMVelocity           = self.dynModel.getCoMVelocity()
@@ -261,14 +492,17 @@ class CoMAccelerationObserver(Recorder):
         self.save_record(np.array(CoMAcceleration).flatten())
 
 class ZMPLIPMPositionObserver(Recorder):
-    def __init__(self, dynModel, H_0_plane, dt, gravity):
-        Recorder.__init__(self)
+    observes_every_tick = True     # to differentiate the velocity between 2 updates
+
+    def __init__(self, dynModel, H_0_plane, dt, gravity, **kwargs):
+        Recorder.__init__(self, 2, **kwargs)
 
         self.dynModel  = dynModel
         self.dt        = dt
         self.gravity   = gravity
         self.H_plane_0         = H_0_plane.inverse()
         self.prev_CoMVelocity  = self.dynModel.getCoMVelocity()
+        requestValues(self.dynModel, "getCoMPosition", "getCoMVelocity")
 
 
     def update(self):
@@ -281,8 +515,10 @@ class ZMPLIPMPositionObserver(Recorder):
 
 
 class ZMPPositionObserver(Recorder):
-    def __init__(self, dynModel, H_0_plane, dt, gravity, up=None):
-        Recorder.__init__(self)
+    observes_every_tick = True     # to differentiate the velocity between 2 updates
+
+    def __init__(self, dynModel, H_0_plane, dt, gravity, up=None, **kwargs):
+        Recorder.__init__(self, 2, **kwargs)
 
         self.dynModel  = dynModel
         self.dt        = dt
@@ -293,18 +529,246 @@ class ZMPPositionObserver(Recorder):
 
         self.H_plane_0      = H_0_plane.inverse()
 
+        self.segments_properties = getSegmentsConstantProperties(self.dynModel)
+        requestValues(self.dynModel, "getJointVelocities")
+        if not self.dynModel.hasFixedRoot():
+            requestValues(self.dynModel, "getFreeFlyerVelocity")
+        requestSegmentsState(self.dynModel, range(self.dynModel.nbSegments()))
         self.prev_dq = get_alldq(self.dynModel)
 
     def update(self):
         dq  = get_alldq(self.dynModel)
         ddq = (dq - self.prev_dq)/self.dt
         self.prev_dq = dq
-        zmp = computeZMP(self.dynModel, ddq, self.H_plane_0, self.gravity_vector)
+        zmp = computeZMP(self.dynModel, ddq, self.H_plane_0, self.gravity_vector, self.segments_properties)
         self.save_record(zmp)
 
 
 
+class MultiObserver(Recorder):
+    """ Record several channels of the model state in one pass, as the columns of one record.
+
+    The channels are declared as tuples ``(name, kind, args...)``, where `kind` is one of:
 
+    * ``"joint_positions"``, ``"joint_velocities"``: the internal dofs,
+    * ``"com_position"``, ``"com_velocity"``: the 3 coordinates of the CoM,
+    * ``"frame_pose"``, with args ``seg_name, H_seg_frame``: the pose ``[x, y, z, qw, qx, qy, qz]`` of a frame,
+    * ``"zmp_lipm"``, with args ``H_0_plane, gravity``: the ZMP of the linear inverted pendulum, see :func:`computeZMPLIPM`.
+
+    Each quantity of the model is read once per update, even if it is used by several channels.
+    The first column of the record is the timestamp, and the channels follow in their declaration order;
+    their columns are given by :meth:`get_channel`. As one updater, its cost is given by the controller, see
+    :meth:`core.ISIRController.getUpdatersCosts`. With a "zmp_lipm" channel, it observes every update, see :class:`Recorder`.
+    """
+
+    CHANNEL_GETTERS = {"joint_positions" : ("getJointPositions", ),
+                       "joint_velocities": ("getJointVelocities", ),
+                       "com_position"    : ("getCoMPosition", ),
+                       "com_velocity"    : ("getCoMVelocity", ),
+                       "zmp_lipm"        : ("getCoMPosition", "getCoMVelocity")}  # values read at each update, without argument
+
+    def __init__(self, dynModel, channels, dt=None, clock=None, **kwargs):
+        """
+        :param dynModel: The dynamic model, or its snapshot (see :class:`core.ModelSnapshot`)
+        :param list channels: The channels, as tuples ``(name, kind, args...)``
+        :param double dt: The time between 2 updates, the timestamp being ``n*dt``; if None, the time of a monotonic clock.
+                          It is needed by the "zmp_lipm" channels.
+        :param clock: A function without argument returning the timestamp, e.g. ``lambda: observer_thread.tick*dt``; if None, see `dt`
+
+        The other arguments define the storage of the record, see :class:`Recorder`.
+        """
+        self.dynModel = dynModel
+        self.dt       = dt
+        self.clock    = clock
+        self.columns  = {"time": slice(0, 1)}
+        self._readers = []
+        self._values  = {}      # (getter, args) -> value read during the current update
+
+        width = 1
+        for channel in channels:
+            name, kind, args = channel[0], channel[1], channel[2:]
+            if name in self.columns:
+                raise ValueError("channel '"+name+"' is declared twice")
+            channel_width, reader = self._create_reader_(kind, *args)
+            self.columns[name] = slice(width, width + channel_width)
+            self._readers.append((self.columns[name], reader))
+            width += channel_width
+
+        self._row = np.zeros(width)
+        Recorder.__init__(self, width, **kwargs)
+
+    def _get_(self, getter, *args):
+        key = (getter, ) + args
+        value = self._values.get(key)
+        if value is None:
+            value = self._values[key] = getattr(self.dynModel, getter)(*args)
+        return value
+
+    def _create_reader_(self, kind, *args):
+        """ Get the width of a channel and the function returning its values at the current update.
+        """
+        requestValues(self.dynModel, *self.CHANNEL_GETTERS.get(kind, ()))
+
+        if kind == "joint_positions":
+            return self.dynModel.nbInternalDofs(), lambda: np.asarray(self._get_("getJointPositions")).ravel()
+        elif kind == "joint_velocities":
+            return self.dynModel.nbInternalDofs(), lambda: np.asarray(self._get_("getJointVelocities")).ravel()
+        elif kind == "com_position":
+            return 3, lambda: np.asarray(self._get_("getCoMPosition")).ravel()
+        elif kind == "com_velocity":
+            return 3, lambda: np.asarray(self._get_("getCoMVelocity")).ravel()
+        elif kind == "frame_pose":
+            seg_name, H_seg_frame = args
+            seg_idx = self.dynModel.getSegmentIndex(seg_name)
+            requestSegmentsState(self.dynModel, [seg_idx], ("getSegmentPosition", ))
+            return 7, lambda: displacement2array(self._get_("getSegmentPosition", seg_idx) * H_seg_frame)
+        elif kind == "zmp_lipm":
+            if self.dt is None:
+                raise ValueError("the dt of the updates is needed to observe the ZMP")
+            H_0_plane, gravity = args
+            self.observes_every_tick = True
+            H_plane_0 = H_0_plane.inverse()
+            state     = {"prev_CoMVelocity": self.dynModel.getCoMVelocity().copy()}
+            def read_zmp_lipm():
+                CoMVelocity     = self._get_("getCoMVelocity")
+                CoMAcceleration = (CoMVelocity - state["prev_CoMVelocity"])/self.dt
+                state["prev_CoMVelocity"] = CoMVelocity.copy()
+                return computeZMPLIPM(self._get_("getCoMPosition"), CoMVelocity, CoMAcceleration, H_plane_0, gravity)
+            return 2, read_zmp_lipm
+        else:
+            raise ValueError("channel kind '"+str(kind)+"' is invalid; It should be one of 'joint_positions', 'joint_velocities', 'com_position', 'com_velocity', 'frame_pose', 'zmp_lipm'")
+
+    def update(self):
+        self._values = {}
+        if self.clock is not None:
+            self._row[0] = self.clock()
+        else:
+            self._row[0] = self.n_ticks*self.dt if self.dt is not None else monotonic_time()
+        for columns, reader in self._readers:
+            self._row[columns] = reader()
+        self.save_record(self._row)
+        if self.policy is None:
+            self.n_ticks += 1       # else counted by the policy update, with the skipped ticks
+
+    def get_channel(self, name):
+        """ Get the recorded values of a channel, as a view on the columns of the record.
+        """
+        return self.get_record()[:, self.columns[name]]
+
+
+
+
+
+
+
+################################################################################
+################################################################################
+# OFF-LOOP OBSERVERS
+################################################################################
+################################################################################
+class ObserverThread(object):
+    """ Update observers in a thread, from the snapshots of the control ticks, so they never delay the torque output.
+
+    The controller pushes the state of each tick in :attr:`queue` (see :meth:`core.ISIRController.setSnapshotQueue`),
+    and the thread sets it to its own dynamic model before updating the observers, which must observe this model.
+    When the observers are slower than the control loop, the snapshots which do not fit in the queue are dropped
+    and counted in :attr:`dropped`; the observers which differentiate between 2 updates are then wrong on these ticks.
+
+    Example::
+
+        obs_model = physicshelper.createDynamicModel(...)      # a copy of the controller model
+        obs_thread = ObserverThread(obs_model)
+        zmp_obs    = obs_thread.add_observer(ZMPPositionObserver(obs_model, H_0_plane, dt, 9.81))
+        ctrl.setSnapshotQueue(obs_thread.queue)
+        obs_thread.start()
+        ...
+        obs_thread.stop()
+    """
+
+    def __init__(self, dynModel, capacity=1000, poll_period=1e-3):
+        """
+        :param dynModel: The dynamic model of the observers, distinct from the model of the controller
+        :param int capacity: The max number of snapshots waiting to be observed
+        :param double poll_period: The time the thread sleeps when the queue is empty, in second
+
+        """
+        n = dynModel.nbInternalDofs()
+        self.dynModel    = dynModel
+        self.queue       = SnapshotQueue(capacity, [("tick", None), ("q", n), ("qdot", n), ("Hroot", 7), ("Troot", 6), ("tau", n)])
+        self.poll_period = poll_period
+        self.observers   = []
+        self.tick        = None             # tick of the last observed snapshot
+        self.tau         = np.zeros(n)      # torque of the last observed snapshot
+
+        self._q     = lgsm.zeros(n)
+        self._qdot  = lgsm.zeros(n)
+        self._Hroot = lgsm.Displacement()
+        self._Troot = lgsm.Twist()
+        self._writer = _LgsmWriter()
+
+        self._running = False
+        self._thread  = None
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+        return observer
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+        return observer
+
+    def start(self):
+        self._running = True
+        self._thread  = threading.Thread(target=self._run_, name="ObserverThread")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the thread, after observing the snapshots still in the queue.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        self.process()
+
+    def _run_(self):
+        while self._running:
+            if self.process() == 0:
+                time.sleep(self.poll_period)
+
+    def process(self):
+        """ Update the observers with all the snapshots in the queue.
+
+        :return: the number of observed snapshots
+
+        """
+        n = 0
+        snapshot = self.queue.peek()
+        while snapshot is not None:
+            self._set_state_(snapshot)
+            self.queue.release()
+            for observer in self.observers:
+                observer.update()
+            n += 1
+            snapshot = self.queue.peek()
+        return n
+
+    def _set_state_(self, snapshot):
+        self.tick     = int(snapshot["tick"])
+        self.tau[:]   = snapshot["tau"]
+        self._q[:]    = snapshot["q"].reshape(-1, 1)
+        self._qdot[:] = snapshot["qdot"].reshape(-1, 1)
+        if self.dynModel.hasFixedRoot():
+            self.dynModel.setState(self._q, self._qdot)
+        else:
+            self._writer.set_displacement(self._Hroot, snapshot["Hroot"])
+            self._writer.set_twist(self._Troot, snapshot["Troot"])
+            self.dynModel.setState(self._Hroot, self._q, self._Troot, self._qdot)
 
 
 
@@ -345,9 +809,9 @@ class ScreenShotObserver(Recorder):
 
 
 class TorqueObserver(xdefw.rtt.Task, Recorder):
-    def __init__(self, ctrl, name="TorqueObserver_OrocosTask"):
+    def __init__(self, ctrl, name="TorqueObserver_OrocosTask", **kwargs):
         super(TorqueObserver, self).__init__(rtt_interface.PyTaskFactory.CreateTask(name))
-        Recorder.__init__(self)
+        Recorder.__init__(self, ctrl.getModel().nbInternalDofs(), **kwargs)
 
         self.tau_in = self.addCreateInputPort("tau", "VectorXd")
         ctrl.getPort("tau").connectTo(self.tau_in)
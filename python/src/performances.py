@@ -4,6 +4,10 @@ import pylab as pl
 import json
 import numpy as np
 
+import os
+
+from buffers import NpyChannels
+
 from matplotlib.path import Path
 import matplotlib.patches as patches
 
@@ -47,30 +51,66 @@ def link_subplots( first_axes, base1, out1, second_axes, base2, out2, dint, dout
 
 
 
+def plot_tasks_setter_times(tasks_setter_times, tasks_update):
+    """ Plot the accumulated time spent in the python setters of each task per step, from the most to the least expensive.
+
+    It is the time of the target writes and gain or weight changes, not the cost of the tasks in the solver,
+    which is part of "controller: write tasks matrices", see :meth:`core.ISIRController.setTasksTiming`.
+
+    :param dict tasks_setter_times: The time spent in the setters of each task at each step, in ms, keyed by the task name
+    :param tasks_update: The time spent to update the updaters at each step, in ms, which includes most of the setter calls
+
+    """
+    names  = sorted(tasks_setter_times, key=lambda n: -np.mean(tasks_setter_times[n]))
+    colors = pl.cm.jet(np.linspace(0, 1, len(names)))
+
+    pl.figure(figsize=(12,6))
+    pl.subplot(1,1,1)
+    plot_perf(tasks_update, 0., "update updaters", "k", 2)
+    baseline = 0.
+    for name, color in zip(names, colors):
+        plot_perf(tasks_setter_times[name], baseline, name+" setters", color)
+        baseline = baseline + tasks_setter_times[name]
+
+    pl.legend(ncol=2, prop={"size":'small'})
+    pl.ylim(0, pl.ylim()[1])
+    pl.title("python setters of the tasks (not their solver cost) : accumulated times")
+    pl.ylabel("time (ms)", labelpad=40)
+    pl.xlabel("step")
+
+
+
+def load_performances(perf):
+    """ Load the performances saved by the controller.
+
+    :param perf: A directory of .npy files (see :meth:`core.ISIRController.exportPerformances`), a .npz file,
+                 a JSON file, or an already loaded dictionary
+    :return: a mapping from the channel names to their samples; the binary formats are loaded lazily
+
+    """
+    if not isinstance(perf, basestring):
+        return perf
+    if os.path.isdir(perf):
+        return NpyChannels(perf)
+    if perf.endswith(".npz"):
+        return np.load(perf)
+    with open(perf, "r") as f:
+        return json.load(f)
+
+
+
 def plot_performances( perf , outfile="./performances.pdf"):
     """
     """
-    if not isinstance(perf, dict):
-        with open(perf, "r") as f:
-            perf = json.load(f)
-    timeline        = np.array(perf['timeline'])*1000.0
-    model_update    = np.array(perf["model_update"])*1000.0 
-    tasks_update    = np.array(perf["updaters_update"])*1000.0
-    compute_output  = np.array(perf["compute_output"])*1000.0
-    ctrl_up_tasks   = np.array(perf["controller_update_tasks"])*1000.0
-    ctrl_solve      = np.array(perf["controller_solve_problem"])*1000.0
-    solver_prepare  = np.array(perf["solver_prepare"])*1000.0
-    solver_solve    = np.array(perf["solver_solve"])*1000.0
-    
-    tot_len = min( len(timeline), len(model_update), len(tasks_update), len(compute_output), len(ctrl_up_tasks), len(ctrl_solve), len(solver_prepare), len(solver_solve)) #because sometimes it saves another value at the end
-    timeline        = timeline[:tot_len]
-    model_update    = model_update[:tot_len]
-    tasks_update    = tasks_update[:tot_len]
-    compute_output  = compute_output[:tot_len]
-    ctrl_up_tasks   = ctrl_up_tasks[:tot_len]
-    ctrl_solve      = ctrl_solve[:tot_len]
-    solver_prepare  = solver_prepare[:tot_len]
-    solver_solve    = solver_solve[:tot_len]
+    perf = load_performances(perf)
+    names    = ("timeline", "model_update", "updaters_update", "compute_output", "controller_update_tasks", "controller_solve_problem", "solver_prepare", "solver_solve")
+    channels = [np.asarray(perf[name]) for name in names]     # without copy for the memory-mapped channels
+    tot_len  = min(len(c) for c in channels) #because sometimes it saves another value at the end
+
+    timeline, model_update, tasks_update, compute_output, ctrl_up_tasks, ctrl_solve, solver_prepare, solver_solve = [c[:tot_len]*1000.0 for c in channels]
+
+    # per-task setter times, if the tasks timing was enabled in the controller
+    tasks_setter_times = dict((k[len("task_setters."):], np.asarray(perf[k])[:tot_len]*1000.0) for k in perf.keys() if k.startswith("task_setters."))
     
     step_time = []
     for i in range(len(timeline)-1):
@@ -125,6 +165,12 @@ def plot_performances( perf , outfile="./performances.pdf"):
 
     pl.savefig(outfile, bbox_inches='tight' )
 
+    ##########################
+    if len(tasks_setter_times):
+        plot_tasks_setter_times(tasks_setter_times, tasks_update)
+        root, ext = os.path.splitext(outfile)
+        pl.savefig(root+"_tasks_setters"+ext, bbox_inches='tight' )
+
     ##########################
     pl.show()
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+""" Module to profile the python code of a thread by sampling its stack from another thread.
+
+The profiled thread is not instrumented: a sampler thread periodically reads its current frame
+with ``sys._current_frames``, so the profiled code runs at full speed.
+"""
+
+import sys
+import threading
+import time
+
+
+
+class SamplingProfiler(object):
+    """ Sample the call stack of a thread at a fixed interval, and count where it spends time.
+    """
+
+    def __init__(self, thread_id, interval=1e-4):
+        """
+        :param thread_id: The identifier of the thread to profile, as returned by ``thread.get_ident()``
+        :param double interval: The time between 2 samples, in second
+
+        """
+        self.thread_id = thread_id
+        self.interval  = interval
+
+        self.n_samples   = 0
+        self.n_idle      = 0        # samples where the thread was not running python code
+        self.self_counts = {}       # function -> number of samples where it is on top of the stack
+        self.cum_counts  = {}       # function -> number of samples where it is in the stack
+
+        self._running    = False
+        self._thread     = None
+        self._on_stopped = None
+
+    def start(self):
+        self._running = True
+        self._thread  = threading.Thread(target=self._sample_loop_, name="SamplingProfiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_running(self):
+        return self._running
+
+    def stop(self, on_stopped=None):
+        """ Stop sampling.
+
+        :param on_stopped: A function without argument called by the sampler thread once it has stopped, e.g. to dump
+                           the profile without delaying the profiled thread; if None, wait for the sampler thread to stop
+
+        """
+        if on_stopped is not None:
+            self._on_stopped = on_stopped
+            self._running    = False
+            self._thread     = None
+            return
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _sample_loop_(self):
+        while self._running:
+            self.sample()
+            time.sleep(self.interval)
+        if self._on_stopped is not None:
+            self._on_stopped()
+
+    def sample(self):
+        """ Take one sample of the stack of the profiled thread.
+        """
+        frame = sys._current_frames().get(self.thread_id)
+        self.n_samples += 1
+        if frame is None:
+            self.n_idle += 1
+            return
+
+        code = frame.f_code
+        key  = (code.co_filename, code.co_firstlineno, code.co_name)
+        self.self_counts[key] = self.self_counts.get(key, 0) + 1
+
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            key  = (code.co_filename, code.co_firstlineno, code.co_name)
+            if key not in seen:
+                seen.add(key)
+                self.cum_counts[key] = self.cum_counts.get(key, 0) + 1
+            frame = frame.f_back
+
+    def get_stats(self):
+        """ Get the profile, sorted by decreasing number of samples on top of the stack.
+
+        :return: a list of ``(function, self_samples, cumulative_samples)``, where ``function`` is ``(filename, first_line, name)``
+
+        """
+        stats = [(key, self.self_counts.get(key, 0), cum) for key, cum in self.cum_counts.items()]
+        return sorted(stats, key=lambda s: (-s[1], -s[2]))
+
+    def dump(self, outfile=None, limit=40):
+        """ Write the profile as a text table.
+
+        :param outfile: The file name where the profile is written; if None, it is printed
+        :param int limit: The max number of functions to write
+
+        """
+        n = max(self.n_samples, 1)
+        lines = ["{} samples every {:.3g} s, {:.1f}% idle".format(self.n_samples, self.interval, 100.*self.n_idle/n),
+                 "{:>7} {:>7}  {}".format("self%", "cum%", "function")]
+        for (filename, line, name), self_count, cum_count in self.get_stats()[:limit]:
+            lines.append("{:>7.2f} {:>7.2f}  {} ({}:{})".format(100.*self_count/n, 100.*cum_count/n, name, filename, line))
+        report = "\n".join(lines)
+
+        if outfile is None:
+            print report
+        else:
+            with open(outfile, "w") as f:
+                f.write(report+"\n")
+        return report
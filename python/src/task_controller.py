@@ -7,23 +7,518 @@ import swig_isir_controller as sic
 
 import lgsm
 
+import numpy as np
+
+import time
+
+
+def quaternion2matrix(q, out=None):
+    """ Get the rotation matrices of quaternions.
+
+    :param q: The quaternions ``[qw, qx, qy, qz]``
+    :type  q: (...,4)-array
+    :param out: The array where the matrices are written; if None, a new array
+
+    :return: a (...,3,3)-array
+
+    """
+    qw, qx, qy, qz = np.rollaxis(np.asarray(q, dtype=float), -1)
+    R = np.empty(qw.shape+(3, 3)) if out is None else out
+    R[..., 0, 0] = 1-2*(qy*qy+qz*qz); R[..., 0, 1] =   2*(qx*qy-qw*qz); R[..., 0, 2] =   2*(qx*qz+qw*qy)
+    R[..., 1, 0] =   2*(qx*qy+qw*qz); R[..., 1, 1] = 1-2*(qx*qx+qz*qz); R[..., 1, 2] =   2*(qy*qz-qw*qx)
+    R[..., 2, 0] =   2*(qx*qz-qw*qy); R[..., 2, 1] =   2*(qy*qz+qw*qx); R[..., 2, 2] = 1-2*(qx*qx+qy*qy)
+    return R
+
+
+def displacement2array(H, out=None):
+    """ Get the array ``[x, y, z, qw, qx, qy, qz]`` of a :class:`lgsm.Displacement`.
+
+    :param out: The (7,)-array where the values are written; if None, a new array
+    """
+    if out is None:
+        return np.array([H.x, H.y, H.z] + H.getRotation().tolist())
+    q = H.getRotation()
+    out[0], out[1], out[2]         = H.x, H.y, H.z
+    out[3], out[4], out[5], out[6] = q.qw, q.qx, q.qy, q.qz
+    return out
+
+def twist2array(T, out=None):
+    """ Get the array of the 6 components of a :class:`lgsm.Twist` or :class:`lgsm.Wrench`.
+
+    :param out: The (6,)-array where the values are written; if None, a new array
+    """
+    if out is None:
+        return np.array([T[i] for i in range(6)])
+    out[0], out[1], out[2], out[3], out[4], out[5] = T[0], T[1], T[2], T[3], T[4], T[5]
+    return out
+
+class _LgsmWriter(object):
+    """ Write arrays in lgsm objects in place, through a preallocated quaternion and 3-vectors, without temporary lgsm object.
+    """
+    def __init__(self):
+        self.quat = lgsm.Quaternion()
+        self.vec1 = lgsm.vector(0., 0., 0.)
+        self.vec2 = lgsm.vector(0., 0., 0.)
+
+    def set_displacement(self, H, row):
+        """ Write ``[x, y, z, qw, qx, qy, qz]`` in the displacement `H`.
+        """
+        H.x, H.y, H.z = row[0], row[1], row[2]
+        q = self.quat
+        q.qw, q.qx, q.qy, q.qz = row[3], row[4], row[5], row[6]
+        H.setRotation(q)
+
+    def _set_vectors_(self, row):
+        self.vec1[:] = row[0:3].reshape(3, 1)
+        self.vec2[:] = row[3:6].reshape(3, 1)
+
+    def set_twist(self, T, row):
+        """ Write ``[rx, ry, rz, vx, vy, vz]`` in the twist `T`.
+        """
+        self._set_vectors_(row)
+        T.setAngularVelocity(self.vec1)
+        T.setLinearVelocity(self.vec2)
+
+    def set_wrench(self, W, row):
+        """ Write ``[tx, ty, tz, fx, fy, fz]`` in the wrench `W`.
+        """
+        self._set_vectors_(row)
+        W.setTorque(self.vec1)
+        W.setForce(self.vec2)
+
+
+class SampledTrajectory(object):
+    """ A trajectory stored as contiguous arrays, one row per time step, whose samples are converted into lgsm objects only when they are read.
+
+    It replaces the lists ``[sample1, sample2, ..., sampleN]`` of lgsm objects, and can be given to :class:`TrajectoryTracking`.
+    The subclasses define the arrays of a sample, in :attr:`fields`.
+    """
+    fields = ()
+
+    def __init__(self, *data):
+        """
+        :param data: One array per field, with the same number of rows
+
+        """
+        if len(data) != len(self.fields):
+            raise ValueError(self.__class__.__name__+" expects the arrays "+str(self.fields))
+        data = [np.asarray(d, dtype=float) for d in data]
+        self.data = tuple(d.reshape(-1, 1) if d.ndim == 1 else d for d in data)
+        if any(len(d) != len(self.data[0]) for d in self.data):
+            raise ValueError("arrays "+str(self.fields)+" of the trajectory must have the same length")
+        for name, d in zip(self.fields, self.data):
+            setattr(self, name, d)
+
+    @classmethod
+    def from_array(cls, array):
+        """ Get a trajectory from one (N,M)-array, the fields being consecutive column blocks of equal width (views, no copy).
+        """
+        array = np.asarray(array, dtype=float).reshape(len(array), -1)
+        if array.shape[1] % len(cls.fields):
+            raise ValueError("cannot split the "+str(array.shape[1])+" columns of the array into "+str(cls.fields))
+        width = array.shape[1]//len(cls.fields)
+        return cls(*[array[:, i*width:(i+1)*width] for i in range(len(cls.fields))])
+
+    @classmethod
+    def from_samples(cls, samples):
+        """ Get a trajectory from a list of samples, as returned by :meth:`__getitem__`.
+        """
+        if len(samples) == 0:
+            return cls(*[np.zeros((0, 0)) for f in cls.fields])
+        return cls(*[np.array(col) for col in zip(*[cls._sample2arrays(s) for s in samples])])
+
+    def __len__(self):
+        return len(self.data[0])
+
+    def row(self, index):
+        """ Return the sample at `index` as a tuple of 1-D arrays, views on the storage.
+        """
+        return tuple(d[index] for d in self.data)
+
+    def __getitem__(self, index):
+        """ Return the sample at `index` as lgsm objects, or a sub-trajectory if `index` is a slice.
+        """
+        if isinstance(index, slice):
+            return self.__class__(*[d[index] for d in self.data])
+        return self._arrays2sample(*self.row(index))
+
+
+class CartesianTrajectory(SampledTrajectory):
+    """ A trajectory of frames, whose samples are ``(pos, vel, acc)``.
+
+    * ``pos``: the poses ``[x, y, z, qw, qx, qy, qz]``, as :class:`lgsm.Displacement`, in a (N,7)-array
+    * ``vel``: the velocities ``[wx, wy, wz, vx, vy, vz]``, as :class:`lgsm.Twist`, in a (N,6)-array
+    * ``acc``: the accelerations ``[dwx, dwy, dwz, dvx, dvy, dvz]``, as :class:`lgsm.Twist`, in a (N,6)-array
+    """
+    fields = ("pos", "vel", "acc")
+
+    @classmethod
+    def from_array(cls, array):
+        array = np.asarray(array, dtype=float)
+        if array.ndim != 2 or array.shape[1] != 19:
+            raise ValueError("a cartesian trajectory array must be (N,19): pose (7), velocity (6) and acceleration (6)")
+        return cls(array[:, 0:7], array[:, 7:13], array[:, 13:19])
+
+    @staticmethod
+    def _sample2arrays(sample):
+        pos, vel, acc = sample
+        return displacement2array(pos), twist2array(vel), twist2array(acc)
+
+    @staticmethod
+    def _arrays2sample(pos, vel, acc):
+        return lgsm.Displacement(pos.tolist()), lgsm.Twist(lgsm.vector(vel.tolist())), lgsm.Twist(lgsm.vector(acc.tolist()))
+
+
+class JointTrajectory(SampledTrajectory):
+    """ A trajectory in joint space, whose samples are ``(q, qdot, qddot)``, each in a (N,ndof)-array.
+    """
+    fields = ("q", "qdot", "qddot")
+
+    @staticmethod
+    def _sample2arrays(sample):
+        return tuple(np.asarray(v, dtype=float).flatten() for v in sample)
+
+    @staticmethod
+    def _arrays2sample(q, qdot, qddot):
+        return lgsm.vector(q.tolist()), lgsm.vector(qdot.tolist()), lgsm.vector(qddot.tolist())
+
+
+class TorqueTrajectory(SampledTrajectory):
+    """ A trajectory of joint torques, whose samples are ``tau``, in a (N,ndof)-array.
+    """
+    fields = ("tau", )
+
+    @staticmethod
+    def _sample2arrays(sample):
+        return (np.asarray(sample, dtype=float).flatten(), )
+
+    @staticmethod
+    def _arrays2sample(tau):
+        return lgsm.vector(tau.tolist())
+
+
+class WrenchTrajectory(SampledTrajectory):
+    """ A trajectory of frame wrenches, whose samples are ``(pose, wrench)``.
+
+    * ``pose``: the reference poses ``[x, y, z, qw, qx, qy, qz]``, as :class:`lgsm.Displacement`, in a (N,7)-array
+    * ``wrench``: the wrenches ``[tx, ty, tz, fx, fy, fz]``, as :class:`lgsm.Wrench`, in a (N,6)-array
+    """
+    fields = ("pose", "wrench")
+
+    @classmethod
+    def from_array(cls, array):
+        array = np.asarray(array, dtype=float)
+        if array.ndim != 2 or array.shape[1] != 13:
+            raise ValueError("a wrench trajectory array must be (N,13): pose (7) and wrench (6)")
+        return cls(array[:, 0:7], array[:, 7:13])
+
+    @staticmethod
+    def _sample2arrays(sample):
+        pose, wrench = sample
+        return displacement2array(pose), twist2array(wrench)
+
+    @staticmethod
+    def _arrays2sample(pose, wrench):
+        return lgsm.Displacement(pose.tolist()), lgsm.Wrench(lgsm.vector(wrench.tolist()))
+
+
+def rpy2quaternion(rpy):
+    """ Get the quaternions ``[qw, qx, qy, qz]`` of the rotations ``Rz(yaw).Ry(pitch).Rx(roll)``.
+
+    :param rpy: The angles ``[roll, pitch, yaw]``
+    :type  rpy: (...,3)-array
+
+    :return: a (...,4)-array
+
+    """
+    r, p, y = np.rollaxis(np.asarray(rpy, dtype=float)/2., -1)
+    cr, sr, cp, sp, cy, sy = np.cos(r), np.sin(r), np.cos(p), np.sin(p), np.cos(y), np.sin(y)
+    return np.rollaxis(np.array([cy*cp*cr + sy*sp*sr,
+                                 cy*cp*sr - sy*sp*cr,
+                                 cy*sp*cr + sy*cp*sr,
+                                 sy*cp*cr - cy*sp*sr]), 0, np.ndim(r)+1)
+
+
+class SplineTrajectory(object):
+    """ A trajectory stored as piecewise polynomials of its coordinates, evaluated on demand at any time.
+
+    Only the knots and the polynomial coefficients are kept, so the memory does not depend on the duration nor
+    on the time step, and the same trajectory can be tracked by controllers with different time steps.
+    The subclasses convert the coordinates and their derivatives into the samples of the corresponding
+    :class:`SampledTrajectory`, defined in :attr:`sampled_type`.
+    """
+    sampled_type = None
+
+    def __init__(self, times, positions, velocities=None, accelerations=None):
+        """
+        :param times: The times of the knots, increasing
+        :type  times: (K,)-array
+        :param positions: The coordinates at the knots
+        :type  positions: (K,M)-array
+        :param velocities: The coordinate velocities at the knots; if None, they are estimated with centered differences, and null at both ends
+        :type  velocities: (K,M)-array
+        :param accelerations: The coordinate accelerations at the knots; if given, the polynomials are quintic, otherwise cubic
+        :type  accelerations: (K,M)-array
+
+        """
+        from scipy.interpolate import BPoly, PPoly
+
+        times     = np.asarray(times, dtype=float)
+        positions = np.asarray(positions, dtype=float).reshape(len(times), -1)
+        if len(times) < 2 or np.any(np.diff(times) <= 0):
+            raise ValueError("a spline trajectory needs at least 2 knots at increasing times")
+        if velocities is None:
+            velocities = np.zeros(positions.shape)
+            velocities[1:-1] = (positions[2:] - positions[:-2])/(times[2:] - times[:-2])[:, None]
+        derivatives = [positions, np.asarray(velocities, dtype=float).reshape(positions.shape)]
+        if accelerations is not None:
+            derivatives.append(np.asarray(accelerations, dtype=float).reshape(positions.shape))
+
+        # power basis coefficients c[k, i, m] of (t - times[i])**(order-k), for the coordinates and their 2 derivatives
+        yi = np.transpose(np.array(derivatives), (2, 1, 0))
+        c  = np.dstack([PPoly.from_bernstein_basis(BPoly.from_derivatives(times, y)).c for y in yi])
+        order = len(c) - 1
+        dc  = c[:-1] * np.arange(order, 0, -1)[:, None, None]
+        ddc = dc[:-1] * np.arange(order-1, 0, -1)[:, None, None]
+
+        self.times    = times
+        self.duration = times[-1] - times[0]
+        self._coeffs  = (c, dc, ddc)
+
+    def evaluate(self, t):
+        """ Evaluate the coordinates and their derivatives.
+
+        :param t: The times from the beginning of the trajectory, clipped in ``[0, duration]``
+        :type  t: double or (N,)-array
+
+        :return: ``(pos, vel, acc)``, (M,)-arrays, or (N,M)-arrays if `t` is an array
+
+        """
+        t = np.clip(np.asarray(t, dtype=float), 0., self.duration) + self.times[0]
+        i = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.times) - 2)
+        s = (t - self.times[i])[..., None]
+        return tuple(np.polyval(c[:, i], s) for c in self._coeffs)
+
+    def get_sample_count(self, dt):
+        """ Return the number of samples needed to cover the trajectory with the time step `dt`.
+        """
+        return int(np.floor(self.duration/dt + 1e-9)) + 1
+
+    def row_at(self, t):
+        """ Return the sample at time `t`, as the rows of :meth:`SampledTrajectory.row`.
+        """
+        return self._coordinates2rows(*self.evaluate(t))
+
+    def sample(self, dt):
+        """ Sample the whole trajectory with the time step `dt`, into a :attr:`sampled_type` instance.
+        """
+        t = np.arange(self.get_sample_count(dt))*dt
+        return self.sampled_type(*self._coordinates2rows(*self.evaluate(t)))
+
+
+class CartesianSpline(SplineTrajectory):
+    """ A spline trajectory of a frame, whose coordinates are ``[x, y, z, roll, pitch, yaw]``, the rotation being ``Rz(yaw).Ry(pitch).Rx(roll)``.
+
+    Its samples are those of :class:`CartesianTrajectory`, the twists being the velocity and
+    acceleration of the frame expressed in the reference frame (see `expressed_in_world` in :class:`TrajectoryTracking`).
+    """
+    sampled_type = CartesianTrajectory
+
+    @staticmethod
+    def _coordinates2rows(pos, vel, acc):
+        r, p, y    = np.rollaxis(pos[..., 3:6], -1)
+        dr, dp, dy = np.rollaxis(vel[..., 3:6], -1)
+        ddr, ddp, ddy = np.rollaxis(acc[..., 3:6], -1)
+        cp, sp, cy, sy = np.cos(p), np.sin(p), np.cos(y), np.sin(y)
+
+        # angular velocity dy.Z + Rz.dp.Y + Rz.Ry.dr.X, and its derivative
+        w = np.rollaxis(np.array([-sy*dp + cy*cp*dr,
+                                   cy*dp + sy*cp*dr,
+                                   dy    - sp*dr]), 0, np.ndim(r)+1)
+        dw = np.rollaxis(np.array([-cy*dy*dp - sy*ddp + (-sy*dy*cp - cy*sp*dp)*dr + cy*cp*ddr,
+                                   -sy*dy*dp + cy*ddp + ( cy*dy*cp - sy*sp*dp)*dr + sy*cp*ddr,
+                                    ddy - cp*dp*dr - sp*ddr]), 0, np.ndim(r)+1)
+
+        pose = np.concatenate([pos[..., 0:3], rpy2quaternion(pos[..., 3:6])], axis=-1)
+        return pose, np.concatenate([w, vel[..., 0:3]], axis=-1), np.concatenate([dw, acc[..., 0:3]], axis=-1)
+
+
+class JointSpline(SplineTrajectory):
+    """ A spline trajectory in joint space, whose coordinates are the joint positions, and samples those of :class:`JointTrajectory`.
+    """
+    sampled_type = JointTrajectory
+
+    @staticmethod
+    def _coordinates2rows(pos, vel, acc):
+        return pos, vel, acc
+
+
+class TorqueSpline(SplineTrajectory):
+    """ A spline trajectory of joint torques, whose coordinates are the torques, and samples those of :class:`TorqueTrajectory`.
+    """
+    sampled_type = TorqueTrajectory
+
+    @staticmethod
+    def _coordinates2rows(pos, vel, acc):
+        return (pos, )
+
+
+class WrenchSpline(SplineTrajectory):
+    """ A spline trajectory of frame wrenches, whose coordinates are ``[x, y, z, roll, pitch, yaw, tx, ty, tz, fx, fy, fz]``, and samples those of :class:`WrenchTrajectory`.
+    """
+    sampled_type = WrenchTrajectory
+
+    @staticmethod
+    def _coordinates2rows(pos, vel, acc):
+        pose = np.concatenate([pos[..., 0:3], rpy2quaternion(pos[..., 3:6])], axis=-1)
+        return pose, pos[..., 6:12]
+
+
+class StreamingTrajectory(object):
+    """ A bounded ring buffer of samples, filled by a producer (e.g. an online planner in another thread) while it is consumed by :class:`TrajectoryTracking`.
+
+    The memory is fixed by the capacity. When the consumer finds the buffer empty, it is an underrun:
+    the task keeps its last desired value, and the underrun is counted and reported to the registered callback.
+    The consumer takes no lock, so it is never blocked by a producer copying samples; there must be only one consumer.
+    """
+
+    _WAIT_SLICE = 1e-3      # max time before a producer waiting for space tests it again, as the consumer does not always wake it up
+
+    def __init__(self, sampled_type, capacity, on_underrun=None):
+        """
+        :param sampled_type: The type of the samples, :class:`CartesianTrajectory`, :class:`JointTrajectory`, :class:`TorqueTrajectory` or :class:`WrenchTrajectory`
+        :param int capacity: The max number of samples in the buffer
+        :param on_underrun: A function called with the number of consumed samples when an underrun starts
+
+        """
+        import threading
+
+        if capacity <= 0:
+            raise ValueError("the capacity of a streaming trajectory must be positive")
+        self.sampled_type = sampled_type
+        self.capacity     = int(capacity)
+        self.on_underrun  = on_underrun
+
+        self._data  = None      # one (capacity,width)-array per field, allocated on the first samples
+        self._last  = None      # consumer copy of the last sample
+        self._read  = 0
+        self._write = 0
+        self._cond  = threading.Condition()
+
+        self.underruns       = 0       # number of pops without sample
+        self.underrun_events = 0       # number of times the buffer was found empty after a sample
+        self._is_underrunning = False
+        self.is_finished = False
+
+    def __len__(self):
+        """ Return the number of samples waiting in the buffer.
+        """
+        return self._write - self._read
+
+    def get_free_space(self):
+        """ Return the number of samples that can be appended without waiting.
+        """
+        return self.capacity - len(self)
+
+    def extend(self, trajectory, block=True, timeout=None):
+        """ Append samples at the end of the buffer.
+
+        :param trajectory: The samples to append, a :attr:`sampled_type` instance or an array accepted by its ``from_array``
+        :param bool block: Whether to wait for free space when the buffer is full; if False, only the samples that fit are written
+        :param double timeout: The max time to wait for free space, in second; None waits indefinitely
+
+        :return: the number of samples written
+
+        """
+        if not isinstance(trajectory, SampledTrajectory):
+            trajectory = self.sampled_type.from_array(trajectory)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            if self._data is None:
+                self._data = [np.empty((self.capacity, d.shape[1])) for d in trajectory.data]
+                self._last = [np.empty(d.shape[1]) for d in trajectory.data]
+            written = 0
+            while written < len(trajectory):
+                if self.get_free_space() == 0:
+                    if not block or not self._wait_for_space_(deadline):
+                        break
+                start = self._write % self.capacity
+                n     = min(self.get_free_space(), len(trajectory) - written, self.capacity - start)
+                for buf, d in zip(self._data, trajectory.data):
+                    buf[start:start+n] = d[written:written+n]
+                self._write += n
+                written     += n
+            return written
+
+    def _wait_for_space_(self, deadline):
+        while self.get_free_space() == 0:
+            if deadline is None:
+                self._cond.wait(self._WAIT_SLICE)
+            elif deadline > time.time():
+                self._cond.wait(min(deadline - time.time(), self._WAIT_SLICE))
+            else:
+                return False
+        return True
+
+    def append(self, *fields):
+        """ Append one sample, given as one array per field of :attr:`sampled_type`; it waits for free space when the buffer is full.
+        """
+        return self.extend(self.sampled_type(*[np.asarray(f, dtype=float).reshape(1, -1) for f in fields]))
+
+    def finish(self):
+        """ Declare that no more samples will be appended; an empty buffer is then not reported as an underrun.
+        """
+        with self._cond:
+            self.is_finished = True
+
+    def pop(self):
+        """ Remove the first sample of the buffer.
+
+        :return: the sample as a tuple of 1-D arrays, as :meth:`SampledTrajectory.row`, or None if the buffer is empty
+
+        The samples are published by the producer once copied, so they are read without lock.
+        """
+        if self._write == self._read:
+            if not self.is_finished:
+                self.underruns += 1
+                if not self._is_underrunning:
+                    self._is_underrunning = True
+                    self.underrun_events += 1
+                    if self.on_underrun is not None:
+                        self.on_underrun(self._read)
+            return None
+        index = self._read % self.capacity
+        for last, buf in zip(self._last, self._data):
+            last[:] = buf[index]
+        self._read += 1
+        self._is_underrunning = False
+        if self._cond.acquire(False):       # wake up a producer waiting for space, unless it is writing
+            try:
+                self._cond.notify()
+            finally:
+                self._cond.release()
+        return tuple(self._last)
+
+
 class TrajectoryTracking(object):
     """ It modifies the desired values of a task to follow trajectory.
     """
 
-    def __init__(self, task, trajectory=None, expressed_in_world=False):
+    def __init__(self, task, trajectory=None, expressed_in_world=False, dt=None):
         """
         :param task: The task to be controlled, meaning the part of the robot that should follow the trajectory
         :type  task: :class:`~core.ISIRTask`
-        :param list trajectory: The trajectory to follow, a list ``[(pos1,vel1,acc1), (pos2,vel2,acc2), ..., (posN,velN,accN)]`` for each time step
+        :param trajectory: The trajectory to follow, see :meth:`set_new_trajectory`
+        :param bool expressed_in_world: Whether the velocities and accelerations of the trajectory are expressed in the reference frame instead of the task frame
+        :param double dt: The time between 2 updates, needed to track a :class:`SplineTrajectory`
 
         """
         if trajectory is None:
             trajectory = []
 
         self.task = task
-        self.set_new_trajectory(trajectory)
         self.expressed_in_world = expressed_in_world
+        self.dt   = dt
 
         # check task type
         if task._targetState is None:
@@ -31,32 +526,81 @@ class TrajectoryTracking(object):
         elif isinstance(task._targetState, sic.FullTargetState) or isinstance(task._targetState, sic.PartialTargetState):
             if task.getTaskType()   == sic.ACCELERATIONTASK:
                 self._doUpdateTask_ = self._updateJointAccelerationTask_
+                self._trajectory_type = JointTrajectory
             elif task.getTaskType() == sic.TORQUETASK:
                 self._doUpdateTask_ = self._updateTorqueTask_
+                self._trajectory_type = TorqueTrajectory
             else:
                 raise ValueError("Control impossible in joint space for FORCETASK or UNKNOWNTASK")
         elif isinstance(task._targetState, sic.TargetFrame):
             if task.getTaskType()   == sic.ACCELERATIONTASK:
                 self._doUpdateTask_ = self._updateCartesianAccelerationTask_
+                self._trajectory_type = CartesianTrajectory
             elif task.getTaskType() == sic.FORCETASK:
                 self._doUpdateTask_ = self._updateForceTask_
+                self._trajectory_type = WrenchTrajectory
             else:
                 raise ValueError("Control impossible in cartesian space for TORQUETASK or UNKNOWNTASK")
         else:
             raise ValueError("Trajectory control of the target state (type:"+type(task._targetState)+") of task '"+task.getName()+"'")
 
+        # desired values written in place at each update, and given to the task
+        if self._trajectory_type in (JointTrajectory, TorqueTrajectory):
+            n = task.getDimension()
+            self._joint_des = tuple(lgsm.zeros(n) for field in self._trajectory_type.fields)
+        self._pos_des    = lgsm.Displacement()
+        self._vel_des    = lgsm.Twist()
+        self._acc_des    = lgsm.Twist()
+        self._wrench_des = lgsm.Wrench()
+        self._writer     = _LgsmWriter()
+        self._R_frame_0  = np.empty((3, 3))     # buffers of the values expressed in the world
+        self._vel_frame  = np.empty(6)
+        self._acc_frame  = np.empty(6)
+
+        self.set_new_trajectory(trajectory)
+
 
     def set_new_trajectory(self, new_traj):
         """ Register a new trajectory.
 
-        :param list new_traj: The new trajectory to follow, a list ``[(pos1,vel1,acc1), (pos2,vel2,acc2), ..., (posN,velN,accN)]`` for each time step
+        :param new_traj: The new trajectory to follow, either:
 
-        The internal counter is reset to 0 and the max counter is ``len(new_traj)``.
+            * a :class:`SampledTrajectory` matching the task, used as is,
+            * a :class:`SplineTrajectory` matching the task, evaluated at time ``counter*dt`` at each update,
+            * a :class:`StreamingTrajectory` matching the task, one sample being consumed at each update,
+            * an (N,M)-array, the fields of the trajectory being consecutive column blocks (see :meth:`SampledTrajectory.from_array`),
+            * a list ``[(pos1,vel1,acc1), (pos2,vel2,acc2), ..., (posN,velN,accN)]`` for each time step, copied into arrays.
+
+        The internal counter is reset to 0 and the max counter is ``len(new_traj)``, or the number
+        of updates covering the duration of a spline trajectory; a streaming trajectory has no max counter,
+        and the counter is the number of consumed samples.
 
         """
-        self.trajectory  = new_traj
+        if isinstance(new_traj, StreamingTrajectory):
+            self.trajectory  = new_traj
+            self.counter     = 0
+            self.max_counter = float('inf')
+            self._get_row_   = new_traj.pop
+            return
+
+        if isinstance(new_traj, SplineTrajectory):
+            if self.dt is None:
+                raise ValueError("Cannot track a spline trajectory with task '"+self.task.getName()+"' without the dt of the updates")
+            self.trajectory  = new_traj
+            self.counter     = 0
+            self.max_counter = new_traj.get_sample_count(self.dt)
+            self._get_row_   = self._getSplineRow_
+            return
+
+        if isinstance(new_traj, SampledTrajectory):
+            self.trajectory = new_traj
+        elif isinstance(new_traj, np.ndarray):
+            self.trajectory = self._trajectory_type.from_array(new_traj)
+        else:
+            self.trajectory = self._trajectory_type.from_samples(new_traj)
         self.counter     = 0
         self.max_counter = len(self.trajectory)
+        self._get_row_   = self._getSampledRow_
 
 
     def update(self):
@@ -64,39 +608,144 @@ class TrajectoryTracking(object):
 
         An internal counter selects the corresponding desired value of the trajctory for the task.
         If the last value of the trajectory is reached, the last desired value is considered (it remains registered).
+        It is also the case when a streaming trajectory is empty.
 
         """
         if self.counter < self.max_counter:
-            self._doUpdateTask_()
-            self.counter += 1
+            row = self._get_row_()
+            if row is not None:
+                self._doUpdateTask_(*row)
+                self.counter += 1
+
+    def _getSampledRow_(self):
+        return self.trajectory.row(self.counter)
+
+    def _getSplineRow_(self):
+        return self.trajectory.row_at(self.counter*self.dt)
+
+    def _expressInFrame_(self, pos_des, value, out):
+        """ Rotate the 2 parts of `value`, expressed in the world, into the frame of `pos_des`, in `out`.
+        """
+        R_frame_0 = quaternion2matrix(pos_des[3:7], self._R_frame_0).T
+        np.dot(R_frame_0, value[0:3], out[0:3])
+        np.dot(R_frame_0, value[3:6], out[3:6])
+        return out
 
-    def _updateCartesianAccelerationTask_(self):
-        pos_des, vel_des, acc_des = self.trajectory[self.counter]
+    def _updateCartesianAccelerationTask_(self, pos_des, vel_des, acc_des):
         if self.expressed_in_world:
-            Adj_frame_0 = lgsm.Displacementd( [0,0,0] + pos_des.getRotation().inverse().tolist()).adjoint()
-            vel_des = Adj_frame_0 * vel_des
-            acc_des = Adj_frame_0 * acc_des
-        self.task.setPosition(pos_des)
-        self.task.setVelocity(vel_des)
-        self.task.setAcceleration(acc_des)
-
-    def _updateJointAccelerationTask_(self):
-        q_des, qdot_des, qddot_des = self.trajectory[self.counter]
-        self.task.set_q(q_des)
-        self.task.set_qdot(qdot_des)
-        self.task.set_qddot(qddot_des)
-
-    def _updateTorqueTask_(self):
-        tau_des = self.trajectory[self.counter]
-        self.task.set_tau(tau_des)
-
-    def _updateForceTask_(self):
-        pose_ref, wrench_des = self.trajectory[self.counter]
+            vel_des = self._expressInFrame_(pos_des, vel_des, self._vel_frame)
+            acc_des = self._expressInFrame_(pos_des, acc_des, self._acc_frame)
+        self._writer.set_displacement(self._pos_des, pos_des)
+        self._writer.set_twist(self._vel_des, vel_des)
+        self._writer.set_twist(self._acc_des, acc_des)
+        self.task.setPosition(self._pos_des)
+        self.task.setVelocity(self._vel_des)
+        self.task.setAcceleration(self._acc_des)
+
+    def _updateJointAccelerationTask_(self, q_des, qdot_des, qddot_des):
+        q, qdot, qddot = self._joint_des
+        q[:]     = q_des.reshape(-1, 1)
+        qdot[:]  = qdot_des.reshape(-1, 1)
+        qddot[:] = qddot_des.reshape(-1, 1)
+        self.task.set_q(q)
+        self.task.set_qdot(qdot)
+        self.task.set_qddot(qddot)
+
+    def _updateTorqueTask_(self, tau_des):
+        tau, = self._joint_des
+        tau[:] = tau_des.reshape(-1, 1)
+        self.task.set_tau(tau)
+
+    def _updateForceTask_(self, pose_ref, wrench_des):
         if self.expressed_in_world:
-            Adj_frame_0 = lgsm.Displacementd( [0,0,0] + pos_des.getRotation().inverse().tolist()).adjoint()
-            wrench_des = Adj_frame_0 * wrench_des
-        self.task.setPosition(pose_ref)
-        self.task.setWrench(wrench_des)
+            wrench_des = self._expressInFrame_(pose_ref, wrench_des, self._vel_frame)
+        self._writer.set_displacement(self._pos_des, pose_ref)
+        self._writer.set_wrench(self._wrench_des, wrench_des)
+        self.task.setPosition(self._pos_des)
+        self.task.setWrench(self._wrench_des)
+
+
+
+class TargetBatch(object):
+    """ Set the desired values of many tasks from one contiguous array.
+
+    The tasks are registered once: their layout in the array and their writers (see :class:`TrajectoryTracking`)
+    are computed at construction, and the blocks of the array are views prepared in advance, so that filling
+    the targets of a tick needs no slicing nor lookups. The row of a task is its fields concatenated as in
+    :meth:`SampledTrajectory.from_array`, e.g. ``[pos(7), vel(6), acc(6)]`` for a cartesian acceleration task,
+    or ``[q(n), qdot(n), qddot(n)]`` for a joint acceleration task of dimension n.
+    The rows of all the tasks are concatenated in the registration order.
+
+    The controller has no entry point to set many targets at once, so each task is still written through its own
+    setters, one call per field, as with :class:`TrajectoryTracking`. By default, :meth:`update` writes all the rows;
+    with `skip_unchanged`, the tasks whose row did not change since the last write are skipped, which is only valid
+    when nothing else (a :class:`TrajectoryTracking`, user code, a reconnection) writes their targets.
+
+    It can be registered as an updater: :meth:`update` writes the current content of :attr:`buffer`.
+    """
+
+    def __init__(self, tasks, expressed_in_world=False, skip_unchanged=False):
+        """
+        :param list tasks: The tasks whose desired values are set, see :class:`TrajectoryTracking` for the valid tasks
+        :param bool expressed_in_world: Whether the velocities and accelerations are expressed in the reference frame instead of the task frame
+        :param bool skip_unchanged: Whether to skip the tasks whose row did not change since the last write;
+                                    it assumes that their targets are not modified by anything else
+
+        """
+        self.tasks          = list(tasks)
+        self.offsets        = []
+        self.skip_unchanged = skip_unchanged
+        self._writers       = []
+        layouts             = []
+        size = 0
+        for task in self.tasks:
+            tracking = TrajectoryTracking(task, expressed_in_world=expressed_in_world)
+            widths   = self._get_field_widths_(tracking._trajectory_type, task)
+            self.offsets.append(size)
+            layouts.append((tracking._doUpdateTask_, size, widths))
+            size += sum(widths)
+
+        self.size   = size
+        self.buffer = np.zeros(size)
+        self._written = np.empty(size)     # rows of the last write
+        self._written.fill(np.nan)          # which never equals a row, so all the tasks are written the first time
+        for writer, offset, widths in layouts:
+            bounds = np.cumsum((offset, ) + widths)
+            end    = offset + sum(widths)
+            self._writers.append((writer, tuple(self.buffer[a:b] for a, b in zip(bounds[:-1], bounds[1:])),
+                                  self.buffer[offset:end], self._written[offset:end]))
+
+    @staticmethod
+    def _get_field_widths_(trajectory_type, task):
+        if trajectory_type is CartesianTrajectory:
+            return (7, 6, 6)
+        elif trajectory_type is WrenchTrajectory:
+            return (7, 6)
+        else:
+            return (task.getDimension(), )*len(trajectory_type.fields)
+
+    def get_block(self, task):
+        """ Get the view on :attr:`buffer` where the row of `task` is written.
+        """
+        i = self.tasks.index(task)
+        end = self.offsets[i+1] if i+1 < len(self.tasks) else self.size
+        return self.buffer[self.offsets[i]:end]
+
+    def set_targets(self, values):
+        """ Copy `values`, an array of size :attr:`size`, in :attr:`buffer` and write them in the tasks.
+        """
+        self.buffer[:] = values
+        self.update()
+
+    def update(self):
+        """ Write the content of :attr:`buffer` in the tasks.
+        """
+        for writer, fields, row, written in self._writers:
+            if self.skip_unchanged:
+                if np.array_equal(row, written):
+                    continue
+                written[:] = row
+            writer(*fields)
 
 
 import numpy as np
@@ -109,7 +758,7 @@ class ZMPController(object):
     
     """
 
-    def __init__(self, comtask, dyn_model, goal, RonQ, horizon, dt, H_0_planeXY, stride=1, gravity=9.81, height=0.0, updatePxPu=True):
+    def __init__(self, comtask, dyn_model, goal, RonQ, horizon, dt, H_0_planeXY, stride=1, gravity=9.81, height=0.0, updatePxPu=True, gain_cache_size=256, hong_resolution=1e-5, engine="finite"):
         """
         :param comtask: The CoM task of the standing/walking robot to control
         :type  comtask: :class:`~core.ISIRTask`
@@ -127,6 +776,9 @@ class ZMPController(object):
         :param double height: The reference height of the CoM
         :param updatePxPu: Whether to update ZMP matrices, mainly if CoM changes
         :type  updatePxPu: bool or float
+        :param int gain_cache_size: The number of CoM height buckets whose preview gains are cached when matrices are updated; 0 disables the cache
+        :param double hong_resolution: The quantization step of ``height/gravity`` for the gain cache (in s^2)
+        :param string engine: The preview controller, "finite" (:class:`zmpy_python.ZMPController`) or "lqr" (:class:`zmpy_python.LQRZMPController`)
         
         If `updatePxPu` is set to:
         
@@ -140,7 +792,9 @@ class ZMPController(object):
         self.comtask = comtask
         self.dm      = dyn_model
         
-        self.zmp_ctrl = zmpy_python.ZMPController(horizon, dt, RonQ, stride, gravity, height)
+        if engine not in zmpy_python.ZMP_ENGINES:
+            raise ValueError("ZMP engine '"+str(engine)+"' is invalid; It should be one of "+str(sorted(zmpy_python.ZMP_ENGINES.keys())))
+        self.zmp_ctrl = zmpy_python.ZMP_ENGINES[engine](horizon, dt, RonQ, stride, gravity, height, gain_cache_size, hong_resolution)
         
         self.zmp_ctrl.setGoal(goal)
         
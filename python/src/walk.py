@@ -4,15 +4,13 @@
 """
 
 import task_controller
+from core import ContactSet
+from events import Signal
 
 import lgsm
 
 import numpy as np
 
-from scipy.interpolate import piecewise_polynomial_interpolate as ppi
-
-import time
-
 
 ################################################################################
 #
@@ -36,35 +34,52 @@ def traj2zmppoints(comtraj, step_length, step_side, left_start, right_start, sta
     :return: a list of points ``[(x1,y1,a1), ..., (xn,yn,an)]`` which represents the feet location on floor
 
     """
+    comtraj     = np.asarray(comtraj)
     left_start  = np.asarray(left_start)
     right_start = np.asarray(right_start)
     point = []
 
     if   start_foot == 'left' :
         point.extend([left_start, right_start])
+        side = 1.
     elif start_foot == 'right':
         point.extend([right_start, left_start])
+        side = -1.
     else:
         raise ValueError
-    next_foot = start_foot
 
-    sum_distance = 0.
-    for i in np.arange(len(comtraj)-1):
-        sum_distance += np.linalg.norm(comtraj[i+1][0:2]-comtraj[i][0:2])
-
-        if sum_distance > step_length:
-            angle = comtraj[i][2]
-            ecart = step_side*np.array([-np.sin(angle), np.cos(angle), 0])
-            if next_foot is 'right':
-                ecart = -ecart
-            point.append(comtraj[i] + ecart)
-            sum_distance = 0.
-            next_foot = 'right' if next_foot == 'left' else 'left'
+    # a step is done on the first point where the length walked since the previous step exceeds step_length
+    seg_length = np.sqrt(np.sum(np.diff(comtraj[:, 0:2], axis=0)**2, axis=1))
+    cum_length = np.cumsum(seg_length)
+    n_seg      = len(seg_length)
+
+    steps = []
+    start = 0
+    while start < n_seg:
+        # the total length locates the step, the partial sum from the previous step gives the exact index
+        origin = cum_length[start-1] if start > 0 else 0.
+        end    = min(np.searchsorted(cum_length, origin + step_length, side='right') + 2, n_seg)
+        while True:
+            over = np.flatnonzero(np.cumsum(seg_length[start:end]) > step_length)
+            if len(over) or end == n_seg:
+                break
+            end = min(2*end - start, n_seg)
+        if not len(over):
+            break
+        steps.append(start + over[0])
+        start = steps[-1] + 1
+
+    # the feet alternate on each side, starting with start_foot
+    steps  = np.array(steps, dtype=int)
+    sides  = side*(1 - 2*(np.arange(len(steps)) % 2))
+    angles = comtraj[steps, 2]
+    ecarts = step_side*np.column_stack([-np.sin(angles), np.cos(angles), np.zeros(len(steps))])
+    point.extend(comtraj[steps] + sides[:, None]*ecarts)
 
     # just to get the 2 last footsteps
     angle = comtraj[-1][2]
     ecart = step_side*np.array([-np.sin(angle), np.cos(angle), 0])
-    if next_foot == 'left':
+    if side*(1 - 2*(len(steps) % 2)) > 0:
         point.extend([comtraj[-1] + ecart, comtraj[-1] - ecart])
     else:
         point.extend([comtraj[-1] - ecart, comtraj[-1] + ecart])
@@ -98,9 +113,9 @@ def get_bounded_angles(p0, p1):
     """ Convert angles to get the shortest angle path.
     
     :param p0: The first point to test in the feet trajectory
-    :type  p0: [x_p0, y_p0, a_p0]
+    :type  p0: [x_p0, y_p0, a_p0], or a (3,N)-array of points
     :param p1: The second point to test in the feet trajectory
-    :type  p1: [x_p1, y_p1, a_p1]
+    :type  p1: [x_p1, y_p1, a_p1], or a (3,N)-array of points
 
     :return: ``[a_p0', a_p1']`` such as difference between them is minimal in ``[-2pi, 2pi]``
 
@@ -108,13 +123,100 @@ def get_bounded_angles(p0, p1):
     #WARNING: do this trick to get the shortest path:
     a0, a1 = (p0[2])%(2*np.pi), (p1[2])%(2*np.pi)
     diff = abs(a1 - a0)
-    if   abs(a1+2*np.pi - a0) <diff:
-        a1 += 2*np.pi
-    elif abs(a1-2*np.pi - a0) <diff:
-        a1 -= 2*np.pi
+    a1 = np.where(abs(a1+2*np.pi - a0) <diff, a1+2*np.pi,
+         np.where(abs(a1-2*np.pi - a0) <diff, a1-2*np.pi, a1))
     return a0, a1
 
 
+def get_quintic_profile(s):
+    """ Get the quintic profile going from 0 to 1 with null velocities and accelerations at both ends.
+
+    :param s: The normalized time, in ``[0, 1]``
+    :type  s: (N,)-array
+
+    :return: ``(f, df, ddf)``, the profile and its derivatives with respect to `s`
+
+    This is the curve interpolated by :func:`scipy.interpolate.piecewise_polynomial_interpolate` between
+    ``[0, 0, 0]`` and ``[1, 0, 0]``.
+
+    """
+    s = np.asarray(s, dtype=float)
+    f   = s**3*(10. - 15.*s + 6.*s**2)
+    df  = s**2*(30. - 60.*s + 30.*s**2)
+    ddf = s   *(60. - 180.*s + 120.*s**2)
+    return f, df, ddf
+
+
+def get_lift_profile(s):
+    """ Get the profile of a foot lift, going from 0 at ``s=0`` to 1 at ``s=.5`` and back to 0 at ``s=1``.
+
+    :param s: The normalized time, in ``[0, 1]``
+    :type  s: (N,)-array
+
+    :return: ``(f, df, ddf)``, the profile and its derivatives with respect to `s`
+
+    Each half is the quartic interpolated by :func:`scipy.interpolate.piecewise_polynomial_interpolate`
+    through ``[0, 0, 0]``, ``[1, 0]`` and ``[0, 0, 0]``.
+
+    """
+    s = np.asarray(s, dtype=float)
+    rising = s <= .5
+    u   = np.where(rising, 2.*s, 2.*(1. - s))
+    du  = np.where(rising, 2., -2.)
+    f   = u**3*(4. - 3.*u)
+    df  = u**2*(12. - 12.*u)*du
+    ddf = u   *(24. - 36.*u)*du**2
+    return f, df, ddf
+
+
+def planartraj2frametraj(pos, vel, acc, H_0_planeXY):
+    """ Convert trajectories ``[x, y, z, angle]`` expressed in the planeXY into frame trajectories.
+
+    :param pos: The positions ``[x, y, z, angle]`` in the planeXY, angle being around its normal
+    :type  pos: (...,4)-array
+    :param vel: The corresponding velocities
+    :type  vel: (...,4)-array
+    :param acc: The corresponding accelerations
+    :type  acc: (...,4)-array
+    :param H_0_plane_XY: the transformation matrix from 0 to the floor
+    :type  H_0_plane_XY: :class:`lgsm.Displacement`
+
+    :return: ``(pos, vel, acc)``, a (...,7)-array of poses ``[x, y, z, qw, qx, qy, qz]`` in 0 and two (...,6)-arrays
+             of twists, as expected by :class:`task_controller.CartesianTrajectory`
+
+    The twists are the derivatives of the trajectories expressed in the frame of the
+    controlled segment, and then rotated by the planeXY orientation.
+
+    """
+    pos, vel, acc = [np.asarray(v, dtype=float) for v in (pos, vel, acc)]
+
+    t_0_p = np.asarray(H_0_planeXY.getTranslation(), dtype=float).ravel()
+    qw, qx, qy, qz = H_0_planeXY.getRotation().tolist()
+    R_0_p = task_controller.quaternion2matrix([qw, qx, qy, qz])
+
+    c, s = np.cos(pos[..., 3]/2.), np.sin(pos[..., 3]/2.)
+    pos_out = np.empty(pos.shape[:-1]+(7,))
+    pos_out[..., 0:3] = t_0_p + np.dot(pos[..., 0:3], R_0_p.T)
+    pos_out[..., 3] = qw*c - qz*s
+    pos_out[..., 4] = qx*c + qy*s
+    pos_out[..., 5] = qy*c - qx*s
+    pos_out[..., 6] = qw*s + qz*c
+
+    ca, sa = np.cos(pos[..., 3]), np.sin(pos[..., 3])
+    twists = []
+    for d in (vel, acc):
+        tw = np.empty(pos.shape[:-1]+(6,))
+        tw[..., 0:3] = d[..., 3, None]*R_0_p[:, 2]
+        lin = np.empty(pos.shape[:-1]+(3,))
+        lin[..., 0] =  ca*d[..., 0] + sa*d[..., 1]
+        lin[..., 1] = -sa*d[..., 0] + ca*d[..., 1]
+        lin[..., 2] = d[..., 2]
+        tw[..., 3:6] = np.dot(lin, R_0_p.T)
+        twists.append(tw)
+
+    return pos_out, twists[0], twists[1]
+
+
 def zmppoints2foottraj(points, step_time, ratio, step_height, dt, H_0_planeXY):
     """ Compute the trajectory of the feet.
 
@@ -128,49 +230,42 @@ def zmppoints2foottraj(points, step_time, ratio, step_height, dt, H_0_planeXY):
 
     :return: a list of ``k`` step trajectories ``[ traj_step_0, ..., traj_step_k]`` with:
             
-            * ``traj_step_i = [(pos_0, vel_0, acc_0), ..., (pos_n, vel_n, acc_n)]``
+            * ``traj_step_i``: :class:`task_controller.CartesianTrajectory`, whose sample ``j`` is ``(pos_j, vel_j, acc_j)``
             * ``pos_j``: :class:`lgsm.Displacement`
             * ``vel_j``: :class:`lgsm.Twist`
             * ``acc_j``: :class:`lgsm.Twist`
 
-    """
-    foot_traj = []
+    All the steps are computed at once with the closed forms of the quintic (X, Y, angle)
+    and quartic (Z) splines; the lgsm objects are only created when a sample is read.
 
-    Adj_0_planeXY = lgsm.Displacement([0,0,0]+H_0_planeXY.getRotation().tolist()).adjoint()
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return []
 
-    xin   = [0, step_time*ratio]
-    xin_Z = [0, step_time*ratio/2., step_time*ratio]
+    T     = step_time*ratio
     xout  = np.arange(0, step_time*ratio+dt, dt)
-    yin_Z = [[0, 0, 0], [step_height, 0], [0, 0, 0]]
-
-    for i in np.arange(len(points)-2):
-        
-        a_start, a_end = get_bounded_angles(points[i], points[i+2])
-        yin_X = [[points[i][0], 0, 0], [points[i+2][0], 0, 0]]
-        yin_Y = [[points[i][1], 0, 0], [points[i+2][1], 0, 0]]
-        yin_A = [[a_start,      0, 0], [a_end,          0, 0]]
-
-        res_X = (ppi(xin  , yin_X, xout), ppi(xin  , yin_X, xout, der=1), ppi(xin  , yin_X, xout, der=2))
-        res_Y = (ppi(xin  , yin_Y, xout), ppi(xin  , yin_Y, xout, der=1), ppi(xin  , yin_Y, xout, der=2))
-        res_Z = (ppi(xin_Z, yin_Z, xout), ppi(xin_Z, yin_Z, xout, der=1), ppi(xin_Z, yin_Z, xout, der=2))
-        res_A = (ppi(xin  , yin_A, xout), ppi(xin  , yin_A, xout, der=1), ppi(xin  , yin_A, xout, der=2))
-
-        traj_foot_i = []
-
-        for j in np.arange(len(xout)):
 
-            pos_j = lgsm.Displacement(res_X[0][j], res_Y[0][j], res_Z[0][j], np.cos(res_A[0][j]/2.), 0, 0, np.sin(res_A[0][j]/2.) )
+    p_start = points[:-2]
+    p_end   = points[2:]
+    a_start, a_end = get_bounded_angles(p_start.T, p_end.T)
+    start = np.column_stack([p_start[:, 0:2], np.zeros(len(p_start)), a_start])
+    delta = np.column_stack([p_end[:, 0:2] - p_start[:, 0:2], np.zeros(len(p_start)), a_end - a_start])
 
-            Adj_frame_0 = lgsm.Displacementd(0,0,0, np.cos(res_A[0][j]/2.), 0, 0, np.sin(-res_A[0][j]/2.)).adjoint()
+    f,   df,   ddf   = get_quintic_profile(xout/T)
+    f_Z, df_Z, ddf_Z = get_lift_profile(xout/T)
 
-            vel_j = Adj_frame_0 * lgsm.Twist( lgsm.vector(0, 0, res_A[1][j], res_X[1][j], res_Y[1][j], res_Z[1][j]) )
-            acc_j = Adj_frame_0 * lgsm.Twist( lgsm.vector(0, 0, res_A[2][j], res_X[2][j], res_Y[2][j], res_Z[2][j]) )
+    # (k steps, n samples, [x, y, z, a])
+    pos = start[:, None, :] + delta[:, None, :]*f[None, :, None]
+    vel = delta[:, None, :]*(df [None, :, None]/T)
+    acc = delta[:, None, :]*(ddf[None, :, None]/T**2)
+    pos[..., 2] = step_height*f_Z
+    vel[..., 2] = step_height*df_Z/T
+    acc[..., 2] = step_height*ddf_Z/T**2
 
-            traj_foot_i.append( (H_0_planeXY * pos_j, Adj_0_planeXY * vel_j, Adj_0_planeXY * acc_j) )
+    pos, vel, acc = planartraj2frametraj(pos, vel, acc, H_0_planeXY)
 
-        foot_traj.append(traj_foot_i)
-
-    return foot_traj
+    return [task_controller.CartesianTrajectory(pos[i], vel[i], acc[i]) for i in range(len(pos))]
 
 
 def zmppoints2waisttraj(points, step_time, dt, H_0_planeXY):
@@ -182,38 +277,30 @@ def zmppoints2waisttraj(points, step_time, dt, H_0_planeXY):
     :param H_0_plane_XY: the transformation matrix from 0 to the floor
     :type  H_0_plane_XY: :class:`lgsm.Displacement`
     
-    :return: a list with the whole waist trajectory ``[(pos_0, vel_0, acc_0), ..., (pos_n, vel_n, acc_n)]`` with:
+    :return: the whole waist trajectory, a :class:`task_controller.CartesianTrajectory` whose sample ``j`` is ``(pos_j, vel_j, acc_j)`` with:
             
             * ``pos_j``: :class:`lgsm.Displacement`
             * ``vel_j``: :class:`lgsm.Twist`
             * ``acc_j``: :class:`lgsm.Twist`
     """
-    waist_traj = []
-    
-    Adj_0_planeXY = lgsm.Displacement([0,0,0]+H_0_planeXY.getRotation().tolist()).adjoint()
-    
-    xin   = [0, step_time]
-    xout  = np.arange(0, step_time+dt, dt)
-    
-    for i in np.arange(len(points)-1):
-    
-        a_start, a_end = get_bounded_angles(points[i], points[i+1])
-        yin_A = [[a_start, 0, 0], [a_end, 0, 0]]
+    points = np.asarray(points, dtype=float)
 
-        res_A = (ppi(xin  , yin_A, xout), ppi(xin  , yin_A, xout, der=1), ppi(xin  , yin_A, xout, der=2))
-        
-        for j in np.arange(len(xout)):
-
-            pos_j = lgsm.Displacement(0,0,0, np.cos(res_A[0][j]/2.), 0, 0, np.sin(res_A[0][j]/2.) )
+    xout  = np.arange(0, step_time+dt, dt)
 
-            Adj_frame_0 = lgsm.Displacementd(0,0,0, np.cos(res_A[0][j]/2.), 0, 0, np.sin(-res_A[0][j]/2.)).adjoint()
+    a_start, a_end = get_bounded_angles(points[:-1].T, points[1:].T)
+    f, df, ddf = get_quintic_profile(xout/step_time)
 
-            vel_j = Adj_frame_0 * lgsm.Twist( lgsm.vector(0, 0, res_A[1][j], 0,0,0) )
-            acc_j = Adj_frame_0 * lgsm.Twist( lgsm.vector(0, 0, res_A[2][j], 0,0,0) )
+    # (k steps, n samples, [x, y, z, a]), then all steps one after the other
+    shape = (len(a_start), len(xout), 4)
+    pos, vel, acc = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    delta = (a_end - a_start)[:, None]
+    pos[..., 3] = a_start[:, None] + delta*f
+    vel[..., 3] = delta*df /step_time
+    acc[..., 3] = delta*ddf/step_time**2
 
-            waist_traj.append( (H_0_planeXY * pos_j, Adj_0_planeXY * vel_j, Adj_0_planeXY * acc_j) )
+    pos, vel, acc = [v.reshape(-1, 4) for v in (pos, vel, acc)]
 
-    return waist_traj
+    return task_controller.CartesianTrajectory(*planartraj2frametraj(pos, vel, acc, H_0_planeXY))
 
 
 
@@ -226,14 +313,16 @@ def zmppoints2waisttraj(points, step_time, dt, H_0_planeXY):
 class FootTrajController(object):
     """ A controller to determine which foot has to be considered linked with the ground and which foot is released.
     """
-    def __init__(self, lf_ctrl, rf_ctrl, lf_contacts, rf_contacts, ftraj, step_time, step_ratio, dt, start_foot, contact_as_objective, verbose=False):
+    def __init__(self, lf_ctrl, rf_ctrl, lf_contacts, rf_contacts, ftraj, step_time, step_ratio, dt, start_foot, contact_as_objective, verbose=False, phase_signal=None):
         """
         :param lf_ctrl: A controller which will set the trajectory to the left foot
         :type  lf_ctrl: :class:`task_controller.TrajectoryTracking`
         :param rf_ctrl: A controller which will set the trajectory to the right foot
         :type  rf_ctrl: :class:`task_controller.TrajectoryTracking`
-        :param list lf_contacts: The list of the contact tasks related to the left foot
-        :param list rf_contacts: The list of the contact tasks related to the right foot
+        :param lf_contacts: The contact tasks related to the left foot
+        :type  lf_contacts: :class:`~core.ContactSet` or list
+        :param rf_contacts: The contact tasks related to the right foot
+        :type  rf_contacts: :class:`~core.ContactSet` or list
         :param list ftraj: a list with all step trajectories [[(pos_i, vel_i, acc_i)]], generally returned by :func:`zmppoints2foottraj`
         :param double step_time: the time between 2 steps
         :param double step_ratio: ratio between single support phase time and complete cycle time
@@ -241,12 +330,14 @@ class FootTrajController(object):
         :param string start_foot: 'left' or 'right'
         :param bool contact_as_objective: Whether to consider contacts as objective (True) or constraint (False) when they are re-activated
         :param bool verbose: Whether to print information on FootTrajController evolution
+        :param phase_signal: The signal notified when the walking phase changes; if None, a new one
+        :type  phase_signal: :class:`events.Signal`
 
         """
         self.lf_ctrl     = lf_ctrl
         self.rf_ctrl     = rf_ctrl
-        self.lf_contacts = lf_contacts
-        self.rf_contacts = rf_contacts
+        self.lf_contacts = lf_contacts if isinstance(lf_contacts, ContactSet) else ContactSet(lf_contacts)
+        self.rf_contacts = rf_contacts if isinstance(rf_contacts, ContactSet) else ContactSet(rf_contacts)
         
         self.contact_as_objective = contact_as_objective
         self.verbose              = verbose
@@ -265,6 +356,7 @@ class FootTrajController(object):
         self.status_is_walking           = True     # when initialized, it starts to walk
         self.status_is_on_double_support = True
         self.status_is_on_simple_support = False
+        self.phase_signal = phase_signal if phase_signal is not None else Signal()
 
 
     def update(self):
@@ -294,8 +386,9 @@ class FootTrajController(object):
                     print "reactivate contact of FOOT", self.current_foot
                 self.stop_current_foot_trajectory()
 
-        else:
+        elif self.status_is_walking:
             self.status_is_walking = False
+            self.phase_signal.notify()
 
 
     def stop_current_foot_trajectory(self):
@@ -305,8 +398,10 @@ class FootTrajController(object):
         They are considered as either objectives or constraints, depending on argument in constructor.
         
         """
-        self.status_is_on_double_support = True
-        self.status_is_on_simple_support = False
+        if not self.status_is_on_double_support:
+            self.status_is_on_double_support = True
+            self.status_is_on_simple_support = False
+            self.phase_signal.notify()
 
         if   self.current_foot == 'left' :
             contacts = self.lf_contacts
@@ -315,11 +410,9 @@ class FootTrajController(object):
             contacts = self.rf_contacts
 
         if self.contact_as_objective is True:
-            for c in contacts:
-                c.activateAsObjective()
+            contacts.activateAsObjective()
         else:
-            for c in contacts:
-                c.activateAsConstraint()
+            contacts.activateAsConstraint()
 
 
     def start_next_foot_trajectory(self):
@@ -331,6 +424,7 @@ class FootTrajController(object):
         """
         self.status_is_on_double_support = False
         self.status_is_on_simple_support = self.current_foot
+        self.phase_signal.notify()
 
         self.current_foot = 'left' if self.current_foot=='right' else 'right'
         
@@ -345,8 +439,7 @@ class FootTrajController(object):
 
             foot_ctrl.set_new_trajectory( self.foot_traj[self.num_step] )
 
-            for c in contacts:
-                c.deactivate()
+            contacts.deactivate()
 
         self.num_step += 1
 
@@ -455,6 +548,7 @@ class WalkingActivity(object):
         # Creation of the sub-tasks controllers, to set the feet/waist/CoM trajectories
         self.com_ctrl   = None
         self.feet_ctrl  = None
+        self.phase_signal = Signal()    # notified when the walking phase changes
         self.lfoot_ctrl = task_controller.TrajectoryTracking(self.lfoot_task, [])
         self.rfoot_ctrl = task_controller.TrajectoryTracking(self.rfoot_task, [])
         self.waist_rot_ctrl = task_controller.TrajectoryTracking(self.waist_rot_task, [])
@@ -550,7 +644,7 @@ class WalkingActivity(object):
             orientation = [(orientation, lgsm.Twist(), lgsm.Twist())]
         self.waist_rot_ctrl.set_new_trajectory( orientation )
 
-    def set_zmp_control_parameters(self, RonQ=1e-6, horizon=1.6, stride=3, gravity=9.81, height_ref=0.0, updatePxPu=True):
+    def set_zmp_control_parameters(self, RonQ=1e-6, horizon=1.6, stride=3, gravity=9.81, height_ref=0.0, updatePxPu=True, gain_cache_size=256, hong_resolution=1e-5, engine="finite"):
         """ Set the parameters for the ZMP control.
         
         :param double RonQ: the ratio between the tracking of the control vector and the tracking of the state vector
@@ -559,6 +653,9 @@ class WalkingActivity(object):
         :param double gravity: The amplitude of the gravity vector
         :param double height_ref: The reference CoM height, to compute the ZMP preview control matrices, if they are not updated at each time step
         :param bool updatePxPu: Whether to update ZMP matrices, mainly if CoM changes (see below)
+        :param int gain_cache_size: The number of CoM height buckets whose preview gains are cached when matrices are updated; 0 disables the cache
+        :param double hong_resolution: The quantization step of ``height/gravity`` for the gain cache (in s^2)
+        :param string engine: The preview controller of the ZMP (see below)
         
         If `updatePxPu` is set to:
         
@@ -566,13 +663,24 @@ class WalkingActivity(object):
         * True, then the matrices are updated at each time step
         * float (a tolerance), then if the reference height move beyond this `tolerance`, the matrices are updated and the new height becomes the reference
         
+        When matrices are updated, the gains are looked up in a cache indexed by the quantized
+        ``height/gravity``, see :class:`zmpy_python.GainCache`.
+        
+        The `engine` can be:
+        
+        * "finite", the finite-horizon least-squares preview control (:class:`zmpy_python.ZMPController`);
+        * "lqr", the infinite-horizon LQR preview control with integral action (:class:`zmpy_python.LQRZMPController`), solved once per (dt, height, RonQ); `stride` is not used.
+        
         """
-        self.RonQ          = RonQ
-        self.horizon       = horizon
-        self.stride        = stride
-        self.gravity       = gravity
-        self.height_ref    = height_ref
-        self.updatePxPu    = updatePxPu
+        self.RonQ            = RonQ
+        self.horizon         = horizon
+        self.stride          = stride
+        self.gravity         = gravity
+        self.height_ref      = height_ref
+        self.updatePxPu      = updatePxPu
+        self.gain_cache_size = gain_cache_size
+        self.hong_resolution = hong_resolution
+        self.engine          = engine
 
     def set_step_parameters(self, length=.1, side=.05, height=.01, time=1, ratio=.9, start_foot="left"):
         """ Set the parameters for the footsteps, to parameterize the feet trajectories.
@@ -646,12 +754,13 @@ class WalkingActivity(object):
         if self.feet_ctrl is not None:
             self.ctrl.remove_updater( self.feet_ctrl )
 
-        self.com_ctrl = task_controller.ZMPController( self.com_task, self.dm, zmp_traj, self.RonQ, self.horizon, self.dt, self.H_0_planeXY, self.stride, self.gravity, self.height_ref, self.updatePxPu)
+        self.com_ctrl = task_controller.ZMPController( self.com_task, self.ctrl.getModelSnapshot(), zmp_traj, self.RonQ, self.horizon, self.dt, self.H_0_planeXY, self.stride, self.gravity, self.height_ref, self.updatePxPu, self.gain_cache_size, self.hong_resolution, self.engine)
         self.ctrl.add_updater( self.com_ctrl )
 
         if feet_trajs is not None:
-            self.feet_ctrl = FootTrajController(self.lfoot_ctrl, self.rfoot_ctrl, self.lfoot_contacts, self.rfoot_contacts, feet_trajs, self.step_time, self.ratio, self.dt, self.start_foot, self.contact_as_objective)
+            self.feet_ctrl = FootTrajController(self.lfoot_ctrl, self.rfoot_ctrl, self.lfoot_contacts, self.rfoot_contacts, feet_trajs, self.step_time, self.ratio, self.dt, self.start_foot, self.contact_as_objective, phase_signal=self.phase_signal)
             self.ctrl.add_updater( self.feet_ctrl )
+            self.phase_signal.notify()
 
         if waist_traj is not None:
             self.waist_rot_ctrl.set_new_trajectory( waist_traj )
@@ -769,27 +878,37 @@ class WalkingActivity(object):
         return zmp_ref
 
 
-    def wait_for_end_of_walking(self, period=1e-3):
+    def wait_for_end_of_walking(self, period=None, timeout=None):
         """ Blocking method, until the walking activity is done.
         
-        :param double period: Time interval between two test of :meth:`is_walking`
+        :param period: Unused, kept for compatibility; :meth:`is_walking` is tested when the walking phase changes
+        :param double timeout: The max time to wait, in second; None to wait forever
+
+        :return: True if the walking activity is done, False if the timeout expired
         
         """
-        while 1:
-            if not self.is_walking():
-                break
-            time.sleep(period)
+        return self.phase_signal.wait_for(lambda: not self.is_walking(), timeout)
 
-    def wait_for_double_support(self, period=1e-3):
+    def wait_for_double_support(self, period=None, timeout=None):
         """ Blocking method, until the robot is in double support configuration.
         
-        :param double period: Time interval between two test of :meth:`is_on_double_support`
+        :param period: Unused, kept for compatibility; :meth:`is_on_double_support` is tested when the walking phase changes
+        :param double timeout: The max time to wait, in second; None to wait forever
+
+        :return: True if the robot is in double support, False if the timeout expired
         
         """
-        while 1:
-            if self.is_on_double_support():
-                break
-            time.sleep(period)
+        return self.phase_signal.wait_for(self.is_on_double_support, timeout)
+
+    def wait_for_end_of_walking_async(self, loop=None):
+        """ Get an asyncio future done when the walking activity is done, see :meth:`wait_for_end_of_walking`.
+        """
+        return self.phase_signal.as_future(lambda: not self.is_walking(), loop)
+
+    def wait_for_double_support_async(self, loop=None):
+        """ Get an asyncio future done when the robot is in double support configuration, see :meth:`wait_for_double_support`.
+        """
+        return self.phase_signal.as_future(self.is_on_double_support, loop)
 
 
 
@@ -12,16 +12,146 @@ def get_quadratic_cmd(Px, Pu, RonQ, h, x_hat, z_ref):
     return cmd_traj
 
 
-import numpy as np
+def get_first_cmd_gain(Pu, RonQ, h):
+    """ Get the row of the preview gain which gives the first sample of the command trajectory.
+
+    Only the first command of :func:`get_quadratic_cmd` is applied, so it reduces to
+    ``cmd_traj[0] = - np.dot(K, np.dot(Px, x_hat) - z_ref)``. As ``Pu.T*Pu + RonQ*I`` is
+    symmetric, its first row is obtained with one linear solve instead of a full inversion.
+    """
+    e0 = np.zeros(h)
+    e0[0] = 1.
+    K = np.dot(Pu, np.linalg.solve(np.dot(Pu.T, Pu) + RonQ*np.eye(h), e0))
+    return K
+
 
+def get_lqr_preview_gains(dt, hong, RonQ, h):
+    """ Solve the infinite-horizon preview control of the ZMP with integral action.
+
+    The cart-table model is ``x(k+1) = A.x(k) + B.u(k)``, ``zmp(k) = C.x(k)``, with the state
+    ``x = [pos, vel, acc]``, the jerk ``u``, and ``C = [1, 0, -hong]``. It is augmented with
+    the integral of the ZMP error, and the cost ``sum(e^2 + RonQ*du^2)`` is minimized.
+
+    :return: ``(Gi, Gx, Gd)``, the integral gain (double), the state gain (3,) and the preview gain (h,)
 
-class ZMPController(object):
     """
+    from scipy.linalg import solve_discrete_are
+
+    A = np.array([[1., dt, dt**2/2.], [0., 1., dt], [0., 0., 1.]])
+    B = np.array([[dt**3/6.], [dt**2/2.], [dt]])
+    C = np.array([[1., 0., -hong]])
+
+    At = np.eye(4)
+    At[0, 1:]  = np.dot(C, A)
+    At[1:, 1:] = A
+    Bt = np.vstack([np.dot(C, B), B])
+    It = np.array([[1.], [0.], [0.], [0.]])
+    Ft = At[:, 1:]
+    Qt = np.zeros((4, 4))
+    Qt[0, 0] = 1.
+
+    P  = solve_discrete_are(At, Bt, Qt, RonQ*np.eye(1))
+    W  = np.linalg.inv(RonQ + np.dot(Bt.T, np.dot(P, Bt)))   # (1,1)
+    WB = np.dot(W, Bt.T)
+
+    Gi = np.dot(WB, np.dot(P, It)).item(0)
+    Gx = np.dot(WB, np.dot(P, Ft)).flatten()
+
+    Ac = At - np.dot(Bt, np.dot(WB, np.dot(P, At)))
+    Gd = np.zeros(h)
+    X  = - np.dot(Ac.T, np.dot(P, It))
+    Gd[0] = - Gi
+    for j in range(1, h):
+        Gd[j] = np.dot(WB, X).item(0)
+        X     = np.dot(Ac.T, X)
+
+    return Gi, Gx, Gd
+
+
+import numpy as np
+
+from collections import OrderedDict
+
+
+class GainCache(object):
+    """ Bounded cache of preview gains, keyed by the quantized value of ``hong = height/gravity``.
+
+    When the cache is full, the least recently used entry is evicted.
     """
-    def __init__(self, horizon, dt, RonQ=1e-6, stride=1, gravity=9.81, height=0.0):
+    def __init__(self, size, resolution):
+        """
+        :param int size: the maximum number of buckets kept in the cache
+        :param double resolution: the quantization step of ``hong`` (in s^2)
+        """
+        self.size       = size
+        self.resolution = resolution
+        self.hits       = 0
+        self.misses     = 0
+        self._entries   = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, hong):
+        """ Return the bucket index of `hong`.
+        """
+        return int(round(hong/self.resolution))
+
+    def value(self, key):
+        """ Return the value of ``hong`` at the center of the bucket `key`.
+        """
+        return key*self.resolution
+
+    def get(self, key):
+        """ Return the gains stored for the bucket `key`, or None if they are not in the cache.
+        """
+        try:
+            gains = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = gains   # re-insert as the most recently used
+        self.hits += 1
+        return gains
+
+    def peek(self, key):
+        """ Return the gains stored for the bucket `key`, or None, without changing the counters nor the eviction order.
+        """
+        return self._entries.get(key)
+
+    def put(self, key, gains):
+        """ Store the gains of the bucket `key`, evicting the least recently used one if the cache is full.
         """
+        self._entries.pop(key, None)
+        self._entries[key] = gains
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits   = 0
+        self.misses = 0
+
+    def info(self):
+        """ Return a dict with the counters and the state of the cache.
         """
+        return {"hits"      : self.hits,
+                "misses"    : self.misses,
+                "entries"   : len(self._entries),
+                "size"      : self.size,
+                "resolution": self.resolution}
+
 
+class PreviewController(object):
+    """ Base class of the ZMP preview controllers: storage of the goal and of the height-keyed gains.
+
+    Subclasses define how the gains are computed for a given ``hong = height/gravity``
+    (:meth:`_compute_gains`), how they are set (:meth:`_set_gains`), and the jerk command
+    (:meth:`_get_cmd`).
+    """
+    def __init__(self, horizon, dt, RonQ=1e-6, stride=1, gravity=9.81, gain_cache_size=256, hong_resolution=1e-5):
+        """
+        """
         self._goal    = None
         self._RonQ    = RonQ
         self._dt      = dt * stride
@@ -32,6 +162,102 @@ class ZMPController(object):
 
         self._counter  = 0
 
+        if gain_cache_size > 0:
+            self._gain_cache = GainCache(gain_cache_size, hong_resolution)
+        else:
+            self._gain_cache = None
+
+    def getGainCache(self):
+        """ Return the :class:`GainCache` instance, or None if it is disabled.
+        """
+        return self._gain_cache
+
+
+    def setGoal(self, new_goal):
+        """ Set the ZMP trajectory to track, a (n,2)-array sampled at `dt`.
+
+        The goal is padded once with its final value over the whole horizon, so the
+        windows returned at each time step are views without new allocation.
+        """
+        new_goal = np.asarray(new_goal, dtype=float)
+        n_goal   = len(new_goal)
+
+        self._padded_goal = np.empty((n_goal + self._N*self._stride, 2))
+        self._padded_goal[:n_goal] = new_goal
+        self._padded_goal[n_goal:] = new_goal[-1]
+
+        self._goal     = self._padded_goal[:n_goal]
+        self._goal_len = n_goal
+
+    def _fit_goal_for_horizon(self):
+        """ Return the goal on the horizon, a strided (N,2) view of the padded goal.
+        """
+        start = min(self._counter, self._goal_len)
+        goal  = self._padded_goal[start:start+(self._N*self._stride):self._stride]
+        self._counter += 1
+        return goal
+
+
+    def _compute_gains(self, hong):
+        raise NotImplementedError
+
+    def _set_gains(self, gains):
+        raise NotImplementedError
+
+    def _get_cmd(self, com_hat, zmp_ref, hong):
+        raise NotImplementedError
+
+    def _get_gains(self, hong):
+        """ Return the gains for ``hong``; with the cache, those of the ``hong`` bucket, computed and stored if they are not in the cache.
+        """
+        cache = self._gain_cache
+        if cache is None:
+            return self._compute_gains(hong)
+
+        key   = cache.key(hong)
+        gains = cache.get(key)
+        if gains is None:
+            gains = self._compute_gains(cache.value(key))
+            cache.put(key, gains)
+        return gains
+
+
+    def update(self, pos_xy, vel_xy, acc_xy, height=0.0, update_PxPu=True):
+        """
+        """
+        com_hat = np.array([pos_xy, vel_xy, acc_xy])
+        hong = height/self._gravity
+
+        zmp_ref = self._fit_goal_for_horizon()
+        
+        if update_PxPu is True:
+            self._set_gains(self._get_gains(hong))
+
+        ddV_com_XY_0 = self._get_cmd(com_hat, zmp_ref, hong)
+
+        dVcom_des_XY      = np.zeros(2)
+        dVcom_des_XY[0:2] = com_hat[2, :] + ddV_com_XY_0 * self._real_dt
+
+        return dVcom_des_XY
+
+
+
+class ZMPController(PreviewController):
+    """ Finite-horizon preview controller, solved as a least-squares problem on the horizon.
+    """
+    def __init__(self, horizon, dt, RonQ=1e-6, stride=1, gravity=9.81, height=0.0, gain_cache_size=256, hong_resolution=1e-5):
+        """
+        :param int gain_cache_size: the number of height buckets whose gains are kept when matrices are updated; 0 disables the cache
+        :param double hong_resolution: the quantization step of ``hong = height/gravity`` used as cache key (in s^2)
+
+        With the cache, the gains are computed at the center of the ``hong`` bucket, so the
+        height used by the controller differs from the real one by at most
+        ``gravity*hong_resolution/2`` (0.05 mm with the default values). For the default
+        horizon, this changes the gains by less than 1e-4 (relative). Px and Pu are only
+        updated on a cache miss.
+        """
+        PreviewController.__init__(self, horizon, dt, RonQ, stride, gravity, gain_cache_size, hong_resolution)
+
         self._Px       = np.zeros((self._N, 3))
         self._Pu       = np.zeros((self._N, self._N))
 
@@ -46,7 +272,7 @@ class ZMPController(object):
             self._temp_Pu[np.arange(i, self._N), np.arange(self._N-i)] = diag_i
         self._ltri_idx = np.tril_indices(self._N, 0)    #TODO: 0 or -1 ???
 
-        self._update_Px_and_Pu( height/self._gravity )
+        self._set_gains(self._compute_gains(height/self._gravity))
 
     def getPx(self):
         return self._Px
@@ -54,50 +280,158 @@ class ZMPController(object):
     def getPu(self):
         return self._Pu
 
+    def getGain(self):
+        """ Return ``(K, KPx)``, the gains which give the first command sample ``np.dot(K, z_ref) - np.dot(KPx, x_hat)``.
+        """
+        return self._K, self._KPx
 
-    def setGoal(self, new_goal):
+
+    def _update_Px_and_Pu(self, hong):
         """
         """
-        self._goal = np.asarray(new_goal)
+        self._fill_Px_and_Pu(hong, self._Px, self._Pu)
 
-    def _fit_goal_for_horizon(self):
-        """
+    def _fill_Px_and_Pu(self, hong, Px, Pu):
+        """ Write the prediction matrices of ``hong`` in `Px` and `Pu`; only the column of Px which depends on ``hong`` is written.
         """
-        goal = self._goal[self._counter:self._counter+(self._N*self._stride):self._stride]
-        self._counter += 1
-        if len(goal) < self._N:
-            final_value = self._goal[-1].reshape((1, 2))
-            len_gap = self._N - len(goal)
-            added_part = np.dot(np.ones((len_gap, 1)), final_value)
-            goal = np.vstack([goal, added_part])
-        return goal
+        Px[:, 2] = self._range_N_dt_2_on_2 - hong
 
+        Pu[:]               = self._temp_Pu
+        Pu[self._ltri_idx] -= self._dt*hong
 
-    def _update_Px_and_Pu(self, hong):
+    def _compute_gains(self, hong):
+        self._update_Px_and_Pu(hong)
+        K = get_first_cmd_gain(self._Pu, self._RonQ, self._N)
+        return K, np.dot(K, self._Px)
+
+    def _peek_gains(self, hong):
+        """ Return the gains ``update`` would use for ``hong``, without changing Px, Pu nor the gain cache.
         """
+        cache = self._gain_cache
+        if cache is not None:
+            key   = cache.key(hong)
+            gains = cache.peek(key)
+            if gains is not None:
+                return gains
+            hong = cache.value(key)
+        Px, Pu = self._Px.copy(), np.empty_like(self._Pu)
+        self._fill_Px_and_Pu(hong, Px, Pu)
+        K = get_first_cmd_gain(Pu, self._RonQ, self._N)
+        return K, np.dot(K, Px)
+
+    def _set_gains(self, gains):
+        self._K, self._KPx = gains
+
+    def _get_cmd(self, com_hat, zmp_ref, hong):
+        return np.dot(self._K, zmp_ref) - np.dot(self._KPx, com_hat)
+
+
+    def plan(self, pos_xy, vel_xy, acc_xy, height=0.0, n_steps=None):
+        """ Simulate the closed loop of the controller on the cart-table model over the whole goal.
+
+        :param pos_xy: The initial CoM position on the XY plane
+        :param vel_xy: The initial CoM velocity on the XY plane
+        :param acc_xy: The initial CoM acceleration on the XY plane
+        :param double height: The CoM height, constant during the rollout
+        :param int n_steps: The number of time steps to simulate; if None, the length of the goal
+
+        :return: ``(pos, vel, acc, zmp)``, four (n_steps,2)-arrays; row k is the state reached
+                 after the k-th update, whose ZMP tracks ``goal[k]``
+
+        The rollout starts from the beginning of the goal and does not modify the controller:
+        the gains are those ``update`` would use for this height, read from the gain cache
+        without changing it when it is enabled, else computed on copies of Px and Pu.
+        With constant gains, the closed loop is a linear time-invariant system, so the
+        feedforward of all the goal windows is computed with one product, and only the
+        3x3 recursion of the state is iterated.
         """
-        self._Px[:, 2] = self._range_N_dt_2_on_2 - hong
+        from numpy.lib.stride_tricks import as_strided
 
-        self._Pu[:]               = self._temp_Pu
-        self._Pu[self._ltri_idx] -= self._dt*hong
+        hong    = height/self._gravity
+        K, KPx  = self._peek_gains(hong)
+        N, s    = self._N, self._stride
+        n_goal  = self._goal_len
+        if n_steps is None:
+            n_steps = n_goal
 
+        # feedforward term np.dot(K, window_k) for all the time steps; beyond the goal, windows are constant
+        n_win   = min(n_steps, n_goal)
+        row, col = self._padded_goal.strides
+        windows = as_strided(self._padded_goal, shape=(n_win, N, 2), strides=(row, s*row, col))
+        ff = np.empty((n_steps, 2))
+        ff[:n_win] = np.einsum('n,knd->kd', K, windows)
+        ff[n_win:] = np.sum(K)*self._padded_goal[-1]
 
-    def update(self, pos_xy, vel_xy, acc_xy, height=0.0, update_PxPu=True):
+        # cart-table model on the real time step, and closed loop x(k+1) = (A - B.KPx).x(k) + B.ff(k)
+        dt  = self._real_dt
+        A   = np.array([[1., dt, dt**2/2.], [0., 1., dt], [0., 0., 1.]])
+        B   = np.array([dt**3/6., dt**2/2., dt])
+        Phi = A - np.outer(B, KPx)
+        Bff = B[None, :, None] * ff[:, None, :]
+
+        states = np.empty((n_steps, 3, 2))
+        x = np.array([pos_xy, vel_xy, acc_xy], dtype=float)
+        for k in range(n_steps):
+            x = np.dot(Phi, x)
+            x += Bff[k]
+            states[k] = x
+        pos, vel, acc = states[:, 0], states[:, 1], states[:, 2]
+        zmp = pos - hong*acc
+        return pos, vel, acc, zmp
+
+
+
+class LQRZMPController(PreviewController):
+    """ Infinite-horizon preview controller: discrete LQR of the cart-table model with integral action.
+
+    The gains are solved once for each (dt, height, RonQ) from the discrete algebraic Riccati
+    equation of the system augmented with the integral of the ZMP error, as in:
+
+    Kajita et al., "Biped walking pattern generation by using preview control of zero-moment point", ICRA 2003.
+
+    At each update, the jerk is ``- Gi*sum(e) - np.dot(Gx, x_hat) - np.dot(Gd, z_ref)``, with the
+    fixed-size preview gain `Gd` applied to the goal window of the horizon.
+    """
+    def __init__(self, horizon, dt, RonQ=1e-6, stride=1, gravity=9.81, height=0.0, gain_cache_size=256, hong_resolution=1e-5):
         """
+        :param double horizon: the preview time (in second); the preview gains decrease exponentially, so 1.5s-2s are enough
+        :param double RonQ: the ratio between the weight of the jerk variations and the weight of the ZMP error
+        :param int stride: unused; the gains are solved at the control time step `dt`, and the
+                           preview is a dot product with the goal at its own resolution, which
+                           keeps the timing of the ZMP steps
+
+        See :class:`ZMPController` for the other parameters.
         """
-        com_hat = np.array([pos_xy, vel_xy, acc_xy])
-        hong = height/self._gravity
+        PreviewController.__init__(self, horizon, dt, RonQ, 1, gravity, gain_cache_size, hong_resolution)
 
-        zmp_ref = self._fit_goal_for_horizon()
-        
-        if update_PxPu is True:
-            self._update_Px_and_Pu(hong)
+        self._error_sum = np.zeros(2)
+        self._prev_ref  = None
+        self._set_gains(self._compute_gains(height/self._gravity))
 
-        ddV_com_XY = get_quadratic_cmd(self._Px, self._Pu,  self._RonQ, self._N,  com_hat, zmp_ref)
+    def getGain(self):
+        """ Return ``(Gi, Gx, Gd)``, the integral, state and preview gains.
+        """
+        return self._Gi, self._Gx, self._Gd
 
-        dVcom_des_XY      = np.zeros(2)
-        dVcom_des_XY[0:2] = com_hat[2, :] + ddV_com_XY[0] * self._real_dt
+    def _compute_gains(self, hong):
+        return get_lqr_preview_gains(self._dt, hong, self._RonQ, self._N)
 
-        return dVcom_des_XY
+    def _set_gains(self, gains):
+        self._Gi, self._Gx, self._Gd = gains
+
+    def _get_cmd(self, com_hat, zmp_ref, hong):
+        zmp = com_hat[0, :] - hong*com_hat[2, :]
+        if self._prev_ref is None:
+            # bumpless start: the integral of the error is initialized such that the first jerk is null
+            self._error_sum = - (np.dot(self._Gx, com_hat) + np.dot(self._Gd, zmp_ref)) / self._Gi
+            self._prev_ref  = zmp
+        # as for ZMPController, the goal window starts at the next time step
+        self._error_sum += zmp - self._prev_ref
+        self._prev_ref   = zmp_ref[0]
+        return - self._Gi*self._error_sum - np.dot(self._Gx, com_hat) - np.dot(self._Gd, zmp_ref)
 
 
+ZMP_ENGINES = {
+    "finite": ZMPController,
+    "lqr"   : LQRZMPController,
+}
@@ -0,0 +1,39 @@
+""" Configuration of the tests of the python modules of xde_isir_controller.
+
+The modules of ``src`` are imported directly. The XDE modules they import are replaced by empty fakes when they
+are not installed, so the tests only cover the python logic, not the bindings.
+"""
+
+import os
+import sys
+import types
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+class _FakeTask(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def _fake_module(name, **attributes):
+    try:
+        __import__(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+        if "." in name:
+            parent, child = name.rsplit(".", 1)
+            setattr(sys.modules[parent], child, module)
+
+
+_fake_module("xdefw")
+_fake_module("xdefw.rtt", Task=_FakeTask)
+_fake_module("rtt_interface")
+_fake_module("physicshelper", DynamicModel=type("DynamicModel", (object,), {}))
+_fake_module("deploy")
+_fake_module("deploy.deployer")
+_fake_module("lgsm")
+_fake_module("swig_isir_controller", INTERNAL=0, FULL_STATE=1, FREE_FLYER=2, X=0, Y=1, Z=2, XY=3, XZ=4, YZ=5, XYZ=6)
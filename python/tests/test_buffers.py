@@ -0,0 +1,150 @@
+""" Tests of the preallocated buffers of :mod:`buffers`.
+"""
+
+import numpy as np
+import pytest
+
+from buffers import RingBuffer, NpyAppender, RecordBuffer, SnapshotQueue
+
+
+##############
+# RingBuffer #
+##############
+def test_ring_buffer_keeps_the_last_values_across_the_wrap_around():
+    ring = RingBuffer(4)
+    for v in range(6):
+        ring.append(v)
+    assert len(ring) == 4 and ring.count == 6
+    assert ring.get_window().tolist() == [2, 3, 4, 5]
+    assert ring.get_window(2).tolist() == [4, 5]
+    assert ring.get_window(10).tolist() == [2, 3, 4, 5]
+
+
+def test_ring_buffer_window_is_a_view_when_contiguous():
+    ring = RingBuffer(4, width=2)
+    for v in range(5):
+        ring.append([v, -v])
+    window = ring.get_window(1)
+    assert window.tolist() == [[4, -4]]
+    assert np.may_share_memory(window, ring.data)
+
+
+def test_ring_buffer_is_empty_after_clear():
+    ring = RingBuffer(3)
+    ring.append(1.)
+    ring.clear()
+    assert len(ring) == 0 and ring.get_window().tolist() == []
+
+
+def test_ring_buffer_needs_a_positive_capacity():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+################
+# RecordBuffer #
+################
+def test_record_buffer_grows_when_full():
+    record = RecordBuffer(2, capacity=2)
+    for v in range(5):
+        record.append([v, 2*v])
+    assert len(record) == 5
+    assert record.get_array()[:, 1].tolist() == [0, 2, 4, 6, 8]
+
+
+def test_record_buffer_ring_rows_are_contiguous_across_the_wrap_around():
+    record = RecordBuffer(1, capacity=3, ring=True)
+    for v in range(2):
+        record.append([v])
+    assert record.get_array()[:, 0].tolist() == [0, 1]
+    for v in range(2, 8):
+        record.append([v])
+        array = record.get_array()
+        assert array[:, 0].tolist() == range(v-2, v+1)
+        assert np.may_share_memory(array, record._data)
+
+
+def test_record_buffer_spills_its_chunks_and_reloads_them(tmpdir):
+    filename = str(tmpdir.join("record.npy"))
+    record = RecordBuffer(2, capacity=3, spill_file=filename)
+    assert record.get_array().shape == (0, 2)
+    for v in range(7):
+        record.append([v, -v])
+    assert len(record) == 7
+    assert len(record._data) == 3             # the memory stays bounded by the capacity
+
+    array = record.get_array()
+    assert isinstance(array, np.memmap)
+    assert array[:, 0].tolist() == range(7)
+
+    record.append([7, -7])                     # the record goes on after a reload
+    assert record.get_array()[:, 1].tolist() == [-v for v in range(8)]
+    assert np.load(filename).shape == (8, 2)
+
+
+def test_record_buffer_cannot_spill_a_ring():
+    with pytest.raises(ValueError):
+        RecordBuffer(1, ring=True, spill_file="unused.npy")
+
+
+def test_npy_appender_file_is_valid_after_each_append(tmpdir):
+    filename = str(tmpdir.join("channel.npy"))
+    appender = NpyAppender(filename, dtype=np.int8)
+    appender.append([1, 2])
+    appender.flush()
+    assert np.load(filename).tolist() == [1, 2]
+    appender.append(np.array([3]))
+    appender.flush()
+    loaded = np.load(filename, mmap_mode="r")
+    assert loaded.dtype == np.int8 and loaded.tolist() == [1, 2, 3]
+    appender.close()
+
+
+#################
+# SnapshotQueue #
+#################
+def make_queue(capacity):
+    return SnapshotQueue(capacity, [("tick", None), ("q", 2)])
+
+
+def test_snapshot_queue_is_fifo_across_the_wrap_around():
+    queue = make_queue(3)
+    ticks = []
+    for tick in range(10):
+        assert queue.push(tick, [tick, -tick])
+        if tick % 2:
+            while len(queue):
+                snapshot = queue.peek()
+                assert snapshot["q"].tolist() == [snapshot["tick"], -snapshot["tick"]]
+                ticks.append(int(snapshot["tick"]))
+                queue.release()
+    assert ticks == range(10)
+    assert queue.peek() is None
+
+
+def test_snapshot_queue_drops_and_counts_the_snapshots_pushed_when_full():
+    queue = make_queue(2)
+    assert [queue.push(tick, [0., 0.]) for tick in range(4)] == [True, True, False, False]
+    assert (queue.pushed, queue.dropped, len(queue)) == (4, 2, 2)
+    assert queue.peek()["tick"] == 0           # the dropped snapshots are the newest ones
+
+    queue.release()
+    assert queue.push(4, [0., 0.])
+    assert [queue.peek()["tick"], len(queue)] == [1, 2]
+
+
+def test_snapshot_queue_slot_is_published_only_once_written():
+    queue = make_queue(2)
+    i = queue.reserve()
+    queue.get_storage("tick")[i] = 7
+    queue.get_storage("q")[i]    = [1., 2.]
+    assert len(queue) == 0 and queue.peek() is None
+    queue.publish()
+    snapshot = queue.peek()
+    assert snapshot["tick"] == 7 and snapshot["q"].tolist() == [1., 2.]
+
+
+def test_snapshot_queue_release_of_an_empty_queue_does_nothing():
+    queue = make_queue(1)
+    queue.release()
+    assert len(queue) == 0 and queue.push(0, [0., 0.])
@@ -0,0 +1,67 @@
+""" Tests of :class:`core.ContactSet`, with fake contact tasks.
+"""
+
+from core import ContactSet
+
+
+class FakeContactTask(object):
+    def __init__(self, log):
+        self.log   = log
+        self.state = "objective"
+
+    def activateAsObjective(self):
+        self.log.append("objective")
+        self.state = "objective"
+
+    def activateAsConstraint(self):
+        self.log.append("constraint")
+        self.state = "constraint"
+
+    def deactivate(self):
+        self.log.append("inactive")
+        self.state = "inactive"
+
+
+class FakeQueryableContactTask(FakeContactTask):
+    def isActiveAsObjective(self):
+        return self.state == "objective"
+
+    def isActiveAsConstraint(self):
+        return self.state == "constraint"
+
+
+def test_only_the_tasks_activated_differently_are_modified():
+    log = []
+    contacts = ContactSet([FakeQueryableContactTask(log) for i in range(4)])
+    assert contacts.status == "objective"
+
+    contacts.activateAsObjective()
+    assert log == []
+
+    contacts.deactivate()
+    contacts.deactivate()
+    assert log == ["inactive"]*4 and contacts.status == "inactive"
+
+
+def test_tasks_modified_one_by_one_are_seen_by_the_set():
+    log = []
+    contacts = ContactSet([FakeQueryableContactTask(log) for i in range(4)])
+    contacts.activateAsConstraint()
+    for task in contacts:
+        task.deactivate()
+    assert contacts.status == "inactive"
+
+    del log[:]
+    contacts.activateAsConstraint()
+    assert log == ["constraint"]*4 and contacts.status == "constraint"
+
+    contacts[0].activateAsObjective()
+    assert contacts.status is None
+
+
+def test_tasks_which_cannot_tell_their_state_are_always_modified():
+    log = []
+    contacts = ContactSet([FakeContactTask(log) for i in range(2)])
+    contacts.deactivate()
+    contacts.deactivate()
+    assert log == ["inactive"]*4 and contacts.status is None
@@ -0,0 +1,149 @@
+""" Tests of the updaters and of the deadline monitor of :class:`core.ISIRController`, with a fake model and solver.
+"""
+
+import numpy as np
+import pytest
+
+import core
+from buffers import RingBuffer, TimingRecorder
+
+
+class FakeModel(object):
+    def nbInternalDofs(self):
+        return 3
+
+    def getGravityTerms(self):
+        return np.array([[0.], [0.], [9.81], [1.], [2.], [3.]])
+
+
+class FakeSolver(object):
+    def __init__(self):
+        self.error = None
+        self.tau   = np.array([.1, .2, .3])
+        self.calls = 0
+
+    def computeOutput(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.tau
+
+
+class FakeUpdater(object):
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    def update(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+
+
+def make_controller(deadline=1., fallback="previous"):
+    """ Get a controller with only the state used by the updaters and the deadline monitor.
+    """
+    ctrl = core.ISIRController.__new__(core.ISIRController)
+    ctrl.dynamic_model       = FakeModel()
+    ctrl.controller          = FakeSolver()
+    ctrl.qdot                = np.array([[1.], [-2.], [4.]])
+    ctrl.clock_counter       = 0
+    ctrl.registered_updaters = []
+    ctrl._updater_slots      = []
+    ctrl._updaters_timing    = None
+    ctrl.period              = None
+    ctrl._perf_tick          = TimingRecorder(10)
+    ctrl._perf_fallback      = RingBuffer(10, dtype=np.int8)
+    ctrl._solve_estimate     = 0.
+    ctrl._last_tau           = None
+    ctrl.skipped_solves      = 0
+    ctrl.solver_failures     = 0
+    ctrl.last_solver_error   = None
+    ctrl.updater_overruns    = 0
+    ctrl.updater_failures    = 0
+    ctrl.last_updater_error  = None
+    ctrl._deadline           = None
+    ctrl.setDeadline(deadline, fallback, damping=.5)
+    return ctrl
+
+
+def test_solved_tick_publishes_the_solution():
+    ctrl = make_controller()
+    tau = ctrl._computeOutputBeforeDeadline_(0.)
+    assert np.all(tau == ctrl.controller.tau)
+    assert ctrl._perf_fallback.get_window().tolist() == [core._TICK_SOLVED]
+
+
+def test_solver_failure_publishes_the_previous_torque():
+    ctrl = make_controller()
+    ctrl._computeOutputBeforeDeadline_(0.)
+    ctrl.controller.error = RuntimeError("no solution")
+    tau = ctrl._computeOutputBeforeDeadline_(0.)
+    assert np.all(tau == [.1, .2, .3])
+    assert ctrl.solver_failures == 1
+    assert ctrl._perf_fallback.get_window().tolist() == [core._TICK_SOLVED, core._TICK_SOLVER_FAILED]
+
+
+def test_solve_skipped_when_it_would_end_after_the_deadline():
+    ctrl = make_controller(deadline=1.)
+    ctrl._solve_estimate = .8
+    ctrl._computeOutputBeforeDeadline_(.5)
+    assert ctrl.controller.calls == 0
+    assert ctrl.skipped_solves == 1
+    assert ctrl._solve_estimate == .4
+
+
+def test_late_updaters_skip_the_solve():
+    ctrl = make_controller(deadline=1.)
+    ctrl._computeOutputBeforeDeadline_(1.5)
+    assert ctrl.controller.calls == 0
+    assert ctrl.updater_overruns == 1
+    assert ctrl._perf_fallback.get_window().tolist() == [core._TICK_UPDATERS_LATE]
+
+
+def test_updater_failure_is_caught_per_slot():
+    ctrl = make_controller(fallback="damping")
+    failing, other = FakeUpdater(ValueError("bad target")), FakeUpdater()
+    ctrl.add_updater(failing)
+    ctrl.add_updater(other)
+
+    updaters_ok = ctrl._updateUpdaters_()
+    tau = ctrl._computeOutputBeforeDeadline_(0., updaters_ok)
+
+    assert updaters_ok is False
+    assert other.calls == 1
+    assert ctrl.controller.calls == 0
+    assert ctrl.updater_failures == 1
+    assert isinstance(ctrl.last_updater_error, ValueError)
+    assert ctrl.getUpdatersCosts()["FakeUpdater"]["failures"] == 1
+    assert ctrl._perf_fallback.get_window().tolist() == [core._TICK_UPDATER_FAILED]
+    assert tau.shape == (3,) and np.all(tau == [-.5, 1., -2.])
+
+
+def test_updater_failure_propagates_without_monitor():
+    ctrl = make_controller()
+    ctrl.setDeadline(None)
+    ctrl.add_updater(FakeUpdater(ValueError("bad target")))
+    with pytest.raises(ValueError):
+        ctrl._updateUpdaters_()
+
+
+@pytest.mark.parametrize("fallback", core._FALLBACKS)
+def test_fallback_torques_have_the_shape_of_the_solution(fallback):
+    ctrl = make_controller(fallback=fallback)
+    ctrl._computeOutputBeforeDeadline_(0.)
+    tau = ctrl._getFallbackTorque_()
+    assert isinstance(tau, np.ndarray) and tau.dtype == float and tau.shape == ctrl.controller.tau.shape
+
+
+def test_updaters_are_timed_only_when_enabled():
+    ctrl = make_controller()
+    ctrl.add_updater(FakeUpdater())
+    ctrl._updateUpdaters_()
+    assert ctrl.getUpdatersCosts()["FakeUpdater"]["calls"] == 0
+
+    ctrl.setUpdatersTiming(True, 10)
+    ctrl._updateUpdaters_()
+    ctrl._updateUpdaters_()
+    cost = ctrl.getUpdatersCosts()["FakeUpdater"]
+    assert cost["calls"] == 2 and cost["timing"]["count"] == 2
@@ -0,0 +1,122 @@
+""" Tests of the recording policies of :mod:`observers`, with a fake observer.
+"""
+
+import pytest
+
+from events import Signal
+from observers import Recorder, DecimationPolicy, RatePolicy, TriggerWindowPolicy
+
+
+class CounterObserver(Recorder):
+    """ Record the value of :attr:`value` at each update.
+    """
+    def __init__(self, policy=None, width=1):
+        Recorder.__init__(self, width=width, capacity=4, policy=policy)
+        self.value    = 0
+        self.observed = 0
+
+    def update(self):
+        self.observed += 1
+        self.save_record([self.value])
+
+
+class DifferentiatingObserver(CounterObserver):
+    observes_every_tick = True
+
+
+def run(observer, values, triggers=(), policy=None):
+    for v in values:
+        if v in triggers:
+            policy.trigger()
+        observer.value = v
+        observer.update()
+    return observer.get_record()[:, 0].tolist()
+
+
+def test_decimation_saves_one_update_every_k_from_the_phase():
+    observer = CounterObserver(DecimationPolicy(3, phase=1))
+    assert run(observer, range(10)) == [1, 4, 7]
+    assert observer.observed == 3 and observer.n_ticks == 10
+
+
+def test_skipped_updates_are_observed_when_the_observer_needs_every_tick():
+    observer = DifferentiatingObserver(DecimationPolicy(2))
+    assert run(observer, range(6)) == [0, 2, 4]
+    assert observer.observed == 6
+
+
+def test_decimation_must_be_positive():
+    with pytest.raises(ValueError):
+        DecimationPolicy(0)
+
+
+def test_rate_keeps_its_schedule_and_restarts_after_a_gap():
+    times = iter([0., .5, 1., 1.2, 2., 5., 5.5, 6.])
+    observer = CounterObserver(RatePolicy(1., clock=lambda: next(times)))
+    assert run(observer, range(8)) == [0, 2, 4, 5, 7]
+
+
+def test_removing_the_policy_saves_all_the_updates():
+    observer = CounterObserver(DecimationPolicy(2))
+    run(observer, range(4))
+    observer.set_policy(None)
+    assert run(observer, range(4, 7)) == [0, 2, 4, 5, 6]
+
+
+def make_trigger_observer(pre, post):
+    policy = TriggerWindowPolicy(pre, post)
+    return CounterObserver(policy), policy
+
+
+def test_trigger_window_saves_the_pre_and_post_records():
+    observer, policy = make_trigger_observer(2, 1)
+    assert run(observer, range(10), triggers=[5], policy=policy) == [3, 4, 5, 6]
+    assert policy.triggers == [2]
+
+
+def test_trigger_window_at_the_start_saves_the_available_pre_records():
+    observer, policy = make_trigger_observer(3, 0)
+    assert run(observer, range(5), triggers=[1], policy=policy) == [0, 1]
+    assert policy.triggers == [1]
+
+
+def test_trigger_window_without_pre_records():
+    observer, policy = make_trigger_observer(0, 2)
+    assert run(observer, range(8), triggers=[2, 6], policy=policy) == [2, 3, 4, 6, 7]
+    assert policy.triggers == [0, 3]
+
+
+def test_trigger_during_the_post_records_extends_the_window():
+    observer, policy = make_trigger_observer(2, 1)
+    assert run(observer, range(10), triggers=[5, 6], policy=policy) == [3, 4, 5, 6, 7]
+    assert policy.triggers == [2, 3]
+
+
+def test_trigger_right_after_a_window_only_saves_the_new_pre_records():
+    observer, policy = make_trigger_observer(2, 1)
+    assert run(observer, range(10), triggers=[5, 7], policy=policy) == [3, 4, 5, 6, 7, 8]
+    assert policy.triggers == [2, 4]
+
+
+def test_triggers_before_the_same_update_open_one_window():
+    observer, policy = make_trigger_observer(1, 0)
+    policy.trigger()
+    assert run(observer, range(3), triggers=[0], policy=policy) == [0]
+    assert policy.triggers == [0]
+
+
+def test_trigger_on_a_signal_triggers_at_each_notification():
+    observer, policy = make_trigger_observer(0, 0)
+    signal = Signal()
+    policy.trigger_on(signal)
+    for v in range(6):
+        if v in (1, 4):
+            signal.notify()
+        observer.value = v
+        observer.update()
+    assert observer.get_record()[:, 0].tolist() == [1, 4]
+
+
+def test_trigger_window_needs_a_fixed_width():
+    with pytest.raises(ValueError):
+        CounterObserver(TriggerWindowPolicy(1, 1), width=None)
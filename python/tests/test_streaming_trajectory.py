@@ -0,0 +1,64 @@
+""" Tests of the lock-free ring of :class:`task_controller.StreamingTrajectory`.
+"""
+
+import threading
+
+import numpy as np
+
+from task_controller import StreamingTrajectory, JointTrajectory
+
+
+def make_samples(start, stop):
+    values = np.arange(start, stop, dtype=float)
+    return np.column_stack([values, 10*values, 100*values])
+
+
+def test_samples_are_popped_in_order_across_the_wrap_around():
+    stream = StreamingTrajectory(JointTrajectory, 4)
+    popped = []
+    for start in range(0, 12, 3):
+        assert stream.extend(make_samples(start, start+3)) == 3
+        for k in range(3):
+            q, qdot, qddot = stream.pop()
+            assert (qdot[0], qddot[0]) == (10*q[0], 100*q[0])
+            popped.append(q[0])
+    assert popped == range(12)
+    assert len(stream) == 0
+
+
+def test_extend_without_blocking_only_writes_the_samples_which_fit():
+    stream = StreamingTrajectory(JointTrajectory, 4)
+    assert stream.extend(make_samples(0, 3)) == 3
+    stream.pop()
+    assert stream.extend(make_samples(3, 9), block=False) == 2
+    assert stream.get_free_space() == 0
+    assert [stream.pop()[0][0] for k in range(4)] == [1., 2., 3., 4.]
+
+
+def test_underruns_are_counted_and_reported_once_per_event():
+    reported = []
+    stream = StreamingTrajectory(JointTrajectory, 2, on_underrun=reported.append)
+    stream.extend(make_samples(0, 1))
+    stream.pop()
+    assert stream.pop() is None and stream.pop() is None
+    stream.extend(make_samples(1, 2))
+    stream.pop()
+    assert stream.pop() is None
+    assert (stream.underruns, stream.underrun_events, reported) == (3, 2, [1, 2])
+
+    stream.finish()
+    assert stream.pop() is None and stream.underruns == 3
+
+
+def test_blocked_producer_is_woken_up_by_the_consumer():
+    stream = StreamingTrajectory(JointTrajectory, 8)
+    n = 2000
+    producer = threading.Thread(target=stream.extend, args=(make_samples(0, n), True, 10.))
+    producer.start()
+    popped = []
+    while len(popped) < n and (producer.is_alive() or len(stream)):
+        sample = stream.pop()
+        if sample is not None:
+            popped.append(sample[0][0])
+    producer.join()
+    assert popped == range(n)
@@ -0,0 +1,76 @@
+""" Tests of the whole-trajectory rollout :meth:`zmpy_python.ZMPController.plan`.
+"""
+
+import numpy as np
+
+import zmpy_python as zmpy
+
+
+dt      = 0.005
+height  = 0.58
+gravity = 9.81
+
+
+def get_goal(n=600):
+    """ ZMP steps of 0.5s alternating in Y, moving forward in X.
+    """
+    k    = np.arange(n)
+    goal = np.zeros((n, 2))
+    goal[:, 0] = .1*(k//100)
+    goal[:, 1] = .05*np.where((k//100) % 2, 1., -1.)
+    goal[:50]  = 0.
+    return goal
+
+
+def rollout_update(zmp_ctrl, n_steps, x0):
+    """ Simulate the closed loop by calling ``update`` at each time step on the cart-table model.
+    """
+    A = np.array([[1., dt, dt**2/2.], [0., 1., dt], [0., 0., 1.]])
+    B = np.array([[dt**3/6.], [dt**2/2.], [dt]])
+    x = np.array(x0, dtype=float)
+    states = np.zeros((n_steps, 3, 2))
+    for k in range(n_steps):
+        dVcom_des = zmp_ctrl.update(x[0], x[1], x[2], height)
+        jerk = (dVcom_des - x[2])/dt
+        x = np.dot(A, x) + np.dot(B, jerk.reshape(1, 2))
+        states[k] = x
+    return states
+
+
+def check_plan_matches_update(stride, gain_cache_size, n_steps=None):
+    goal = get_goal()
+    x0   = [[0., 0.], [.01, 0.], [0., .02]]
+
+    zmp_ctrl = zmpy.ZMPController(1.6, dt, 1e-6, stride, gravity, height, gain_cache_size)
+    zmp_ctrl.setGoal(goal)
+    pos, vel, acc, zmp = zmp_ctrl.plan(x0[0], x0[1], x0[2], height, n_steps)
+
+    zmp_ctrl = zmpy.ZMPController(1.6, dt, 1e-6, stride, gravity, height, gain_cache_size)
+    zmp_ctrl.setGoal(goal)
+    states = rollout_update(zmp_ctrl, len(pos), x0)
+
+    assert np.allclose(pos, states[:, 0], rtol=0, atol=1e-9)
+    assert np.allclose(vel, states[:, 1], rtol=0, atol=1e-8)
+    assert np.allclose(acc, states[:, 2], rtol=0, atol=1e-7)
+    assert np.allclose(zmp, states[:, 0] - height/gravity*states[:, 2], rtol=0, atol=1e-9)
+
+
+def test_plan_matches_update():
+    check_plan_matches_update(stride=6, gain_cache_size=256)
+
+
+def test_plan_matches_update_without_cache_beyond_the_goal():
+    check_plan_matches_update(stride=3, gain_cache_size=0, n_steps=800)
+
+
+def test_plan_does_not_modify_the_controller():
+    zmp_ctrl = zmpy.ZMPController(1.6, dt, 1e-6, 6, gravity, height)
+    zmp_ctrl.setGoal(get_goal())
+    Px, Pu, gains = zmp_ctrl.getPx().copy(), zmp_ctrl.getPu().copy(), zmp_ctrl.getGain()
+    info = zmp_ctrl.getGainCache().info()
+
+    zmp_ctrl.plan([0., 0.], [0., 0.], [0., 0.], height + .1)
+
+    assert np.all(zmp_ctrl.getPx() == Px) and np.all(zmp_ctrl.getPu() == Pu)
+    assert all(np.all(a == b) for a, b in zip(zmp_ctrl.getGain(), gains))
+    assert zmp_ctrl.getGainCache().info() == info